@@ -0,0 +1,41 @@
+"""Add lookup indexes and unique habit completion per day
+
+Revision ID: 018e4f803f15
+Revises: 734604bac8ac
+Create Date: 2026-10-17 09:12:41.215309
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '018e4f803f15'
+down_revision: Union[str, None] = '734604bac8ac'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the earliest row of any duplicated (habit_id, date) pair so the
+    # unique constraint can be created
+    op.execute(
+        "DELETE FROM habitcompletion WHERE id NOT IN "
+        "(SELECT MIN(id) FROM habitcompletion GROUP BY habit_id, date)"
+    )
+    with op.batch_alter_table('habitcompletion') as batch_op:
+        batch_op.create_unique_constraint('uq_habitcompletion_habit_id_date', ['habit_id', 'date'])
+
+    op.create_index('ix_habit_user_id_name', 'habit', ['user_id', 'name'])
+    op.create_index('ix_user_username', 'user', ['username'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_username', table_name='user')
+    op.drop_index('ix_habit_user_id_name', table_name='habit')
+    with op.batch_alter_table('habitcompletion') as batch_op:
+        batch_op.drop_constraint('uq_habitcompletion_habit_id_date', type_='unique')
@@ -0,0 +1,95 @@
+"""Partition habitcompletion by month
+
+Revision ID: 3e7a91c5d2f8
+Revises: c4d8e2f17a93
+Create Date: 2026-10-17 18:40:27.331905
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e7a91c5d2f8'
+down_revision: Union[str, None] = 'c4d8e2f17a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months created after the current one; later months come from `python -m app.cli maintain-partitions`
+MONTHS_AHEAD = 3
+
+COLUMNS = 'id, date, status, habit_id'
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Partitioning is PostgreSQL only; SQLite keeps the plain table
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('ALTER TABLE habitcompletion RENAME TO habitcompletion_unpartitioned')
+    op.execute('ALTER TABLE habitcompletion_unpartitioned RENAME CONSTRAINT habitcompletion_pkey TO habitcompletion_unpartitioned_pkey')
+    op.execute('ALTER TABLE habitcompletion_unpartitioned RENAME CONSTRAINT uq_habitcompletion_habit_id_date TO uq_habitcompletion_unpartitioned_habit_id_date')
+
+    # Unique constraints of a partitioned table must include the partition key, so the
+    # primary key becomes (id, date); ids still come from the same sequence
+    op.execute(
+        "CREATE TABLE habitcompletion ("
+        " id INTEGER NOT NULL DEFAULT nextval('habitcompletion_id_seq'),"
+        " date DATE NOT NULL,"
+        " status BOOLEAN NOT NULL,"
+        " habit_id INTEGER NOT NULL REFERENCES habit (id) ON DELETE CASCADE,"
+        " CONSTRAINT habitcompletion_pkey PRIMARY KEY (id, date),"
+        " CONSTRAINT uq_habitcompletion_habit_id_date UNIQUE (habit_id, date)"
+        ") PARTITION BY RANGE (date)"
+    )
+    op.execute('ALTER SEQUENCE habitcompletion_id_seq OWNED BY habitcompletion.id')
+    op.execute('CREATE TABLE habitcompletion_default PARTITION OF habitcompletion DEFAULT')
+
+    # One partition per month from the oldest completion through a few months ahead
+    oldest = op.get_bind().execute(sa.text('SELECT min(date) FROM habitcompletion_unpartitioned')).scalar()
+    current = date.today().replace(day=1)
+    month = (oldest or current).replace(day=1)
+    while month <= add_months(current, MONTHS_AHEAD):
+        end = add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE habitcompletion_p{month.year:04d}_{month.month:02d} PARTITION OF habitcompletion "
+            f"FOR VALUES FROM ('{month}') TO ('{end}')"
+        )
+        month = end
+
+    # Each row is routed to its month; large tables need a maintenance window for this copy
+    op.execute(f'INSERT INTO habitcompletion ({COLUMNS}) SELECT {COLUMNS} FROM habitcompletion_unpartitioned')
+    op.execute('DROP TABLE habitcompletion_unpartitioned')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Only the attached partitions are copied back; detached ones stay standalone tables
+    op.execute('ALTER TABLE habitcompletion RENAME TO habitcompletion_partitioned')
+    op.execute('ALTER TABLE habitcompletion_partitioned RENAME CONSTRAINT habitcompletion_pkey TO habitcompletion_partitioned_pkey')
+    op.execute('ALTER TABLE habitcompletion_partitioned RENAME CONSTRAINT uq_habitcompletion_habit_id_date TO uq_habitcompletion_partitioned_habit_id_date')
+    op.execute(
+        "CREATE TABLE habitcompletion ("
+        " id INTEGER NOT NULL DEFAULT nextval('habitcompletion_id_seq'),"
+        " date DATE NOT NULL,"
+        " status BOOLEAN NOT NULL,"
+        " habit_id INTEGER NOT NULL REFERENCES habit (id) ON DELETE CASCADE,"
+        " CONSTRAINT habitcompletion_pkey PRIMARY KEY (id),"
+        " CONSTRAINT uq_habitcompletion_habit_id_date UNIQUE (habit_id, date)"
+        ")"
+    )
+    op.execute('ALTER SEQUENCE habitcompletion_id_seq OWNED BY habitcompletion.id')
+    op.execute(f'INSERT INTO habitcompletion ({COLUMNS}) SELECT {COLUMNS} FROM habitcompletion_partitioned')
+    op.execute('DROP TABLE habitcompletion_partitioned')
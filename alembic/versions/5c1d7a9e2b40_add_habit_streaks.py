@@ -0,0 +1,87 @@
+"""Add habit streaks
+
+Revision ID: 5c1d7a9e2b40
+Revises: fdef220f6c73
+Create Date: 2026-10-17 13:41:08.307125
+
+"""
+from datetime import date
+from itertools import groupby
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1d7a9e2b40'
+down_revision: Union[str, None] = 'fdef220f6c73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+# Written against the schema of this revision rather than importing app code, so later
+# changes to the app cannot change what this migration does
+COMPLETIONS = sa.text(
+    'SELECT habit.id, habit.frequency, habitcompletion.date FROM habit'
+    ' JOIN habitcompletion ON habitcompletion.habit_id = habit.id'
+    ' ORDER BY habit.id, habitcompletion.date'
+).columns(sa.column('id', sa.Integer()), sa.column('frequency', sa.String()), sa.column('date', sa.Date()))
+
+SET_STREAKS = sa.text(
+    'UPDATE habit SET current_streak = :current, longest_streak = :longest, last_completed_date = :last'
+    ' WHERE id = :id'
+).bindparams(sa.bindparam('last', type_=sa.Date()))
+
+
+def period_index(day: date, frequency: str) -> int:
+    # Consecutive periods of a frequency have consecutive indexes; weeks start on Monday
+    if frequency == 'WEEKLY':
+        return (day.toordinal() - 1) // 7
+    if frequency == 'MONTHLY':
+        return day.year * 12 + day.month
+    if frequency == 'YEARLY':
+        return day.year
+    return day.toordinal()
+
+
+def seed_streaks(bind) -> None:
+    # Habits without completions keep the column defaults
+    pending = []
+    rows = bind.execute(COMPLETIONS.execution_options(yield_per=BATCH_SIZE))
+    for habit_id, habit_rows in groupby(rows, key=lambda row: row.id):
+        current = longest = 0
+        last = last_period = None
+        for row in habit_rows:
+            period = period_index(row.date, row.frequency)
+            if period != last_period:
+                current = current + 1 if last_period is not None and period == last_period + 1 else 1
+                longest = max(longest, current)
+                last_period = period
+            last = row.date
+        pending.append({'id': habit_id, 'current': current, 'longest': longest, 'last': last})
+        if len(pending) == BATCH_SIZE:
+            bind.execute(SET_STREAKS, pending)
+            pending = []
+    if pending:
+        bind.execute(SET_STREAKS, pending)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('habit') as batch_op:
+        batch_op.add_column(sa.Column('current_streak', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('longest_streak', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('last_completed_date', sa.Date(), nullable=True))
+
+    # Streaks are only advanced incrementally from here on, so seed them from the existing history
+    seed_streaks(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('habit') as batch_op:
+        batch_op.drop_column('last_completed_date')
+        batch_op.drop_column('longest_streak')
+        batch_op.drop_column('current_streak')
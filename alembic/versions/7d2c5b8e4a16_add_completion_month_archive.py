@@ -0,0 +1,37 @@
+"""Add completion month archive
+
+Revision ID: 7d2c5b8e4a16
+Revises: 3e7a91c5d2f8
+Create Date: 2026-10-17 19:52:08.174466
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2c5b8e4a16'
+down_revision: Union[str, None] = '3e7a91c5d2f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled by `python -m app.cli archive-completions`
+    op.create_table('habitcompletionmonth',
+    sa.Column('habit_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('days', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['habit_id'], ['habit.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('habit_id', 'month')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Archived completions are lost; copy them back first with `archive-completions --restore`
+    op.drop_table('habitcompletionmonth')
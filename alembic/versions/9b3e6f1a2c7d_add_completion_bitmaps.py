@@ -0,0 +1,37 @@
+"""Add completion bitmaps
+
+Revision ID: 9b3e6f1a2c7d
+Revises: 5c1d7a9e2b40
+Create Date: 2026-10-17 16:02:44.518930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3e6f1a2c7d'
+down_revision: Union[str, None] = '5c1d7a9e2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTH_COLUMNS = [f'm{month:02d}' for month in range(1, 13)]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing history stays in habitcompletion; copy it with `python -m app.cli convert-completions --to bitmap`
+    op.create_table('habitcompletionyear',
+    sa.Column('habit_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    *[sa.Column(column, sa.Integer(), server_default='0', nullable=False) for column in MONTH_COLUMNS],
+    sa.ForeignKeyConstraint(['habit_id'], ['habit.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('habit_id', 'year')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('habitcompletionyear')
@@ -0,0 +1,30 @@
+"""Add user data version
+
+Revision ID: c4d8e2f17a93
+Revises: 9b3e6f1a2c7d
+Create Date: 2026-10-17 17:25:12.604418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8e2f17a93'
+down_revision: Union[str, None] = '9b3e6f1a2c7d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('data_version')
@@ -0,0 +1,42 @@
+"""Add keyset pagination indexes
+
+Revision ID: fdef220f6c73
+Revises: 018e4f803f15
+Create Date: 2026-10-17 10:03:27.540861
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fdef220f6c73'
+down_revision: Union[str, None] = '018e4f803f15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Each listing sort key gets an index ending in the id tie-breaker, so a page
+    # is a single range scan; these supersede the plain name/username indexes
+    op.create_index('ix_habit_user_id_id', 'habit', ['user_id', 'id'])
+    op.create_index('ix_habit_user_id_name_id', 'habit', ['user_id', 'name', 'id'])
+    op.create_index('ix_habit_user_id_start_date_id', 'habit', ['user_id', 'start_date', 'id'])
+    op.create_index('ix_user_username_id', 'user', ['username', 'id'])
+
+    op.drop_index('ix_habit_user_id_name', table_name='habit')
+    op.drop_index('ix_user_username', table_name='user')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_user_username', 'user', ['username'])
+    op.create_index('ix_habit_user_id_name', 'habit', ['user_id', 'name'])
+
+    op.drop_index('ix_user_username_id', table_name='user')
+    op.drop_index('ix_habit_user_id_start_date_id', table_name='habit')
+    op.drop_index('ix_habit_user_id_name_id', table_name='habit')
+    op.drop_index('ix_habit_user_id_id', table_name='habit')
@@ -3,11 +3,16 @@ from jose import jwt
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models import User
 import os
 from fastapi import Depends, HTTPException, status
 from jose import JWTError
-from app.database import get_db
+from app.database import get_db, open_replica_session, run_db
+from app.hashing import hashing_pool
+from app.cache import principal_cache, AUTH_CACHE_TTL
+import app.schemas as s
+import time
 
 # Secret key and algorithm for JWT encoding
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -21,11 +26,25 @@ oauth2_bearer = OAuth2PasswordBearer(tokenUrl="/login")
 
 # ---------------------------- Authentication Function ----------------------------
 
-def authenticate_user(username: str, password: str, db: Session):
+def get_login_user(username: str, db: Session):
+    """
+    Retrieve the user attempting to log in.
+
+    Parameters:
+    - username (str): The username submitted with the login form.
+    - db (Session): The database session to query the users table.
+
+    Returns:
+    - User | None: The matching user, or None if there is none.
+    """
+    return db.exec(select(User).where(User.username == username)).first()
+
+async def authenticate_user(username: str, password: str, db: Session):
     """
     Authenticate a user by checking their username and password.
 
-    This function retrieves the user from the database and verifies the provided password.
+    This function retrieves the user from the database and verifies the provided password
+    in the hashing pool, so bcrypt never runs on the event loop.
 
     Parameters:
     - username (str): The username of the user attempting to authenticate.
@@ -34,9 +53,12 @@ def authenticate_user(username: str, password: str, db: Session):
 
     Returns:
     - User | bool: Returns the User object if authentication is successful, or False if failed.
+
+    Raises:
+    - HTTPException: Raises 503 if the hashing pool is saturated.
     """
-    user = db.exec(select(User).where(User.username == username)).first()
-    if not user or not user.verify_password(password):  # Verify the password
+    user = await run_db(db, get_login_user, username)
+    if not user or not await hashing_pool.verify(password, user.password):  # Verify the password
         return False
     return user
 
@@ -64,22 +86,42 @@ def create_access_token(username: str, user_id: int, expires_delta: timedelta):
 
 # ---------------------------- Dependency to Retrieve Current User ----------------------------
 
-def get_current_user(token: str = Depends(oauth2_bearer), db: Session = Depends(get_db)):
+def get_token_user(username: str, user_id: int, db: Session):
+    """
+    Retrieve the user identified by the claims of a decoded token.
+
+    Parameters:
+    - username (str): The username stored in the token subject.
+    - user_id (int): The user ID stored in the token claims.
+    - db (Session): The database session to query the users table.
+
+    Returns:
+    - User | None: The matching user, or None if it no longer exists.
+    """
+    return db.exec(select(User).where(User.username == username, User.id == user_id)).first()
+
+async def get_current_user(token: str = Depends(oauth2_bearer), db: Session = Depends(get_db)) -> s.UserPrincipal:
     """
     Retrieve the current authenticated user based on the provided JWT token.
 
     This function decodes the JWT token, validates the claims, and retrieves the user from the database.
+    The resulting principal is cached per token until the token expires (at most AUTH_CACHE_TTL
+    seconds), so repeated requests with the same token need neither decoding nor a query.
 
     Parameters:
     - token (str): The JWT token from the request header (received from the client).
     - db (Session): The database session to query the users table.
 
     Returns:
-    - User: The authenticated user object.
+    - UserPrincipal: A snapshot of the authenticated user.
     
     Raises:
     - HTTPException: Raises 401 if token is invalid or the user cannot be found.
     """
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid credentials",
@@ -99,22 +141,27 @@ def get_current_user(token: str = Depends(oauth2_bearer), db: Session = Depends(
         raise credentials_exception
 
     # Retrieve the user from the database using the username and user ID from the token
-    user = db.exec(select(User).where(User.username == username, User.id == user_id)).first()
-    
+    user = await run_db(db, get_token_user, username, user_id)
+
     if user is None:
         # Raise an exception if the user does not exist in the database
         raise credentials_exception
-    return user
 
-def require_admin(current_user: User = Depends(get_current_user)):
+    # Trust the token without a lookup until it expires or the cache TTL elapses
+    principal = s.UserPrincipal.model_validate(user)
+    expires_at = min(payload.get("exp") or 0, time.time() + AUTH_CACHE_TTL)
+    principal_cache.set(token, principal, expires_at, tag=principal.id)
+    return principal
+
+def require_admin(current_user: s.UserPrincipal = Depends(get_current_user)):
     """
     Dependency to ensure the current user has admin privileges.
 
     parameters:
-    - user (User): The current authenticated user object.
+    - user (UserPrincipal): The current authenticated user.
 
     returns:
-    - User: The authenticated user object if they are an admin.
+    - UserPrincipal: The authenticated user if they are an admin.
 
     raises:
     - HTTPException: Raises 403 if the user does not have admin privileges.
@@ -126,3 +173,30 @@ def require_admin(current_user: User = Depends(get_current_user)):
             detail="Admin access required"
         )
     return current_user
+
+async def get_read_db(current_user: s.UserPrincipal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Dependency providing the session of a read-only route.
+
+    The session is opened on the read replica when DATABASE_REPLICA_URL is set, unless
+    the user wrote within the last REPLICA_STICKY_SECONDS: their reads then stay on the
+    primary, so they see their own changes before the replica has caught up.
+
+    Parameters:
+    - current_user (UserPrincipal): The current authenticated user.
+    - db (Session): The primary session, used when the replica is not.
+
+    Yields:
+    - Session | AsyncSession: The session the route should read from.
+    """
+    replica = open_replica_session(current_user.id)
+    if replica is None:
+        yield db
+        return
+    try:
+        yield replica
+    finally:
+        if isinstance(replica, AsyncSession):
+            await replica.close()
+        else:
+            replica.close()
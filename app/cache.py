@@ -0,0 +1,373 @@
+"""
+cache.py
+
+In-process caches shared by the API.
+
+Functions / classes:
+- TTLCache: A thread-safe LRU cache whose entries expire at a given time and can be
+  invalidated in groups by tag.
+- principal_cache: Verified access tokens mapped to the principal they authenticate.
+- invalidate_user_principals: Drops every cached token of a user after their account changes.
+- MemoryBackend / RedisBackend: Storage for the habit cache, in process or in a Redis server.
+- type_adapter: The validator and serializer of a cached result type, built once.
+- HabitCache: Read-through cache of habit summaries, invalidated per user, which also
+  shares the users' recent writes between workers.
+- habit_cache: The habit cache configured by HABIT_CACHE_BACKEND.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Hashable, Optional, TypeVar
+from pydantic import TypeAdapter
+
+# Maximum number of verified tokens kept in memory
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+# Upper bound in seconds on how long a verified token is trusted without a DB lookup
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+
+# Where habit summaries are cached: 'memory' (per process), 'redis' (shared) or 'none'
+HABIT_CACHE_BACKEND = os.getenv("HABIT_CACHE_BACKEND", "memory").strip().lower()
+
+# Maximum number of cached habit reads kept in memory by the 'memory' backend
+HABIT_CACHE_SIZE = int(os.getenv("HABIT_CACHE_SIZE", "10000"))
+
+# Seconds a cached habit read is served; bounds staleness the invalidation cannot see
+HABIT_CACHE_TTL = float(os.getenv("HABIT_CACHE_TTL", "30"))
+
+# Server used by the 'redis' backend
+HABIT_CACHE_URL = os.getenv("HABIT_CACHE_URL", "redis://localhost:6379/0")
+
+T = TypeVar("T")
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry expiry and tag based invalidation.
+
+    Attributes:
+    - max_size (int): Entries kept before the least recently used one is evicted.
+    - hits, misses, evictions (int): Counters for observing the cache.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (value, expires_at, tag)
+        self._tags = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Return the cached value for `key`, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, expires_at: float, tag: Optional[Hashable] = None):
+        """
+        Store `value` under `key` until the epoch timestamp `expires_at`.
+
+        Args:
+        - key (Hashable): The cache key.
+        - value (Any): The value to cache.
+        - expires_at (float): Epoch seconds after which the entry is ignored.
+        - tag (Optional[Hashable]): Group the entry belongs to, for `invalidate_tag`.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, tag)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_tag(self, tag: Hashable):
+        """
+        Remove every entry stored with the given tag.
+        """
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        """
+        Remove every entry; counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self) -> dict:
+        """
+        Return the cache size and its hit, miss and eviction counters.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: Hashable):
+        # Callers hold the lock
+        _, _, tag = self._entries.pop(key)
+        if tag is not None:
+            keys = self._tags.get(tag)
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+
+# ---------------------------- Authentication Cache ----------------------------
+
+# Verified access tokens, tagged with the ID of the user they belong to
+principal_cache = TTLCache(AUTH_CACHE_SIZE)
+
+def invalidate_user_principals(user_id: int):
+    """
+    Forget every cached token of a user, forcing the next request to re-read the account.
+
+    The cache is per process; other workers pick up the change within AUTH_CACHE_TTL.
+
+    Args:
+    - user_id (int): The ID of the user whose account changed.
+    """
+    principal_cache.invalidate_tag(user_id)
+
+
+# ---------------------------- Habit Cache ----------------------------
+
+class MemoryBackend:
+    """
+    Habit cache storage in this process: a TTLCache of serialized values and a dict of
+    generation counters.
+
+    Generations are kept apart from the LRU entries so they are never evicted; losing
+    one would make entries of an older generation reachable again.
+    """
+
+    # Seen by this process only
+    shared = False
+
+    def __init__(self, max_size: int):
+        self._entries = TTLCache(max_size)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._entries.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._entries.set(key, value, time.time() + ttl)
+
+    def generation(self, key: str) -> int:
+        return self._generations.get(key, 0)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            return self._generations[key]
+
+    def stats(self) -> dict:
+        entries = self._entries.stats()
+        return {"size": entries["size"], "evictions": entries["evictions"]}
+
+    def clear(self):
+        self._entries.clear()
+        with self._lock:
+            self._generations.clear()
+
+
+class RedisBackend:
+    """
+    Habit cache storage in a Redis server, shared by every worker.
+
+    Works with any client exposing the redis-py methods get, set(ex=), incr, info,
+    scan_iter and delete. Entries expire through Redis TTLs; evictions are the server's
+    `evicted_keys` counter.
+    """
+
+    # Seen by every worker
+    shared = True
+
+    def __init__(self, client, prefix: str = "habits:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(self.prefix + key, value, ex=max(1, round(ttl)))
+
+    def generation(self, key: str) -> int:
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def incr(self, key: str) -> int:
+        return self.client.incr(self.prefix + key)
+
+    def stats(self) -> dict:
+        return {"size": None, "evictions": int(self.client.info("stats").get("evicted_keys", 0))}
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+@lru_cache(maxsize=None)
+def type_adapter(schema: Any) -> TypeAdapter:
+    """
+    Return the TypeAdapter of a result type. Building one compiles its validator and
+    serializer, which costs far more than using it, so each type is built once.
+    """
+    return TypeAdapter(schema)
+
+
+class HabitCache:
+    """
+    Read-through cache of a user's habit reads, invalidated with a per-user generation counter.
+
+    Every key embeds the user's current generation, and a write to the user's habits
+    increments it, so all of that user's entries become unreachable at once without
+    being enumerated; they age out through the TTL or LRU eviction. A read that started
+    before a write stores its result under the old generation, where it is never served.
+
+    Values are stored as JSON, so callers always get fresh objects and both backends
+    behave the same.
+
+    Attributes:
+    - backend (MemoryBackend | RedisBackend | None): Storage; None disables caching.
+    - ttl (float): Seconds an entry is served.
+    - hits, misses (int): Counters for observing the cache.
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, user_id: int, key: tuple, schema: Any, load: Callable[[], T]) -> T:
+        """
+        Return the cached result of a read of the user's habits, loading and caching it on a miss.
+
+        Args:
+        - user_id (int): Owner of the habits; scopes the entry and its invalidation.
+        - key (tuple): The read's name and arguments, e.g. ('by_id', 42).
+        - schema (Any): Type of the result, used to serialize and validate it.
+        - load (Callable[[], T]): Performs the read on a miss. Errors are not cached.
+
+        Returns:
+        - T: The cached or freshly loaded result.
+        """
+        if self.backend is None:
+            return load()
+
+        adapter = type_adapter(schema)
+        generation = self.backend.generation(f"{user_id}:generation")
+        entry_key = ":".join([str(user_id), str(generation), *map(str, key)])
+
+        cached = self.backend.get(entry_key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return adapter.validate_json(cached)
+
+        with self._lock:
+            self.misses += 1
+        value = load()
+        self.backend.set(entry_key, adapter.dump_json(value), self.ttl)
+        return value
+
+    def invalidate_user(self, user_id: int):
+        """
+        Make every cached read of the user's habits unreachable; call after the write is committed.
+        """
+        if self.backend is not None:
+            self.backend.incr(f"{user_id}:generation")
+
+    def mark_write(self, user_id: int, seconds: float):
+        """
+        Note in a shared backend that the user just wrote, for `seconds`.
+
+        Every worker then sends the user's reads to the primary (see
+        app.database.wrote_recently), so none of them caches rows of a lagging replica
+        under the generation the write started. A per-process backend is not shared,
+        so there is nothing to note.
+        """
+        if self.backend is not None and self.backend.shared:
+            self.backend.set(f"{user_id}:wrote", b"1", seconds)
+
+    def wrote_recently(self, user_id: int) -> bool:
+        """
+        Return True if a shared backend holds a write of the user noted by `mark_write`.
+        """
+        return self.backend is not None and self.backend.shared and self.backend.get(f"{user_id}:wrote") is not None
+
+    def clear(self):
+        """
+        Remove every entry and generation; counters are kept.
+        """
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        """
+        Return the hit, miss and eviction counters, the hit ratio and the backend's size.
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        backend = self.backend.stats() if self.backend is not None else {"size": 0, "evictions": 0}
+        return {
+            "backend": HABIT_CACHE_BACKEND,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            **backend,
+        }
+
+
+def create_habit_cache_backend(name: str):
+    """
+    Build the habit cache backend named by HABIT_CACHE_BACKEND.
+
+    Raises:
+    - ValueError: If the name is not 'memory', 'redis' or 'none'.
+    - ImportError: If 'redis' is chosen without the redis package installed.
+    """
+    if name == "none":
+        return None
+    if name == "memory":
+        return MemoryBackend(HABIT_CACHE_SIZE)
+    if name == "redis":
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImportError("HABIT_CACHE_BACKEND=redis requires the 'redis' package") from exc
+        return RedisBackend(redis.Redis.from_url(HABIT_CACHE_URL))
+    raise ValueError(f"HABIT_CACHE_BACKEND must be 'memory', 'redis' or 'none', got '{name}'")
+
+
+# Habit summaries, listings and pages, keyed per user and generation
+habit_cache = HabitCache(create_habit_cache_backend(HABIT_CACHE_BACKEND), HABIT_CACHE_TTL)
@@ -0,0 +1,139 @@
+"""
+cli.py
+
+Maintenance commands run against the configured DATABASE_URL.
+
+Usage:
+    python -m app.cli rebuild-streaks [--habit-id ID ...]
+    python -m app.cli import-habits --user-id ID [--format csv|json] FILE
+    python -m app.cli convert-completions --to bitmap|rows
+    python -m app.cli maintain-partitions [--months-ahead N] [--retention-months N]
+    python -m app.cli archive-completions [--after-days N] [--restore]
+
+Commands:
+- rebuild-streaks: Recompute the stored habit streaks from the habitcompletion table,
+  e.g. after importing completions or restoring a backup.
+- import-habits: Create a user's habits from a CSV or JSON file, like POST /habits/import.
+- convert-completions: Copy the completion history into the other storage before
+  switching COMPLETION_STORAGE; the source is kept, so the switch can be rolled back.
+- maintain-partitions: Create the coming monthly partitions of habitcompletion and
+  detach the expired ones (PostgreSQL after the partitioning migration); run it daily.
+- archive-completions: Roll completion rows of months older than --after-days up into
+  the monthly archive and delete them in batches; --restore copies the archive back.
+"""
+
+import argparse
+import sys
+from fastapi import HTTPException
+from sqlmodel import Session
+from app.crud.streaks import REBUILD_BATCH_SIZE, rebuild_streaks
+from app.crud.habit_import import IMPORT_BATCH_SIZE, format_from_filename, import_habits
+from app.cache import habit_cache
+from app.crud.bitmaps import CONVERT_BATCH_SIZE, convert_to_bitmaps, convert_to_rows
+from app.crud.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, archive_completions, restore_completions
+from app.crud.partitions import PARTITION_MONTHS_AHEAD, PARTITION_RETENTION_MONTHS, is_partitioned, maintain_partitions
+from app.logs import configure_logging
+
+
+def rebuild_streaks_command(args):
+    # Imported here so --help works without a configured database
+    from app.database import engine
+
+    with Session(engine) as db:
+        rebuilt = rebuild_streaks(db, args.habit_id, batch_size=args.batch_size)
+    habit_cache.clear()  # summaries include the streaks; only reaches a shared (Redis) cache
+    print(f"Rebuilt streaks of {rebuilt} habits")
+
+
+def import_habits_command(args):
+    from app.database import engine
+
+    fmt = args.format or format_from_filename(args.file)
+    with open(args.file, encoding="utf-8-sig", newline="") as stream, Session(engine) as db:
+        result = import_habits(stream, fmt, args.user_id, db, batch_size=args.batch_size)
+
+    for error in result.errors:
+        print(f"row {error.row}: {error.error}")
+    print(f"Imported {result.imported} habits, {result.failed} rows failed")
+
+
+def convert_completions_command(args):
+    from app.database import engine
+
+    convert = convert_to_bitmaps if args.to == "bitmap" else convert_to_rows
+    with Session(engine) as db:
+        copied = convert(db, batch_size=args.batch_size)
+    print(f"Copied {copied} completions to {args.to} storage")
+
+
+def maintain_partitions_command(args):
+    from app.database import engine
+
+    with Session(engine) as db:
+        if not is_partitioned(db):
+            print("habitcompletion is not partitioned; nothing to do")
+            return
+        result = maintain_partitions(db, months_ahead=args.months_ahead, retention_months=args.retention_months)
+    print(f"Created {len(result['created'])} partitions: {', '.join(result['created']) or '-'}")
+    print(f"Detached {len(result['detached'])} partitions: {', '.join(result['detached']) or '-'}")
+
+
+def archive_completions_command(args):
+    from app.database import engine
+
+    with Session(engine) as db:
+        if args.restore:
+            print(f"Restored {restore_completions(db, batch_size=args.batch_size)} archived completions")
+            return
+        archived = archive_completions(db, after_days=args.after_days, batch_size=args.batch_size)
+    print(f"Archived {archived} completions")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-streaks", help="Recompute habit streaks from their completions.")
+    rebuild.add_argument("--habit-id", type=int, action="append", help="Only rebuild this habit (repeatable).")
+    rebuild.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE, help="Rows fetched and habits written per round trip.")
+    rebuild.set_defaults(handler=rebuild_streaks_command)
+
+    importer = commands.add_parser("import-habits", help="Create a user's habits from a CSV or JSON file.")
+    importer.add_argument("file", help="CSV with a header row, a JSON array or newline-delimited JSON.")
+    importer.add_argument("--user-id", type=int, required=True, help="Owner of the imported habits.")
+    importer.add_argument("--format", choices=("csv", "json"), help="Defaults to the file's extension.")
+    importer.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Habits written per round trip.")
+    importer.set_defaults(handler=import_habits_command)
+
+    converter = commands.add_parser("convert-completions", help="Copy completion history between row and bitmap storage.")
+    converter.add_argument("--to", choices=("bitmap", "rows"), required=True, help="Storage to copy the completions into.")
+    converter.add_argument("--batch-size", type=int, default=CONVERT_BATCH_SIZE, help="Completions copied per round trip.")
+    converter.set_defaults(handler=convert_completions_command)
+
+    partitions = commands.add_parser("maintain-partitions", help="Create and detach monthly partitions of habitcompletion.")
+    partitions.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD, help="Months to create after the current one.")
+    partitions.add_argument("--retention-months", type=int, default=PARTITION_RETENTION_MONTHS,
+                            help="Months kept attached before the current one; 0 detaches nothing.")
+    partitions.set_defaults(handler=maintain_partitions_command)
+
+    archiver = commands.add_parser("archive-completions", help="Roll old completion rows up into the monthly archive.")
+    archiver.add_argument("--after-days", type=int, default=ARCHIVE_AFTER_DAYS,
+                          help="Archive the months before the one this many days ago.")
+    archiver.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="Rows archived per transaction.")
+    archiver.add_argument("--restore", action="store_true", help="Copy the archive back into completion rows instead.")
+    archiver.set_defaults(handler=archive_completions_command)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging()  # slow statements and DB_ECHO output
+    try:
+        args.handler(args)
+    except HTTPException as exc:  # the CRUD layer reports bad input this way
+        sys.exit(f"error: {exc.detail}")
+
+
+if __name__ == "__main__":
+    main()
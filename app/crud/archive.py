@@ -0,0 +1,318 @@
+"""
+archive.py
+
+Rollup of old completion rows into a compact monthly archive.
+
+Completions older than COMPLETION_ARCHIVE_AFTER_DAYS are only read for lifetime
+statistics and history, yet with row storage each one keeps a row and an index entry in
+the hot habitcompletion table. `archive_completions` moves whole months past that age
+into habitcompletionmonth, one row per habit and month holding a count and a bitmask of
+the completed days, deleting the raw rows in bounded batches, each its own short
+transaction. Readers merge the archived months back in, so results do not change: the
+date, count and statistics endpoints, streak rebuilds, exports and the conversion to
+bitmap storage all see archived completions like live ones.
+
+Completions recorded later for an archived month (a backfill) stay live until the next
+run merges them. With bitmap storage the history is already compact and nothing is archived.
+
+Functions:
+- archive_cutoff: First day no longer archived for a given day and age.
+- decode_month / pack_months: Between archive rows and completion dates.
+- archived_dates / archived_completions / archived_dates_by_habit: Read the archive.
+- archived_pairs: Which (habit_id, date) pairs are completed in the archive.
+- archived_export_statement: The query selecting a user's archived months for an export.
+- merge_dates: Merge archived and live completion dates.
+- archive_completions: Roll old rows up into the archive and delete them.
+- restore_completions: Copy the archive back into habitcompletion rows.
+"""
+
+import os
+from datetime import date, timedelta
+from itertools import groupby, islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from app.models import Habit, HabitCompletion, HabitCompletionMonth
+from app.crud.bitmaps import bitmap_storage, day_mask
+from app.crud.partitions import month_start
+
+# Age in days after which completions are archived; whole months are archived at a time
+ARCHIVE_AFTER_DAYS = int(os.getenv("COMPLETION_ARCHIVE_AFTER_DAYS", "365"))
+
+# Completion rows archived and deleted per transaction
+ARCHIVE_BATCH_SIZE = 5000
+
+# Plain columns of an archive row; read as rows rather than ORM objects, so a month just
+# rewritten by an upsert is never shadowed by a stale object in the session
+ARCHIVE_COLUMNS = tuple(HabitCompletionMonth.__table__.c)
+
+
+def archive_cutoff(today: date, after_days: int = ARCHIVE_AFTER_DAYS) -> date:
+    """
+    Return the first day of the month containing the day `after_days` before `today`;
+    completions before it are archived.
+    """
+    return month_start(today - timedelta(days=after_days))
+
+
+# ---------------------------- Months ----------------------------
+
+def decode_month(row) -> Iterator[date]:
+    """
+    Yield the dates whose bits are set in a habitcompletionmonth row, oldest first.
+    """
+    days = row.days
+    while days:
+        lowest = days & -days
+        yield row.month.replace(day=lowest.bit_length())
+        days ^= lowest
+
+
+def pack_months(completions: Iterable[Tuple[int, date]]) -> Dict[Tuple[int, date], int]:
+    """
+    Aggregate (habit_id, date) pairs into the day bitmask of each (habit_id, month).
+    """
+    months: Dict[Tuple[int, date], int] = {}
+    for habit_id, day in completions:
+        key = (habit_id, month_start(day))
+        months[key] = months.get(key, 0) | day_mask(day)
+    return months
+
+
+def month_upsert(db: Session, rows: List[dict]):
+    """
+    Write archive rows, replacing the stored count and bitmask of existing months.
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    insert = dialect.insert(HabitCompletionMonth)
+    db.execute(
+        insert.on_conflict_do_update(
+            index_elements=["habit_id", "month"],
+            set_={"count": insert.excluded["count"], "days": insert.excluded["days"]},
+        ),
+        rows,
+    )
+
+
+# ---------------------------- Reads ----------------------------
+
+def archived_dates(
+    db: Session,
+    habit_id: int,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> List[date]:
+    """
+    Return the archived completion dates of a habit within an inclusive range, oldest first.
+
+    Parameters:
+    - db (Session): Database session.
+    - habit_id (int): ID of the habit; ownership is not checked.
+    - date_from (Optional[date]): First date to include, or None for no lower bound.
+    - date_to (Optional[date]): Last date to include, or None for no upper bound.
+
+    Returns:
+    - List[date]: The archived completed days.
+    """
+    query = select(*ARCHIVE_COLUMNS).where(HabitCompletionMonth.habit_id == habit_id)
+    if date_from:
+        query = query.where(HabitCompletionMonth.month >= month_start(date_from))
+    if date_to:
+        query = query.where(HabitCompletionMonth.month <= date_to)
+    return [
+        day for row in db.exec(query.order_by(HabitCompletionMonth.month)) for day in decode_month(row)
+        if (date_from is None or day >= date_from) and (date_to is None or day <= date_to)
+    ]
+
+
+def archived_completions(db: Session, user_id: int) -> List[Tuple[int, date]]:
+    """
+    Return the archived (habit_id, date) completions of a user's habits, ordered by habit and date.
+    """
+    rows = db.exec(
+        select(*ARCHIVE_COLUMNS)
+        .join(Habit, Habit.id == HabitCompletionMonth.habit_id)
+        .where(Habit.user_id == user_id)
+        .order_by(HabitCompletionMonth.habit_id, HabitCompletionMonth.month)
+    )
+    return [(row.habit_id, day) for row in rows for day in decode_month(row)]
+
+
+def archived_export_statement(user_id: int, habit_id: Optional[int] = None):
+    """
+    Build the query selecting the archived months of a user's habits as
+    (habit_id, habit_name, month, days) rows, ordered by habit and month like an export.
+    """
+    query = (
+        select(Habit.id.label("habit_id"), Habit.name.label("habit_name"),
+               HabitCompletionMonth.month, HabitCompletionMonth.days)
+        .join(HabitCompletionMonth, HabitCompletionMonth.habit_id == Habit.id)
+        .where(Habit.user_id == user_id)
+    )
+    if habit_id is not None:
+        query = query.where(Habit.id == habit_id)
+    return query.order_by(Habit.id, HabitCompletionMonth.month)
+
+
+def archived_pairs(db: Session, completions: Iterable[Tuple[int, date]], today: date) -> set:
+    """
+    Return the (habit_id, date) pairs among `completions` that are completed in the archive.
+
+    Only months before the one of `today` can be archived, so newer pairs are not looked up.
+    """
+    older = [(habit_id, day) for habit_id, day in completions if day < month_start(today)]
+    if not older:
+        return set()
+    stored = {
+        (row.habit_id, row.month): row.days
+        for row in db.exec(
+            select(*ARCHIVE_COLUMNS)
+            .where(HabitCompletionMonth.habit_id.in_({habit_id for habit_id, _ in older}),
+                   HabitCompletionMonth.month.in_({month_start(day) for _, day in older}))
+        )
+    }
+    return {(habit_id, day) for habit_id, day in older if stored.get((habit_id, month_start(day)), 0) & day_mask(day)}
+
+
+def archived_dates_by_habit(rows) -> Callable[[int], List[date]]:
+    """
+    Return a lookup of the archived dates of each habit from archive rows ordered by habit
+    and month, read forward only: it must be called with ascending habit IDs.
+    """
+    groups = groupby(rows, key=lambda row: row.habit_id)
+    current = next(groups, None)
+
+    def dates_of(habit_id: int) -> List[date]:
+        nonlocal current
+        while current is not None and current[0] < habit_id:
+            current = next(groups, None)
+        if current is None or current[0] != habit_id:
+            return []
+        return [day for row in current[1] for day in decode_month(row)]
+
+    return dates_of
+
+
+def merge_dates(live: Iterable[date], archived: List[date]) -> List[date]:
+    """
+    Merge live and archived completion dates into one ascending list without duplicates.
+    """
+    if not archived:
+        return list(live)
+    return sorted(set(live).union(archived))
+
+
+# ---------------------------- Rollup ----------------------------
+
+def archive_batch(db: Session, cutoff: date, batch_size: int) -> int:
+    """
+    Delete up to `batch_size` completion rows older than `cutoff` and merge them into the archive.
+
+    The rows are deleted first, with RETURNING, so exactly the deleted rows are archived
+    even while completions are being written. The months already archived are read and
+    ORed with the batch, so a month split across batches or runs keeps all of its days
+    and an exact count. Both happen in one transaction.
+
+    Returns:
+    - int: Number of rows archived; 0 once there are none left.
+    """
+    batch = (
+        select(HabitCompletion.id)
+        .where(HabitCompletion.date < cutoff)
+        .order_by(HabitCompletion.id)
+        .limit(batch_size)
+    )
+    # Bounded on date as well, so a partitioned table only searches the archived months
+    deleted = db.exec(
+        delete(HabitCompletion)
+        .where(HabitCompletion.id.in_(batch.scalar_subquery()), HabitCompletion.date < cutoff)
+        .returning(HabitCompletion.habit_id, HabitCompletion.date)
+    ).all()
+    if not deleted:
+        db.commit()
+        return 0
+
+    months = pack_months(deleted)
+    stored = db.exec(
+        select(*ARCHIVE_COLUMNS)
+        .where(HabitCompletionMonth.habit_id.in_({habit_id for habit_id, _ in months}),
+               HabitCompletionMonth.month.in_({month for _, month in months}))
+    )
+    for row in stored:
+        if (row.habit_id, row.month) in months:
+            months[(row.habit_id, row.month)] |= row.days
+
+    month_upsert(db, [
+        {"habit_id": habit_id, "month": month, "count": bin(days).count("1"), "days": days}
+        for (habit_id, month), days in sorted(months.items())
+    ])
+    db.commit()
+    return len(deleted)
+
+
+def archive_completions(
+    db: Session,
+    today: Optional[date] = None,
+    after_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> int:
+    """
+    Roll the completion rows of every month older than `after_days` up into the archive.
+
+    Each batch is archived and deleted in its own transaction, so locks are held briefly
+    and an interrupted run loses nothing: the next one carries on where it stopped.
+    Stored streaks and data versions are unchanged, since archiving does not change any
+    result. Meant to run from one host at a time.
+
+    Parameters:
+    - db (Session): Database session; committed after every batch.
+    - today (Optional[date]): The current day (default: today).
+    - after_days (int): Age in days after which a completion is archived.
+    - batch_size (int): Rows archived and deleted per transaction.
+
+    Returns:
+    - int: Number of completion rows archived.
+    """
+    if bitmap_storage():
+        return 0
+
+    cutoff = archive_cutoff(today or date.today(), after_days)
+    archived = 0
+    while batch := archive_batch(db, cutoff, batch_size):
+        archived += batch
+    return archived
+
+
+def restore_completions(db: Session, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Copy every archived completion back into habitcompletion rows and empty the archive.
+
+    Days that already have a row are skipped, so the restore can be repeated.
+
+    Parameters:
+    - db (Session): Database session; committed at the end.
+    - batch_size (int): Completions inserted per round trip.
+
+    Returns:
+    - int: Number of completions decoded from the archive.
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    insert = dialect.insert(HabitCompletion).on_conflict_do_nothing(index_elements=["habit_id", "date"])
+
+    # A month row holds up to 31 completions
+    rows = db.execute(
+        select(*ARCHIVE_COLUMNS)
+        .order_by(HabitCompletionMonth.habit_id, HabitCompletionMonth.month)
+        .execution_options(yield_per=max(1, batch_size // 31))
+    )
+    completions = ({"habit_id": row.habit_id, "date": day, "status": True} for row in rows for day in decode_month(row))
+
+    restored = 0
+    while batch := list(islice(completions, batch_size)):
+        db.execute(insert, batch)
+        restored += len(batch)
+
+    db.execute(delete(HabitCompletionMonth))
+    db.commit()
+    return restored
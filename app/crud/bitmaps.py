@@ -0,0 +1,312 @@
+"""
+bitmaps.py
+
+Compact storage of completion history as one bitset per habit and year.
+
+With COMPLETION_STORAGE=bitmap, completions are kept in the habitcompletionyear table
+instead of one habitcompletion row per day. Each month of a year is an integer word
+whose bit `day - 1` is set when the habit was completed that day, so a year of history
+is a single row of 12 integers instead of up to 366 rows, each with its own index entry.
+Recording a completion is an upsert that ORs the day's bit into its month word, which is
+atomic and idempotent, and reading a range decodes only the years it spans.
+
+Functions:
+- bitmap_storage: Whether completions are stored as bitmaps.
+- month_column / day_mask / completed_on: The word and bit of a date, and a SQL test of it.
+- pack_completions: Aggregate (habit_id, date) pairs into year rows of month words.
+- year_upsert / mark_day_statement: The upserts ORing bits into the stored words.
+- decode_year / decode_years: Expand year rows back into completion dates.
+- completion_dates: A habit's completion dates within a range.
+- convert_to_bitmaps / convert_to_rows: Copy existing history from one storage to the other.
+"""
+
+import os
+from datetime import date
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import literal
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from app.models import HabitCompletion, HabitCompletionYear
+
+# Storage used for completion history: 'rows' (one habitcompletion row per day) or
+# 'bitmap' (one habitcompletionyear row per habit and year)
+COMPLETION_STORAGE = os.getenv("COMPLETION_STORAGE", "rows").strip().lower()
+
+COMPLETION_STORAGES = ("rows", "bitmap")
+if COMPLETION_STORAGE not in COMPLETION_STORAGES:
+    raise ValueError(f"COMPLETION_STORAGE must be one of {', '.join(COMPLETION_STORAGES)}, got '{COMPLETION_STORAGE}'")
+
+# Name of the word holding each month (index 0 is January)
+MONTH_COLUMNS = tuple(f"m{month:02d}" for month in range(1, 13))
+
+# Plain columns of a year row; read as rows rather than ORM objects, so a word just
+# ORed in by an upsert is never shadowed by a stale object in the session
+YEAR_COLUMNS = tuple(HabitCompletionYear.__table__.c)
+
+# Completions read and written per round trip while converting between storages
+CONVERT_BATCH_SIZE = 5000
+
+
+def bitmap_storage() -> bool:
+    """
+    Return True if completions are stored as bitmaps rather than rows.
+    """
+    return COMPLETION_STORAGE == "bitmap"
+
+
+# ---------------------------- Bits ----------------------------
+
+def month_column(month: int):
+    """
+    Return the column holding the word of `month` (1-12).
+    """
+    return HabitCompletionYear.__table__.c[MONTH_COLUMNS[month - 1]]
+
+
+def day_mask(day: date) -> int:
+    """
+    Return the bit of `day` within its month word.
+    """
+    return 1 << (day.day - 1)
+
+
+def completed_on(day: date):
+    """
+    Return a SQL condition true if the habitcompletionyear row has `day`'s bit set.
+
+    NULL when there is no row for the year, e.g. through an outer join.
+    """
+    return month_column(day.month).op("&")(day_mask(day)) != 0
+
+
+def pack_completions(completions: Iterable[Tuple[int, date]]) -> List[Dict[str, int]]:
+    """
+    Aggregate (habit_id, date) pairs into one row of month words per habit and year.
+
+    A database upsert may touch each row only once per statement, so all the days of
+    a (habit, year) must be merged into a single row before they are written.
+
+    Parameters:
+    - completions (Iterable[Tuple[int, date]]): The completed days, in any order.
+
+    Returns:
+    - List[Dict[str, int]]: Rows with habit_id, year and every month word, ordered by habit and year.
+    """
+    years: Dict[Tuple[int, int], List[int]] = {}
+    for habit_id, day in completions:
+        words = years.setdefault((habit_id, day.year), [0] * 12)
+        words[day.month - 1] |= day_mask(day)
+
+    return [
+        {"habit_id": habit_id, "year": year, **dict(zip(MONTH_COLUMNS, words))}
+        for (habit_id, year), words in sorted(years.items())
+    ]
+
+
+# ---------------------------- Writes ----------------------------
+
+def year_insert(db: Session):
+    """
+    Return the dialect specific INSERT of HabitCompletionYear rows, supporting ON CONFLICT.
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(HabitCompletionYear)
+
+
+def merge_words(insert, columns: Iterable[str], where=None):
+    """
+    Turn `insert` into an upsert that ORs the inserted words into an existing row,
+    optionally only when `where` holds for that row.
+    """
+    table = HabitCompletionYear.__table__
+    return insert.on_conflict_do_update(
+        index_elements=["habit_id", "year"],
+        set_={column: table.c[column].op("|")(insert.excluded[column]) for column in columns},
+        where=where,
+    )
+
+
+def day_unset(day: date):
+    """
+    Build the condition that the stored row does not have the bit of `day` set yet.
+    """
+    return HabitCompletionYear.__table__.c[MONTH_COLUMNS[day.month - 1]].op("&")(day_mask(day)) == 0
+
+
+def year_upsert(db: Session, rows: List[Dict[str, int]]) -> None:
+    """
+    Set the bits of packed year rows, keeping the bits already stored.
+
+    Parameters:
+    - db (Session): Database session; not committed.
+    - rows (List[Dict[str, int]]): Rows from `pack_completions`, at most one per (habit_id, year).
+    """
+    if rows:
+        db.execute(merge_words(year_insert(db), MONTH_COLUMNS), rows)
+
+
+def mark_day_statement(db: Session, habit_id: int, day: date):
+    """
+    Build the upsert setting the bit of `day` for a habit.
+
+    Only the word of `day`'s month is written, so concurrent completions of other days
+    of the same year do not overwrite each other. A row whose bit is already set is left
+    untouched, so no row is reported as written.
+    """
+    column = MONTH_COLUMNS[day.month - 1]
+    insert = year_insert(db).values(habit_id=habit_id, year=day.year, **{column: day_mask(day)})
+    return merge_words(insert, [column], where=day_unset(day))
+
+
+def mark_day_from_select(owned, day: date):
+    """
+    Build the PostgreSQL upsert setting the bit of `day` for the habit selected by the CTE `owned`.
+    Like `mark_day_statement`, it writes (and returns) no row if the bit is already set.
+    """
+    column = MONTH_COLUMNS[day.month - 1]
+    insert = postgresql.insert(HabitCompletionYear).from_select(
+        ["habit_id", "year", column],
+        select(owned.c.id, literal(day.year), literal(day_mask(day))),
+    )
+    return merge_words(insert, [column], where=day_unset(day))
+
+
+# ---------------------------- Reads ----------------------------
+
+def decode_year(row) -> Iterator[date]:
+    """
+    Yield the dates whose bits are set in a habitcompletionyear row, oldest first.
+
+    Each word is consumed one set bit at a time (`word & -word` isolates the lowest),
+    so the cost is the number of completions, not the number of days in the year.
+    """
+    for month, column in enumerate(MONTH_COLUMNS, start=1):
+        word = getattr(row, column)
+        while word:
+            lowest = word & -word
+            yield date(row.year, month, lowest.bit_length())
+            word ^= lowest
+
+
+def decode_years(rows) -> Iterator[Tuple[int, date]]:
+    """
+    Yield (habit_id, date) for every completion of rows ordered by habit and year.
+    """
+    for row in rows:
+        for day in decode_year(row):
+            yield row.habit_id, day
+
+
+def year_rows_statement(habit_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """
+    Build the query reading the year rows of a habit that overlap a date range, oldest first.
+    """
+    query = select(*YEAR_COLUMNS).where(HabitCompletionYear.habit_id == habit_id)
+    if date_from:
+        query = query.where(HabitCompletionYear.year >= date_from.year)
+    if date_to:
+        query = query.where(HabitCompletionYear.year <= date_to.year)
+    return query.order_by(HabitCompletionYear.year)
+
+
+def completion_dates(
+    db: Session,
+    habit_id: int,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> List[date]:
+    """
+    Return the completion dates of a habit within an inclusive range, oldest first.
+
+    Parameters:
+    - db (Session): Database session.
+    - habit_id (int): ID of the habit; ownership is not checked.
+    - date_from (Optional[date]): First date to include, or None for no lower bound.
+    - date_to (Optional[date]): Last date to include, or None for no upper bound.
+
+    Returns:
+    - List[date]: The completed days.
+    """
+    rows = db.exec(year_rows_statement(habit_id, date_from, date_to))
+    return [
+        day for row in rows for day in decode_year(row)
+        if (date_from is None or day >= date_from) and (date_to is None or day <= date_to)
+    ]
+
+
+# ---------------------------- Conversion ----------------------------
+
+def convert_to_bitmaps(db: Session, batch_size: int = CONVERT_BATCH_SIZE) -> int:
+    """
+    Copy every completion from the habitcompletion table and its monthly archive into
+    habitcompletionyear.
+
+    Completions are streamed in batches, each packed and upserted with a bitwise OR,
+    so a year split across two batches is merged and running the conversion again is
+    harmless. The source rows are left in place.
+
+    Parameters:
+    - db (Session): Database session; committed at the end.
+    - batch_size (int): Completions read and packed per round trip.
+
+    Returns:
+    - int: Number of completions copied.
+    """
+    rows = db.execute(
+        select(HabitCompletion.habit_id, HabitCompletion.date)
+        .where(HabitCompletion.status)
+        .order_by(HabitCompletion.habit_id, HabitCompletion.date)
+        .execution_options(yield_per=batch_size)
+    )
+
+    copied = 0
+    for batch in rows.partitions():
+        year_upsert(db, pack_completions(batch))
+        copied += len(batch)
+
+    # Months rolled up by app.crud.archive are history too; imported here, as the archive uses this module
+    from app.crud.archive import ARCHIVE_COLUMNS, decode_month
+
+    archived = db.execute(select(*ARCHIVE_COLUMNS).execution_options(yield_per=max(1, batch_size // 31)))
+    for batch in archived.partitions():
+        completions = [(row.habit_id, day) for row in batch for day in decode_month(row)]
+        year_upsert(db, pack_completions(completions))
+        copied += len(completions)
+
+    db.commit()
+    return copied
+
+
+def convert_to_rows(db: Session, batch_size: int = CONVERT_BATCH_SIZE) -> int:
+    """
+    Copy every completion from habitcompletionyear back into the habitcompletion table.
+
+    Days that already have a row are skipped, so the conversion can be repeated. The
+    bitmaps are left in place.
+
+    Parameters:
+    - db (Session): Database session; committed at the end.
+    - batch_size (int): Completions inserted per round trip.
+
+    Returns:
+    - int: Number of completions decoded from the bitmaps.
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    insert = dialect.insert(HabitCompletion).on_conflict_do_nothing(index_elements=["habit_id", "date"])
+
+    # A year row holds up to 366 completions
+    rows = db.execute(
+        select(*YEAR_COLUMNS)
+        .order_by(HabitCompletionYear.habit_id, HabitCompletionYear.year)
+        .execution_options(yield_per=max(1, batch_size // 366))
+    )
+    completions = ({"habit_id": habit_id, "date": day, "status": True} for habit_id, day in decode_years(rows))
+
+    copied = 0
+    while batch := list(islice(completions, batch_size)):
+        db.execute(insert, batch)
+        copied += len(batch)
+
+    db.commit()
+    return copied
@@ -1,13 +1,84 @@
 from sqlmodel import Session, select
+from sqlalchemy import Date, Integer, cast, func, literal, literal_column, true
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import date
+from collections import Counter
+from typing import List, Optional
+from fastapi import HTTPException, status
 import app.schemas as s
-from app.models import HabitCompletion
-from app.utils import get_habit_of_user, get_today
+from app.models import Frequency, Habit, HabitCompletion, HabitCompletionYear, User
+from app.utils import get_habit_of_user, get_today, habit_not_found
+from app.crud.streaks import period_start as frequency_period_start, rebuild_streaks, streak_update_statement
+from app.crud import archive, bitmaps
+from app.cache import habit_cache
+from app.database import record_write
+from app.crud.versions import bump_data_version, bump_statement
+
+
+def completion_insert(db: Session):
+    """
+    Return the dialect specific INSERT construct supporting ON CONFLICT for the session's database.
+
+    Parameters:
+        db (Session): Database session.
+
+    Returns:
+        Insert: An insert of HabitCompletion rows.
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(HabitCompletion)
+
+
+def mark_completed_statement(habit_id: int, user_id: int, day: date):
+    """
+    Build the single PostgreSQL statement that marks a habit completed on a day.
+
+    The habit is selected only if it belongs to the user, and the completion row is
+    inserted from that selection, so ownership check, insert and duplicate handling
+    happen atomically in one round trip, together with advancing the habit's streak
+    and the user's data version. The version is only bumped if a completion was
+    inserted, so repeating the statement for the same day leaves cached reads and
+    ETags valid.
+    The statement returns the habit's id and name and whether the completion is new,
+    or no row if the user does not own the habit.
+
+    Parameters:
+        habit_id (int): ID of the habit.
+        user_id (int): ID of the user.
+        day (date): Completion date.
+
+    Returns:
+        Select: The statement to execute.
+    """
+    owned = select(Habit.id, Habit.name).where(Habit.id == habit_id, Habit.user_id == user_id).cte("owned")
+    if bitmaps.bitmap_storage():
+        inserted = bitmaps.mark_day_from_select(owned, day).returning(HabitCompletionYear.habit_id).cte("inserted")
+    else:
+        inserted = (
+            postgresql.insert(HabitCompletion)
+            .from_select(["habit_id", "date", "status"], select(owned.c.id, literal(day), true()))
+            .on_conflict_do_nothing(index_elements=["habit_id", "date"])
+            .returning(HabitCompletion.id)
+            .cte("inserted")
+        )
+    created = select(inserted).exists()
+    streak = streak_update_statement(habit_id, user_id, day).returning(Habit.id).cte("streak")
+    version = bump_statement(user_id).where(created).returning(User.id).cte("version")
+    return select(owned.c.id, owned.c.name, created.label("created")).add_cte(inserted).add_cte(streak).add_cte(version)
 
 
 def mark_habit_completed_today(habit_id: int, user_id: int, db: Session) -> s.HabitCompletionStatus:
     """
     Mark the given habit as completed for today, if not already marked.
 
+    On PostgreSQL this is a single ownership-checked INSERT ... ON CONFLICT DO NOTHING
+    that also advances the habit's streak. SQLite cannot run an INSERT inside a CTE, so
+    there the ownership check, the upsert and the streak update are separate statements.
+    Either way the unique (habit_id, date) constraint makes concurrent calls race-free,
+    and the streak and data version are only updated when today was not yet completed,
+    so a repeated call invalidates no cached read. With bitmap storage
+    the insert is replaced by an upsert ORing today's bit into the habit's year row.
+
     Parameters:
         habit_id (int): ID of the habit.
         user_id (int): ID of the user.
@@ -15,31 +86,151 @@ def mark_habit_completed_today(habit_id: int, user_id: int, db: Session) -> s.Ha
 
     Returns:
         HabitCompletionStatus: Schema containing the habit's id, name and today's completion status.
+
+    Raises:
+        HTTPException: If the habit does not exist or the user does not own it.
     """
-    # Ensure the user owns the habit
-    db_habit = get_habit_of_user(habit_id, user_id, db)
+    today = get_today()
 
-    # Check if habit was already completed today
-    existing_completion = db.exec(
-        select(HabitCompletion)
-        .where((HabitCompletion.habit_id == habit_id) & (HabitCompletion.date == get_today()))
-    ).first()
+    if db.get_bind().dialect.name == "postgresql":
+        owned = db.exec(mark_completed_statement(habit_id, user_id, today)).first()
+        created = bool(owned and owned.created)
+    else:
+        owned = db.exec(
+            select(Habit.id, Habit.name).where(Habit.id == habit_id, Habit.user_id == user_id)
+        ).first()
+        created = False
+        if owned and bitmaps.bitmap_storage():
+            created = db.exec(bitmaps.mark_day_statement(db, habit_id, today)).rowcount > 0
+        elif owned:
+            created = db.exec(
+                completion_insert(db)
+                .values(habit_id=habit_id, date=today, status=True)
+                .on_conflict_do_nothing(index_elements=["habit_id", "date"])
+            ).rowcount > 0
+        if created:
+            db.exec(streak_update_statement(habit_id, user_id, today))
+            bump_data_version(db, user_id)
 
-    # If not completed, mark it as completed
-    if not existing_completion:
-        existing_completion = HabitCompletion(habit_id=habit_id, date=get_today(), status=True)
-        db.add(existing_completion)
+    if not owned:
+        raise habit_not_found(habit_id)
 
-    # Save changes and return status
     db.commit()
-    db.refresh(existing_completion)
+    if created:
+        habit_cache.invalidate_user(user_id)  # the habit's streak may have advanced
+        record_write(user_id)
 
     return s.HabitCompletionStatus(
-        id=habit_id,
-        name=db_habit.name,
+        id=owned.id,
+        name=owned.name,
         completed_today=True
     )
 
+def mark_habits_completed(items: List[s.CompletionItem], user_id: int, db: Session) -> s.BulkCompletionResult:
+    """
+    Record many (habit, date) completions of a user at once, e.g. ticks synced from an offline client.
+
+    Ownership and start dates of all referenced habits are read with one query, and every
+    valid pair is written by one multi-row INSERT ... ON CONFLICT DO NOTHING whose RETURNING
+    clause tells which pairs were new. Pairs already completed in the archived months are
+    left out of the insert. Habits that received a new completion have their
+    streaks recomputed, since backfilled dates can fall anywhere in their history.
+
+    Parameters:
+        items (List[CompletionItem]): The habit IDs and dates to mark as completed.
+        user_id (int): ID of the user.
+        db (Session): Database session.
+
+    Returns:
+        BulkCompletionResult: The number of new completions and the status of each item, in request order.
+    """
+    today = get_today()
+    habit_ids = {item.habit_id for item in items}
+
+    # Start date of each requested habit the user owns
+    start_dates = dict(db.exec(
+        select(Habit.id, Habit.start_date).where(Habit.id.in_(habit_ids), Habit.user_id == user_id)
+    ).all())
+
+    statuses = {}
+    for item in items:
+        key = (item.habit_id, item.date)
+        if item.habit_id not in start_dates:
+            statuses[key] = "not_found"
+        elif item.date > today or item.date < start_dates[item.habit_id]:
+            statuses[key] = "invalid_date"
+        else:
+            statuses[key] = "already_completed"  # until the insert reports it as new
+
+    valid = [key for key, status in statuses.items() if status == "already_completed"]
+    if valid and not bitmaps.bitmap_storage():
+        # A day rolled up into the archive has no live row for the insert to conflict with
+        archived = archive.archived_pairs(db, valid, today)
+        valid = [key for key in valid if key not in archived]
+    created = []
+    if valid and bitmaps.bitmap_storage():
+        created = mark_days_in_bitmaps(valid, db)
+        for key in created:
+            statuses[key] = "created"
+    elif valid:
+        created = db.exec(
+            completion_insert(db)
+            .values([{"habit_id": habit_id, "date": day, "status": True} for habit_id, day in valid])
+            .on_conflict_do_nothing(index_elements=["habit_id", "date"])
+            .returning(HabitCompletion.habit_id, HabitCompletion.date)
+        ).all()
+        for habit_id, day in created:
+            statuses[(habit_id, day)] = "created"
+
+    if created:
+        bump_data_version(db, user_id)
+        rebuild_streaks(db, sorted({habit_id for habit_id, _ in created}))  # commits
+        habit_cache.invalidate_user(user_id)
+        record_write(user_id)
+    else:
+        db.commit()
+
+    return s.BulkCompletionResult(
+        created=len(created),
+        results=[
+            s.CompletionResult(habit_id=item.habit_id, date=item.date, status=statuses[(item.habit_id, item.date)])
+            for item in items
+        ]
+    )
+
+def mark_days_in_bitmaps(completions: List[tuple], db: Session) -> List[tuple]:
+    """
+    Set the bits of (habit_id, date) pairs in the habits' year bitmaps.
+
+    The affected year rows are read first, so days whose bit is already set can be told
+    apart from new ones, and every year row is then upserted once.
+
+    Parameters:
+        completions (List[tuple]): Distinct (habit_id, date) pairs of owned habits.
+        db (Session): Database session; not committed.
+
+    Returns:
+        List[tuple]: The pairs that were not completed before.
+    """
+    habit_ids = {habit_id for habit_id, _ in completions}
+    years = {day.year for _, day in completions}
+    stored = {
+        (row.habit_id, row.year): row
+        for row in db.exec(
+            select(*bitmaps.YEAR_COLUMNS)
+            .where(HabitCompletionYear.habit_id.in_(habit_ids), HabitCompletionYear.year.in_(years))
+        )
+    }
+
+    created = []
+    for habit_id, day in completions:
+        row = stored.get((habit_id, day.year))
+        if row is None or not getattr(row, bitmaps.MONTH_COLUMNS[day.month - 1]) & bitmaps.day_mask(day):
+            created.append((habit_id, day))
+
+    bitmaps.year_upsert(db, bitmaps.pack_completions(created))
+    return created
+
 def get_habit_today_completion_status(habit_id: int, user_id:int, db: Session) -> s.HabitCompletionStatus:
     """
     Retrieve whether the specified habit has been completed today.
@@ -53,42 +244,216 @@ def get_habit_today_completion_status(habit_id: int, user_id:int, db: Session) -
         HabitCompletionStatus: Schema containing the habit's id, name and today's completion status.
     """
     db_habit = get_habit_of_user(habit_id, user_id, db)
+    today = get_today()
 
-    # Check for today's completion entry
-    completed = db.exec(select(HabitCompletion)
-                        .where(
-                            (HabitCompletion.habit_id == habit_id) & 
-                            (HabitCompletion.date == get_today())
-                        )).first()
+    if bitmaps.bitmap_storage():
+        # Test today's bit in the year row, in SQL
+        completed_today = db.exec(
+            select(bitmaps.completed_on(today))
+            .where(HabitCompletionYear.habit_id == habit_id, HabitCompletionYear.year == today.year)
+        ).first() or False
+    else:
+        # Check for today's completion entry
+        completed = db.exec(select(HabitCompletion)
+                            .where(
+                                (HabitCompletion.habit_id == habit_id) & 
+                                (HabitCompletion.date == today)
+                            )).first()
+        completed_today = completed.status if completed else False
 
     return s.HabitCompletionStatus(
         id=db_habit.id,
         name=db_habit.name,
-        completed_today=completed.status if completed else False
+        completed_today=completed_today
     )
 
-def get_habit_completion_dates(habit_id: int, user_id:int, db: Session) -> s.HabitWithCompletions:
+def date_range_filter(date_from: Optional[date], date_to: Optional[date]) -> list:
+    """
+    Build the WHERE conditions restricting completions to an inclusive date range.
+
+    Parameters:
+        date_from (Optional[date]): First date to include, or None for no lower bound.
+        date_to (Optional[date]): Last date to include, or None for no upper bound.
+
+    Returns:
+        list: Conditions to pass to `where`.
+
+    Raises:
+        HTTPException: 400 if `date_from` is after `date_to`.
+    """
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'from' must not be after 'to'."
+        )
+
+    conditions = []
+    if date_from:
+        conditions.append(HabitCompletion.date >= date_from)
+    if date_to:
+        conditions.append(HabitCompletion.date <= date_to)
+    return conditions
+
+def partition_bounds(db_habit: Habit, date_from: Optional[date], date_to: Optional[date]) -> list:
+    """
+    Bound an open-ended completion range by the habit's start date and by today.
+
+    No completion lies outside those days (habits start on the day they are created or
+    imported, and earlier completions are rejected), so the result is unchanged, but
+    when habitcompletion is partitioned by month (see app.crud.partitions) the months
+    before the habit and the ones created ahead are pruned instead of searched.
+
+    Parameters:
+        db_habit (Habit): The habit whose completions are read.
+        date_from (Optional[date]): The requested first date, if any.
+        date_to (Optional[date]): The requested last date, if any.
+
+    Returns:
+        list: Conditions to pass to `where`, alongside those of `date_range_filter`.
+    """
+    conditions = []
+    if not date_from:
+        conditions.append(HabitCompletion.date >= db_habit.start_date)
+    if not date_to:
+        conditions.append(HabitCompletion.date <= get_today())
+    return conditions
+
+def live_completion_dates(db: Session, habit_id: int, conditions: list) -> List[date]:
     """
-    Get all the dates when the specified habit was marked as completed.
+    Return the dates of a habit's habitcompletion rows matching `conditions`, oldest first.
+
+    Only the dates in range are read, straight from the (habit_id, date) index.
+    """
+    return db.exec(
+        select(HabitCompletion.date)
+        .where(HabitCompletion.habit_id == habit_id, *conditions)
+        .order_by(HabitCompletion.date)
+    ).all()
+
+def get_habit_completion_dates(
+    habit_id: int,
+    user_id:int,
+    db: Session,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+) -> s.HabitWithCompletions:
+    """
+    Get the dates when the specified habit was marked as completed, oldest first.
+
+    Completions rolled up into the monthly archive (see app.crud.archive) are merged
+    with the live rows, so archiving never changes the result.
 
     Parameters:
         habit_id (int): ID of the habit.
         user_id (int): ID of the user.
         db (Session): Database session.
+        date_from (Optional[date]): Only include completions on or after this date.
+        date_to (Optional[date]): Only include completions on or before this date.
 
     Returns:
         HabitWithCompletions: Schema containing the habit's id, name and a list of completion dates.
     """
+    conditions = date_range_filter(date_from, date_to)
     db_habit = get_habit_of_user(habit_id, user_id, db)
+    conditions += partition_bounds(db_habit, date_from, date_to)
 
-    # Retrieve all completion records for the habit
-    completion_dates = db.exec(
-        select(HabitCompletion).
-        where(HabitCompletion.habit_id == habit_id)
-    ).all()
+    if bitmaps.bitmap_storage():
+        # Only the year rows overlapping the range are read and decoded
+        completion_dates = bitmaps.completion_dates(db, habit_id, date_from, date_to)
+    else:
+        # The live rows in range, merged with the archived months of the range
+        archived = archive.archived_dates(db, habit_id, date_from, date_to)
+        completion_dates = archive.merge_dates(live_completion_dates(db, habit_id, conditions), archived)
 
     return s.HabitWithCompletions(
         id=db_habit.id,
         name=db_habit.name,
-        completed_dates=[completion.date for completion in completion_dates]
+        completed_dates=list(completion_dates)
+    )
+
+# Periods completions can be counted by
+COMPLETION_PERIODS = ("week", "month")
+
+def period_start(db: Session, period: str):
+    """
+    Return a SQL expression for the first day of the week (Monday) or month of a completion.
+
+    Parameters:
+        db (Session): Database session, used to pick the dialect's date functions.
+        period (str): 'week' or 'month'.
+
+    Returns:
+        ColumnElement: A date-typed expression over HabitCompletion.date.
+    """
+    if period not in COMPLETION_PERIODS:
+        raise ValueError(f"Unsupported period: {period}")
+
+    column = HabitCompletion.date
+    if db.get_bind().dialect.name == "postgresql":
+        # Inlined rather than bound, so the SELECT and GROUP BY expressions are identical to the server
+        return cast(func.date_trunc(literal_column(f"'{period}'"), column), Date)
+
+    if period == "month":
+        return func.date(column, "start of month", type_=Date)
+    # strftime('%w') is 0 for Sunday; step back to the preceding Monday
+    days_since_monday = (cast(func.strftime("%w", column), Integer) + 6) % 7
+    return func.date(column, func.printf("-%d days", days_since_monday), type_=Date)
+
+def get_habit_completion_counts(
+    habit_id: int,
+    user_id: int,
+    db: Session,
+    period: str = "week",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+) -> s.HabitCompletionCounts:
+    """
+    Count the completions of a habit per week or month, grouped in SQL.
+
+    With bitmap storage, or when part of the range is archived, the dates are grouped
+    in Python instead. Periods without completions are omitted.
+
+    Parameters:
+        habit_id (int): ID of the habit.
+        user_id (int): ID of the user.
+        db (Session): Database session.
+        period (str): 'week' (weeks start on Monday) or 'month'.
+        date_from (Optional[date]): Only count completions on or after this date.
+        date_to (Optional[date]): Only count completions on or before this date.
+
+    Returns:
+        HabitCompletionCounts: Schema containing the habit's id, name and the count of each period, oldest first.
+    """
+    conditions = date_range_filter(date_from, date_to)
+    db_habit = get_habit_of_user(habit_id, user_id, db)
+    conditions += partition_bounds(db_habit, date_from, date_to)
+
+    archived = [] if bitmaps.bitmap_storage() else archive.archived_dates(db, habit_id, date_from, date_to)
+
+    if bitmaps.bitmap_storage() or archived:
+        if archived:
+            dates = archive.merge_dates(live_completion_dates(db, habit_id, conditions), archived)
+        else:
+            dates = bitmaps.completion_dates(db, habit_id, date_from, date_to)
+        frequency = Frequency.WEEKLY if period == "week" else Frequency.MONTHLY
+        # The dates are in order, so the counts are too
+        counts = Counter(frequency_period_start(day, frequency) for day in dates)
+        rows = [s.PeriodCount(period_start=start, count=count) for start, count in counts.items()]
+    else:
+        start = period_start(db, period).label("period_start")
+        rows = [
+            s.PeriodCount(period_start=row.period_start, count=row.count)
+            for row in db.exec(
+                select(start, func.count().label("count"))
+                .where(HabitCompletion.habit_id == habit_id, *conditions)
+                .group_by(start)
+                .order_by(start)
+            )
+        ]
+
+    return s.HabitCompletionCounts(
+        id=db_habit.id,
+        name=db_habit.name,
+        period=period,
+        counts=rows
     )
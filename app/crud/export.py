@@ -0,0 +1,213 @@
+"""
+export.py
+
+Streaming export of a user's completion history.
+
+Completions are read in batches through `stream_db` and each batch is encoded to a
+chunk of NDJSON or CSV as soon as it arrives, so an export holds one batch in memory
+no matter how many years of history the habits have.
+
+With bitmap storage the query reads the habits' year rows instead, and each batch is
+decoded into one row per completed day before it is encoded. With row storage the
+archived months (see app.crud.archive) are streamed alongside the live rows in the
+same order, decoded a batch at a time and interleaved with them.
+
+Functions:
+- completion_export_statement: Build the query selecting a user's completions.
+- bitmap_export_statement / decode_export_rows: The same from the year bitmaps.
+- decode_archived_rows: Expand archived months into export rows.
+- merge_archived: Interleave a stream of archived completions with the live batches.
+- encode_ndjson / encode_csv: Encode a batch of rows.
+- export_completions: Stream an encoded export.
+"""
+
+import csv
+import io
+import json
+from collections import deque, namedtuple
+from typing import AsyncIterator, Optional
+from sqlmodel import select
+from app.database import close_db, stream_db
+from app.crud.archive import archived_export_statement, decode_month
+from app.models import Habit, HabitCompletion, HabitCompletionYear
+from app.crud.bitmaps import MONTH_COLUMNS, bitmap_storage, decode_year
+
+# Rows fetched per database round trip while streaming
+EXPORT_BATCH_SIZE = 1000
+
+# Media type of each supported export format
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+EXPORT_COLUMNS = ("habit_id", "habit_name", "date", "status")
+
+# A completion decoded from a year bitmap, shaped like a row of `completion_export_statement`
+ExportRow = namedtuple("ExportRow", EXPORT_COLUMNS)
+
+
+def completion_export_statement(user_id: int, habit_id: Optional[int] = None):
+    """
+    Build the query selecting the completions of a user's habits, oldest first per habit.
+
+    Parameters:
+    - user_id (int): ID of the user whose completions are exported.
+    - habit_id (Optional[int]): Restrict the export to one habit.
+
+    Returns:
+    - Select: Rows of (habit_id, habit_name, date, status).
+    """
+    query = (
+        select(Habit.id.label("habit_id"), Habit.name.label("habit_name"), HabitCompletion.date, HabitCompletion.status)
+        .join(HabitCompletion, HabitCompletion.habit_id == Habit.id)
+        .where(Habit.user_id == user_id)
+    )
+    if habit_id is not None:
+        query = query.where(Habit.id == habit_id)
+
+    # Follows the (user_id, id) habit index and the (habit_id, date) unique index, so no sort step is needed
+    return query.order_by(Habit.id, HabitCompletion.date)
+
+
+def bitmap_export_statement(user_id: int, habit_id: Optional[int] = None):
+    """
+    Build the query selecting the year bitmaps of a user's habits, oldest first per habit.
+
+    Parameters:
+    - user_id (int): ID of the user whose completions are exported.
+    - habit_id (Optional[int]): Restrict the export to one habit.
+
+    Returns:
+    - Select: Rows of (habit_id, habit_name, year, m01, ..., m12).
+    """
+    table = HabitCompletionYear.__table__
+    query = (
+        select(Habit.id.label("habit_id"), Habit.name.label("habit_name"), table.c.year,
+               *(table.c[column] for column in MONTH_COLUMNS))
+        .join(HabitCompletionYear, HabitCompletionYear.habit_id == Habit.id)
+        .where(Habit.user_id == user_id)
+    )
+    if habit_id is not None:
+        query = query.where(Habit.id == habit_id)
+    return query.order_by(Habit.id, HabitCompletionYear.year)
+
+
+def decode_export_rows(rows) -> list:
+    """
+    Expand a batch of year rows into one `ExportRow` per completed day.
+    """
+    return [ExportRow(row.habit_id, row.habit_name, day, True) for row in rows for day in decode_year(row)]
+
+
+def decode_archived_rows(rows) -> list:
+    """
+    Expand a batch of archived months into one `ExportRow` per completed day.
+    """
+    return [ExportRow(row.habit_id, row.habit_name, day, True) for row in rows for day in decode_month(row)]
+
+
+async def merge_archived(live: AsyncIterator[list], archived: AsyncIterator[list]) -> AsyncIterator[list]:
+    """
+    Interleave two streams of batches, live and archived rows, both ordered by habit and date.
+
+    One merged batch is yielded per live batch, holding the archived rows sorting before
+    its last row; archived batches are read only as far as needed, so at most one batch
+    of each is held. A day both archived and live (backfilled since it was archived) is
+    exported once. The archived rows after the last live one are yielded at the end.
+    """
+    pending = deque()
+    exhausted = False
+
+    async def pending_head():
+        # The next archived row, reading the next batch when the current one is used up
+        nonlocal exhausted
+        while not pending and not exhausted:
+            batch = await anext(archived, None)
+            if batch is None:
+                exhausted = True
+            else:
+                pending.extend(decode_archived_rows(batch))
+        return pending[0] if pending else None
+
+    async for rows in live:
+        merged = []
+        for row in rows:
+            while (head := await pending_head()) is not None and (head.habit_id, head.date) < (row.habit_id, row.date):
+                merged.append(pending.popleft())
+            if head is not None and (head.habit_id, head.date) == (row.habit_id, row.date):
+                pending.popleft()
+            merged.append(row)
+        yield merged
+
+    while await pending_head() is not None:
+        yield list(pending)
+        pending.clear()
+
+
+def encode_ndjson(rows) -> str:
+    """
+    Encode rows as newline-delimited JSON, one object per line.
+    """
+    return "".join(
+        json.dumps({"habit_id": row.habit_id, "habit_name": row.habit_name,
+                    "date": row.date.isoformat(), "status": row.status}) + "\n"
+        for row in rows
+    )
+
+
+def encode_csv(rows) -> str:
+    """
+    Encode rows as CSV lines without a header.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows((row.habit_id, row.habit_name, row.date.isoformat(), row.status) for row in rows)
+    return buffer.getvalue()
+
+
+async def export_completions(
+    db,
+    user_id: int,
+    habit_id: Optional[int] = None,
+    fmt: str = "ndjson",
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[str]:
+    """
+    Stream a user's completions encoded as NDJSON or CSV.
+
+    The caller is responsible for checking that the user owns `habit_id`; an unowned
+    habit simply produces an empty export.
+
+    Parameters:
+    - db (Session | AsyncSession): The request's session; closed when the stream ends.
+    - user_id (int): ID of the user whose completions are exported.
+    - habit_id (Optional[int]): Restrict the export to one habit.
+    - fmt (str): 'ndjson' or 'csv'.
+    - batch_size (int): Rows fetched and encoded per chunk.
+
+    Yields:
+    - str: The next chunk of the export.
+    """
+    encode = encode_csv if fmt == "csv" else encode_ndjson
+    if fmt == "csv":
+        yield ",".join(EXPORT_COLUMNS) + "\n"
+
+    if bitmap_storage():
+        # A year row holds up to 366 completions
+        statement = bitmap_export_statement(user_id, habit_id)
+        async for rows in stream_db(db, statement, max(1, batch_size // 366)):
+            yield encode(decode_export_rows(rows))
+        return
+
+    # Both streams share the session, which is closed once the export ends; a month row
+    # holds up to 31 completions
+    live = stream_db(db, completion_export_statement(user_id, habit_id), batch_size, close=False)
+    archived = stream_db(db, archived_export_statement(user_id, habit_id), max(1, batch_size // 31), close=False)
+    try:
+        async for rows in merge_archived(live, archived):
+            yield encode(rows)
+    finally:
+        await live.aclose()
+        await archived.aclose()
+        await close_db(db)
@@ -0,0 +1,382 @@
+"""
+habit_import.py
+
+Bulk import of habits from CSV or JSON files, e.g. when onboarding users from another app.
+
+Rows are read one at a time from the file, validated with the same schema and
+normalizers as `create_habit`, and written in batches: a single COPY per batch on
+PostgreSQL with psycopg2, and one executemany INSERT per batch elsewhere. Rows that
+fail validation are skipped and reported with their row number.
+
+Reading and validating is CPU-bound. With an AsyncSession it runs in the threadpool,
+one batch at a time, so the event loop only awaits the writes.
+
+Functions:
+- format_from_filename: Infer the format of an upload.
+- read_json_array / read_rows: Iterate the records of a CSV, JSON array or newline-delimited JSON file.
+- validated_batches: Validate the records of a file in batches.
+- insert_habits: Write a batch of validated habits.
+- import_habits: Validate and import a whole file for a user.
+- import_file: The same from a route, with either session type.
+"""
+
+import csv
+import io
+import json
+from itertools import chain
+from datetime import date
+from typing import Iterator, List, Optional, TextIO
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+import app.schemas as s
+from app.models import Habit
+from app.utils import get_today, normalize_name
+from app.cache import habit_cache
+from app.database import record_write, run_db
+from app.crud.versions import bump_data_version
+
+# Habits written per COPY / executemany
+IMPORT_BATCH_SIZE = 5000
+
+# Row errors listed in the result; further errors are only counted
+MAX_IMPORT_ERRORS = 1000
+
+# Characters read at a time from a JSON array
+JSON_CHUNK_SIZE = 64 * 1024
+
+# File extensions and the format they are read as
+IMPORT_EXTENSIONS = {"csv": "csv", "json": "json", "ndjson": "json", "jsonl": "json"}
+
+# Columns written for every imported habit
+IMPORT_COLUMNS = ("user_id", "name", "description", "category", "frequency", "start_date", "reminder_time")
+
+
+def format_from_filename(filename: Optional[str]) -> str:
+    """
+    Infer the import format from a file name.
+
+    Raises:
+    - HTTPException: 400 if the extension is not a supported format.
+    """
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension in IMPORT_EXTENSIONS:
+        return IMPORT_EXTENSIONS[extension]
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Unknown file type; upload a .csv or .json file or pass format=csv|json."
+    )
+
+
+def read_json_array(stream: TextIO) -> Iterator:
+    """
+    Iterate the elements of a JSON array whose opening bracket has been read.
+
+    The file is read in chunks of JSON_CHUNK_SIZE and each element is decoded as soon
+    as it is complete, so one element is held in memory rather than the whole array.
+
+    Raises:
+    - json.JSONDecodeError: If the array is malformed or truncated.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+
+    def read_more():
+        nonlocal buffer, position, eof
+        chunk = stream.read(JSON_CHUNK_SIZE)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+    def next_char() -> str:
+        # The next non-whitespace character, "" at the end of the file
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return buffer[position:position + 1]
+            read_more()
+
+    if next_char() == "]":
+        return
+    while True:
+        next_char()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                read_more()
+                continue
+            # A number or literal ending the buffer may continue in the next chunk
+            if end == len(buffer) and not eof:
+                read_more()
+                continue
+            break
+        position = end
+        yield value
+
+        delimiter = next_char()
+        if delimiter == "]":
+            break
+        if delimiter != ",":
+            raise json.JSONDecodeError("Expecting ',' delimiter", buffer, position)
+        position += 1
+
+    position += 1
+    if next_char():
+        raise json.JSONDecodeError("Extra data", buffer, position)
+
+
+def read_rows(stream: TextIO, fmt: str) -> Iterator[dict]:
+    """
+    Iterate the records of an import file.
+
+    CSV files need a header row naming the columns. JSON files are either one array of
+    objects, decoded element by element, or newline-delimited objects, which are read
+    line by line.
+
+    Parameters:
+    - stream (TextIO): The file, opened in text mode.
+    - fmt (str): 'csv' or 'json'.
+
+    Yields:
+    - dict: One record per row (anything else for malformed JSON lines, which the caller rejects).
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+
+    if first == "[":
+        yield from read_json_array(stream)
+        return
+
+    for line in chain([first + stream.readline()], stream):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield exc
+
+
+def validate_row(record, user_id: int, today: date) -> dict:
+    """
+    Validate one record and return the column values of its habit.
+
+    Raises:
+    - ValueError: With a readable message if the record is not a valid habit.
+    """
+    if isinstance(record, Exception):
+        raise ValueError(f"invalid JSON: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("expected an object")
+
+    # Empty CSV cells mean "not given", so schema defaults apply
+    fields = {key: value for key, value in record.items() if key and value not in (None, "")}
+    try:
+        habit = s.HabitImportRow(**fields)
+    except ValidationError as exc:
+        raise ValueError("; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in exc.errors()))
+    except HTTPException as exc:  # raised by the category / frequency normalizers
+        raise ValueError(exc.detail)
+
+    if not habit.name.strip():
+        raise ValueError("name: must not be empty")
+    if habit.start_date and habit.start_date > today:
+        raise ValueError("start_date: must not be in the future")
+
+    return {
+        "user_id": user_id,
+        "name": normalize_name(habit.name),
+        "description": habit.description,
+        "category": habit.category,
+        "frequency": habit.frequency,
+        "start_date": habit.start_date or today,
+        "reminder_time": habit.reminder_time,
+    }
+
+
+def copy_habits(db: Session, rows: List[dict]):
+    """
+    Write a batch of habits with PostgreSQL's COPY through the session's psycopg2 connection.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow((
+            row["user_id"], row["name"], row["description"],
+            row["category"].name if row["category"] else None,  # enums are stored by name
+            row["frequency"].name, row["start_date"].isoformat(),
+            row["reminder_time"].isoformat() if row["reminder_time"] else None,
+        ))
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        # Unquoted empty fields are NULL in CSV COPY, which is how None is written
+        cursor.copy_expert(f"COPY habit ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def insert_habits(db: Session, rows: List[dict]):
+    """
+    Write a batch of validated habits in one round trip where the driver allows it.
+
+    Parameters:
+    - db (Session): Database session; the batch joins its current transaction.
+    - rows (List[dict]): Column values returned by `validate_row`.
+    """
+    if db.get_bind().dialect.driver == "psycopg2":
+        copy_habits(db, rows)
+    else:
+        db.execute(Habit.__table__.insert(), rows)
+
+
+def validated_batches(
+    stream: TextIO,
+    fmt: str,
+    user_id: int,
+    report: s.HabitImportResult,
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> Iterator[List[dict]]:
+    """
+    Read and validate the records of an import file, yielding the valid ones in batches.
+
+    Invalid rows are counted in `report` and the first MAX_IMPORT_ERRORS of them listed.
+
+    Parameters:
+    - stream (TextIO): The file, opened in text mode.
+    - fmt (str): 'csv' or 'json'.
+    - user_id (int): ID of the user the habits are created for.
+    - report (HabitImportResult): Receives the failed rows.
+    - batch_size (int): Habits per batch.
+
+    Yields:
+    - List[dict]: Column values of the next batch of habits.
+
+    Raises:
+    - HTTPException: 400 if the file cannot be read as `fmt`.
+    """
+    today = get_today()
+    batch = []
+
+    try:
+        for number, record in enumerate(read_rows(stream, fmt), start=1):
+            try:
+                batch.append(validate_row(record, user_id, today))
+            except ValueError as exc:
+                report.failed += 1
+                if len(report.errors) < MAX_IMPORT_ERRORS:
+                    report.errors.append(s.ImportRowError(row=number, error=str(exc)))
+                continue
+
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    except (csv.Error, json.JSONDecodeError, UnicodeDecodeError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Could not read the {fmt.upper()} file: {exc}"
+        )
+
+    if batch:
+        yield batch
+
+
+def finish_import(db: Session, user_id: int):
+    """
+    Commit an import and invalidate the user's cached habit reads.
+    """
+    bump_data_version(db, user_id)
+    db.commit()
+    habit_cache.invalidate_user(user_id)
+    record_write(user_id)
+
+
+def import_habits(
+    stream: TextIO,
+    fmt: str,
+    user_id: int,
+    db: Session,
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> s.HabitImportResult:
+    """
+    Import the habits of a CSV or JSON file for a user.
+
+    Valid rows are imported in a single transaction; invalid rows are skipped and
+    reported, so one bad row does not abort a large migration. Only one batch of rows
+    is held in memory at a time.
+
+    Parameters:
+    - stream (TextIO): The file, opened in text mode.
+    - fmt (str): 'csv' or 'json'.
+    - user_id (int): ID of the user the habits are created for.
+    - db (Session): Database session.
+    - batch_size (int): Habits written per round trip.
+
+    Returns:
+    - HabitImportResult: The number of imported and failed rows and the first errors.
+    """
+    report = s.HabitImportResult(imported=0, failed=0, errors=[])
+
+    try:
+        for batch in validated_batches(stream, fmt, user_id, report, batch_size):
+            insert_habits(db, batch)
+            report.imported += len(batch)
+    except HTTPException:
+        db.rollback()
+        raise
+
+    finish_import(db, user_id)
+    return report
+
+
+async def import_file(
+    db,
+    stream: TextIO,
+    fmt: str,
+    user_id: int,
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> s.HabitImportResult:
+    """
+    Import the habits of a CSV or JSON file for a user, like `import_habits`, with
+    either a Session or an AsyncSession.
+
+    A plain Session runs the whole import in the threadpool through `run_db`. With an
+    AsyncSession only the writes go through the session; each batch is read and
+    validated in the threadpool, so parsing a large file does not block the event loop.
+
+    Parameters:
+    - db (Session | AsyncSession): The request's session.
+    - stream (TextIO): The file, opened in text mode.
+    - fmt (str): 'csv' or 'json'.
+    - user_id (int): ID of the user the habits are created for.
+    - batch_size (int): Habits written per round trip.
+
+    Returns:
+    - HabitImportResult: The number of imported and failed rows and the first errors.
+    """
+    if not isinstance(db, AsyncSession):
+        return await run_db(db, import_habits, stream, fmt, user_id, batch_size=batch_size)
+
+    report = s.HabitImportResult(imported=0, failed=0, errors=[])
+    batches = validated_batches(stream, fmt, user_id, report, batch_size)
+
+    try:
+        while (batch := await run_in_threadpool(next, batches, None)) is not None:
+            await db.run_sync(insert_habits, batch)
+            report.imported += len(batch)
+    except HTTPException:
+        await db.rollback()
+        raise
+
+    await db.run_sync(finish_import, user_id)
+    return report
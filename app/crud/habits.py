@@ -5,6 +5,8 @@ Handles CRUD operations related to user habits:
 - Creating, updating, retrieving, and deleting habits
 - Supports filtering by category and frequency
 - Ensures actions are scoped to the authenticated user
+- Serves habit reads through `habit_cache`, invalidated on every write to a user's habits
+- Bumps the user's data version (see versions.py) with every write
 
 Dependencies:
 - FastAPI's HTTPException for error handling
@@ -12,13 +14,30 @@ Dependencies:
 """
 
 from sqlmodel import Session, select
+from sqlalchemy import func
 import app.schemas as s
-from app.models import Habit, Category, Frequency
-from app.utils import get_habit_of_user, normalize_name
+from app.models import Habit, HabitCompletion, HabitCompletionYear, Category, Frequency
+from app.utils import get_habit_of_user, get_today, normalize_name
 from typing import List, Optional
 from datetime import date
 from fastapi import HTTPException, status
 from app.crud.serializers import create_habit_summary
+from app.crud.pagination import keyset_page
+from app.crud.streaks import rebuild_streaks
+from app.crud.bitmaps import bitmap_storage, completed_on
+from app.cache import habit_cache
+from app.database import record_write
+from app.crud.versions import bump_data_version
+
+# Sort keys accepted by the paginated habit listing
+HABIT_SORT_COLUMNS = {
+    "id": Habit.id,
+    "name": Habit.name,
+    "start_date": Habit.start_date,
+}
+
+# Result types of the reads served through habit_cache; their adapters are built at startup
+CACHED_SCHEMAS = (List[s.HabitSummary], s.HabitPage, s.HabitSummary)
 
 
 def create_habit(habit: s.HabitCreate, user_id: int, db: Session) -> s.HabitSummary:
@@ -40,7 +59,10 @@ def create_habit(habit: s.HabitCreate, user_id: int, db: Session) -> s.HabitSumm
         start_date=date.today()
     )
     db.add(db_habit)
+    bump_data_version(db, user_id)
     db.commit()
+    habit_cache.invalidate_user(user_id)
+    record_write(user_id)
     db.refresh(db_habit)
 
     return create_habit_summary(db_habit)
@@ -60,46 +82,160 @@ def update_habit(habit_id: int, habit: s.HabitUpdate, user_id: int, db: Session)
     - HabitSummary: A summary of the updated habit.
     """
     db_habit = get_habit_of_user(habit_id, user_id, db)  # Ensures user owns the habit
+    old_frequency = db_habit.frequency
     
     habit_data = habit.model_dump()
     for key, value in habit_data.items():
         if value is not None:
             setattr(db_habit, key, value)  # Only update provided fields
 
+    bump_data_version(db, user_id)
     db.commit()
+
+    # Streaks are counted in periods of the frequency, so a new frequency recounts them
+    if db_habit.frequency != old_frequency:
+        rebuild_streaks(db, [habit_id])
+
+    habit_cache.invalidate_user(user_id)
+    record_write(user_id)
     db.refresh(db_habit)
     
     return create_habit_summary(db_habit)
 
 
-def get_habits(db: Session, user_id: int, category: Optional[Category] = None, frequency: Optional[Frequency] = None) -> List[s.HabitSummary]:
+def get_habits(
+    db: Session,
+    user_id: int,
+    category: Optional[Category] = None,
+    frequency: Optional[Frequency] = None,
+    version: Optional[int] = None,
+) -> List[s.HabitSummary]:
     """
     Retrieve a list of all habits for a user, optionally filtered by category and frequency.
+    The result is cached until the user's habits change.
 
     Parameters:
     - db (Session): The database session.
     - user_id (int): The ID of the user.
     - category (Optional[Category]): Filter habits by category (optional).
     - frequency (Optional[Frequency]): Filter habits by frequency (optional).
+    - version (Optional[int]): The user's data version the caller's ETag was built from;
+      part of the cache key, so the result is never older than that version.
 
     Returns:
     - List[HabitSummary]: A list of habit summaries.
     """
-    query = select(Habit).where(Habit.user_id == user_id)
+    def load():
+        query = select(Habit).where(Habit.user_id == user_id)
+
+        if category:
+            query = query.where(Habit.category == category)
+        if frequency:
+            query = query.where(Habit.frequency == frequency)
+
+        habits = db.exec(query).all()
+
+        return [create_habit_summary(habit) for habit in habits]
+
+    key = ("list", category, frequency, get_today(), version)
+    return habit_cache.get_or_load(user_id, key, List[s.HabitSummary], load)
+
+
+def get_habits_page(
+    db: Session,
+    user_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc",
+    category: Optional[Category] = None,
+    frequency: Optional[Frequency] = None,
+    version: Optional[int] = None,
+) -> s.HabitPage:
+    """
+    Retrieve one page of a user's habits using keyset pagination, cached until the user's habits change.
+
+    Parameters:
+    - db (Session): The database session.
+    - user_id (int): The ID of the user.
+    - limit (int): Maximum number of habits in the page.
+    - cursor (Optional[str]): The `next_cursor` of the previous page, if any.
+    - sort (str): Sort key, one of 'id', 'name' or 'start_date'.
+    - order (str): 'asc' or 'desc'.
+    - category (Optional[Category]): Filter habits by category (optional).
+    - frequency (Optional[Frequency]): Filter habits by frequency (optional).
+    - version (Optional[int]): The user's data version the caller's ETag was built from;
+      part of the cache key, so the page is never older than that version.
+
+    Returns:
+    - HabitPage: The habit summaries and the cursor of the next page, if any.
+    """
+    def load():
+        query = select(Habit).where(Habit.user_id == user_id)
+
+        if category:
+            query = query.where(Habit.category == category)
+        if frequency:
+            query = query.where(Habit.frequency == frequency)
+
+        habits, next_cursor = keyset_page(db, query, sort, HABIT_SORT_COLUMNS[sort], Habit.id, limit, cursor, order)
+
+        return s.HabitPage(items=[create_habit_summary(habit) for habit in habits], next_cursor=next_cursor)
+
+    key = ("page", limit, cursor, sort, order, category, frequency, get_today(), version)
+    return habit_cache.get_or_load(user_id, key, s.HabitPage, load)
+
+
+def get_habits_today(
+    db: Session,
+    user_id: int,
+    category: Optional[Category] = None,
+    frequency: Optional[Frequency] = None,
+) -> List[s.HabitTodayStatus]:
+    """
+    Retrieve every habit of a user together with its completion status for today.
+
+    One query LEFT JOINs each habit to its completion of today (or, with bitmap storage,
+    to its row of this year, testing today's bit), instead of a status lookup per habit.
+
+    Parameters:
+    - db (Session): The database session.
+    - user_id (int): The ID of the user.
+    - category (Optional[Category]): Filter habits by category (optional).
+    - frequency (Optional[Frequency]): Filter habits by frequency (optional).
+
+    Returns:
+    - List[HabitTodayStatus]: The user's habits ordered by ID, each with `completed_today`.
+    """
+    today = get_today()
+    if bitmap_storage():
+        completed_today = func.coalesce(completed_on(today), False).label("completed_today")
+        query = select(Habit, completed_today).outerjoin(
+            HabitCompletionYear,
+            (HabitCompletionYear.habit_id == Habit.id) & (HabitCompletionYear.year == today.year)
+        )
+    else:
+        completed_today = func.coalesce(HabitCompletion.status, False).label("completed_today")
+        query = select(Habit, completed_today).outerjoin(
+            HabitCompletion,
+            (HabitCompletion.habit_id == Habit.id) & (HabitCompletion.date == today)
+        )
+    query = query.where(Habit.user_id == user_id).order_by(Habit.id)
 
     if category:
         query = query.where(Habit.category == category)
     if frequency:
         query = query.where(Habit.frequency == frequency)
 
-    habits = db.exec(query).all()
-
-    return [create_habit_summary(habit) for habit in habits]
+    return [
+        s.HabitTodayStatus(**create_habit_summary(habit).model_dump(), completed_today=done)
+        for habit, done in db.exec(query).all()
+    ]
 
 
 def get_habit_by_id(habit_id: int, user_id: int, db: Session) -> s.HabitSummary:
     """
-    Get a single habit by its ID, ensuring the user owns it.
+    Get a single habit by its ID, ensuring the user owns it. Cached until the user's habits change.
 
     Parameters:
     - habit_id (int): The ID of the habit.
@@ -109,13 +245,16 @@ def get_habit_by_id(habit_id: int, user_id: int, db: Session) -> s.HabitSummary:
     Returns:
     - HabitSummary: The summary of the retrieved habit.
     """
-    db_habit = get_habit_of_user(habit_id, user_id, db)
-    return create_habit_summary(db_habit)
+    def load():
+        db_habit = get_habit_of_user(habit_id, user_id, db)
+        return create_habit_summary(db_habit)
+
+    return habit_cache.get_or_load(user_id, ("by_id", habit_id, get_today()), s.HabitSummary, load)
 
 
 def get_habit_by_name(name: str, user_id: int, db: Session) -> s.HabitSummary:
     """
-    Retrieve a habit by its normalized name.
+    Retrieve a habit by its normalized name. Cached until the user's habits change.
 
     Parameters:
     - name (str): The name of the habit.
@@ -129,18 +268,22 @@ def get_habit_by_name(name: str, user_id: int, db: Session) -> s.HabitSummary:
     - HTTPException: If the habit is not found or not owned by the user.
     """
     name = normalize_name(name)  # Normalize to match stored format
-    db_habit = db.exec(
-        select(Habit)
-        .where(Habit.user_id == user_id, Habit.name == name)
-    ).first()
-
-    if not db_habit:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Habit with name {name} not found or not authorized."
-        )
-    
-    return create_habit_summary(db_habit)
+
+    def load():
+        db_habit = db.exec(
+            select(Habit)
+            .where(Habit.user_id == user_id, Habit.name == name)
+        ).first()
+
+        if not db_habit:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Habit with name {name} not found or not authorized."
+            )
+        
+        return create_habit_summary(db_habit)
+
+    return habit_cache.get_or_load(user_id, ("by_name", name, get_today()), s.HabitSummary, load)
 
 
 def delete_habit(habit_id: int, user_id: int, db: Session) -> bool:
@@ -157,5 +300,8 @@ def delete_habit(habit_id: int, user_id: int, db: Session) -> bool:
     """
     db_habit = get_habit_of_user(habit_id, user_id, db)
     db.delete(db_habit)
+    bump_data_version(db, user_id)
     db.commit()
+    habit_cache.invalidate_user(user_id)
+    record_write(user_id)
     return True
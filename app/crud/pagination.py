@@ -0,0 +1,123 @@
+"""
+pagination.py
+
+Keyset (cursor) pagination shared by the listing endpoints.
+
+A page is read with `WHERE (sort_key, id) > (last_sort_key, last_id) ORDER BY sort_key, id LIMIT n`,
+so every page costs the same index range scan no matter how deep the client pages,
+unlike OFFSET. The position is handed to clients as an opaque cursor string.
+
+Functions:
+- encode_cursor / decode_cursor: Convert a page position to and from the opaque cursor.
+- keyset_page: Apply a cursor, ordering and limit to a query and return one page of rows.
+"""
+
+import base64
+import json
+from datetime import date
+from typing import Any, List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import Date, tuple_
+from sqlmodel import Session
+
+# Page size limits for listing endpoints
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(sort: str, order: str, value: Any, row_id: int) -> str:
+    """
+    Encode the position after a row into an opaque, URL-safe cursor.
+
+    Parameters:
+    - sort (str): Name of the sort key the page was ordered by.
+    - order (str): 'asc' or 'desc'.
+    - value (Any): The row's sort key value.
+    - row_id (int): The row's ID, which breaks ties between equal sort keys.
+
+    Returns:
+    - str: The cursor.
+    """
+    if isinstance(value, date):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort, "o": order, "v": value, "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str, is_date: bool = False) -> Tuple[Any, int]:
+    """
+    Decode a cursor produced by `encode_cursor` for the same sort key and order.
+
+    Parameters:
+    - cursor (str): The cursor sent back by the client.
+    - sort (str): The sort key of the current request.
+    - order (str): The order of the current request.
+    - is_date (bool): Whether the sort key value is a date.
+
+    Returns:
+    - Tuple[Any, int]: The sort key value and row ID to continue after.
+
+    Raises:
+    - HTTPException: 400 if the cursor is malformed or was issued for another sort.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["s"] != sort or payload["o"] != order:
+            raise ValueError("cursor was issued for a different sort")
+        value = date.fromisoformat(payload["v"]) if is_date else payload["v"]
+        return value, int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor; restart the listing without a cursor."
+        )
+
+
+def keyset_page(
+    db: Session,
+    query,
+    sort: str,
+    sort_column,
+    id_column,
+    limit: int,
+    cursor: Optional[str] = None,
+    order: str = "asc",
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Fetch one page of `query` ordered by (sort_column, id_column).
+
+    Parameters:
+    - db (Session): The database session.
+    - query (Select): The filtered query to paginate.
+    - sort (str): Public name of the sort key, embedded in the cursor.
+    - sort_column (Column): Column to order by.
+    - id_column (Column): Unique column breaking ties between equal sort keys.
+    - limit (int): Maximum rows in the page.
+    - cursor (Optional[str]): Cursor returned with the previous page, if any.
+    - order (str): 'asc' or 'desc'.
+
+    Returns:
+    - Tuple[List[Any], Optional[str]]: The page's rows and the cursor of the next page,
+      or None when this is the last page.
+    """
+    key = tuple_(sort_column, id_column)
+
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort, order, is_date=isinstance(sort_column.type, Date))
+        after = tuple_(value, row_id)
+        query = query.where(key > after if order == "asc" else key < after)
+
+    if order == "asc":
+        query = query.order_by(sort_column, id_column)
+    else:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+
+    # One extra row tells whether another page follows
+    rows = db.exec(query.limit(limit + 1)).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort, order, getattr(last, sort_column.key), getattr(last, id_column.key))
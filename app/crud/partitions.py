@@ -0,0 +1,219 @@
+"""
+partitions.py
+
+Monthly range partitions of the habitcompletion table on PostgreSQL.
+
+The migration 3e7a91c5d2f8 turns habitcompletion into a table partitioned by `date`,
+one partition per month plus a default partition. Each month then has its own small
+heap and indexes, vacuumed independently, and queries bounded on `date` only touch the
+months they cover. Future months must exist before rows arrive, so `maintain_partitions`
+is meant to run daily (e.g. from cron): it creates the coming months and, with a
+retention set, detaches the oldest ones. Rows that land in a month without a partition
+go to the default partition and are moved out when that month's partition is created,
+so a missed run never fails a write.
+
+On SQLite, or on a PostgreSQL database created by `create_all` without the migration,
+habitcompletion is a plain table and every function here is a no-op.
+
+Functions:
+- month_start / add_months / partition_name: Month arithmetic and partition naming.
+- is_partitioned: Whether habitcompletion is a partitioned table in this database.
+- monthly_partitions: The attached monthly partitions.
+- create_partition_statements: The SQL creating and attaching one month's partition.
+- create_partitions / detach_partitions: Add or detach the partitions of a range of months.
+- maintain_partitions: Create the coming months and detach the expired ones.
+"""
+
+import os
+import re
+from datetime import date
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from sqlmodel import Session
+
+# Partitioned table, and the partition receiving rows of months without their own
+PARENT = "habitcompletion"
+DEFAULT_PARTITION = "habitcompletion_default"
+
+# Name of a monthly partition, e.g. habitcompletion_p2025_01
+PARTITION_NAME = re.compile(r"^habitcompletion_p(\d{4})_(\d{2})$")
+
+# Months created ahead of the current one by each maintenance run
+PARTITION_MONTHS_AHEAD = int(os.getenv("COMPLETION_PARTITION_MONTHS_AHEAD", "3"))
+
+# Months of history kept attached before the current one; 0 keeps every month
+PARTITION_RETENTION_MONTHS = int(os.getenv("COMPLETION_PARTITION_RETENTION_MONTHS", "0"))
+
+# Serializes concurrent maintenance runs (e.g. cron firing on two hosts)
+ADVISORY_LOCK_KEY = 0x68616269  # 'habi'
+
+
+# ---------------------------- Months ----------------------------
+
+def month_start(day: date) -> date:
+    """
+    Return the first day of the month of `day`.
+    """
+    return day.replace(day=1)
+
+
+def add_months(month: date, count: int) -> date:
+    """
+    Return the first day of the month `count` months after (or before, if negative) `month`.
+    """
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """
+    Return the name of the partition holding the month of `month`.
+    """
+    return f"{PARENT}_p{month.year:04d}_{month.month:02d}"
+
+
+# ---------------------------- Catalog ----------------------------
+
+def is_partitioned(db: Session) -> bool:
+    """
+    Return True if habitcompletion is a partitioned table; always False on SQLite.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:parent))"),
+        {"parent": PARENT},
+    ).scalar()
+
+
+def monthly_partitions(db: Session) -> Dict[date, str]:
+    """
+    Return the attached monthly partitions, by the first day of their month.
+
+    The default partition and tables not following the naming scheme are left out.
+    """
+    names = db.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+             "WHERE i.inhparent = to_regclass(:parent)"),
+        {"parent": PARENT},
+    ).scalars()
+    return {
+        date(int(match[1]), int(match[2]), 1): name
+        for name in names if (match := PARTITION_NAME.match(name))
+    }
+
+
+# ---------------------------- Maintenance ----------------------------
+
+def create_partition_statements(month: date) -> List[str]:
+    """
+    Return the statements creating the partition of `month` and attaching it.
+
+    The partition is created detached, receives the month's rows from the default
+    partition, and is then attached, which checks that the default partition holds
+    no row of the month any more. The bounds and names come from a date, never from input.
+
+    Parameters:
+    - month (date): Any day of the month.
+
+    Returns:
+    - List[str]: The statements, to run in one transaction.
+    """
+    first, end = month_start(month), add_months(month_start(month), 1)
+    name = partition_name(first)
+    return [
+        f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS)",
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= '{first}' AND date < '{end}' RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM ('{first}') TO ('{end}')",
+    ]
+
+
+def _lock(db: Session):
+    # Held until the transaction ends
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+
+def create_partitions(db: Session, first: date, last: date) -> List[str]:
+    """
+    Create the missing partitions of the months from `first` through `last`.
+
+    Each partition is created in its own short transaction.
+
+    Parameters:
+    - db (Session): Database session; committed after each partition.
+    - first (date): A day of the first month.
+    - last (date): A day of the last month.
+
+    Returns:
+    - List[str]: Names of the partitions created.
+    """
+    if not is_partitioned(db):
+        return []
+
+    created = []
+    month = month_start(first)
+    while month <= last:
+        _lock(db)
+        if month not in monthly_partitions(db):
+            for statement in create_partition_statements(month):
+                db.execute(text(statement))
+            created.append(partition_name(month))
+        db.commit()
+        month = add_months(month, 1)
+    return created
+
+
+def detach_partitions(db: Session, before: date) -> List[str]:
+    """
+    Detach the partitions of the months ending on or before the month of `before`.
+
+    Detached partitions keep their rows as standalone tables, to be archived or dropped;
+    queries on habitcompletion no longer see them. Detaching takes a brief exclusive lock
+    on habitcompletion, so it is done one partition per transaction.
+
+    Parameters:
+    - db (Session): Database session; committed after each partition.
+    - before (date): A day of the first month to keep.
+
+    Returns:
+    - List[str]: Names of the partitions detached.
+    """
+    if not is_partitioned(db):
+        return []
+
+    detached = []
+    for month, name in sorted(monthly_partitions(db).items()):
+        if month >= month_start(before):
+            break
+        _lock(db)
+        db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        db.commit()
+        detached.append(name)
+    return detached
+
+
+def maintain_partitions(
+    db: Session,
+    today: Optional[date] = None,
+    months_ahead: int = PARTITION_MONTHS_AHEAD,
+    retention_months: int = PARTITION_RETENTION_MONTHS,
+) -> Dict[str, List[str]]:
+    """
+    Create the partitions of the current and coming months, and detach the expired ones.
+
+    Running it again is harmless. Nothing happens if habitcompletion is not partitioned.
+
+    Parameters:
+    - db (Session): Database session.
+    - today (Optional[date]): The current day (default: today).
+    - months_ahead (int): Months to create after the current one.
+    - retention_months (int): Months kept before the current one; 0 detaches nothing.
+
+    Returns:
+    - Dict[str, List[str]]: Names of the partitions 'created' and 'detached'.
+    """
+    current = month_start(today or date.today())
+    created = create_partitions(db, current, add_months(current, months_ahead))
+    detached = detach_partitions(db, add_months(current, -retention_months)) if retention_months > 0 else []
+    return {"created": created, "detached": detached}
@@ -11,12 +11,17 @@ Functions:
 
 import app.schemas as s
 from app.models import User, Habit
+from app.crud.streaks import current_streak
+from app.utils import get_today
 
 
 def create_habit_summary(habit: Habit) -> s.HabitSummary:
     """
     Convert a Habit ORM object to a HabitSummary Pydantic schema.
 
+    The current streak is reported as 0 once the habit has missed a whole period,
+    even though the stored value is only reset by the next completion.
+
     Parameters:
     - habit (Habit): The ORM object from the database.
 
@@ -31,6 +36,9 @@ def create_habit_summary(habit: Habit) -> s.HabitSummary:
         frequency=habit.frequency,
         reminder_time=habit.reminder_time,
         start_date=habit.start_date,
+        current_streak=current_streak(habit, get_today()),
+        longest_streak=habit.longest_streak,
+        last_completed_date=habit.last_completed_date,
     )
 
 
@@ -0,0 +1,255 @@
+"""
+stats.py
+
+Completion statistics of habits, computed with NumPy.
+
+Completion dates are fetched as plain integers (days since 1970-01-01) straight into
+NumPy arrays, so no ORM object or `date` is created per completion, and every metric
+is a vectorized operation over the whole history. With bitmap storage the year rows
+are unpacked into the same arrays with NumPy bit operations, and with row storage the
+archived months (see app.crud.archive) are merged in.
+
+Functions:
+- epoch_day: SQL expression converting a completion date to days since the epoch.
+- unpack_year_rows: Epoch days of the completions stored in year bitmaps.
+- compute_habit_stats: Compute the statistics of one habit from its epoch days.
+- get_habit_stats: Statistics of one of a user's habits.
+- get_user_habit_stats: Statistics of all of a user's habits, from a single query.
+"""
+
+from datetime import date
+from typing import List, Tuple
+import numpy as np
+from sqlalchemy import Integer, cast, func, type_coerce
+from sqlmodel import Session, select
+import app.schemas as s
+from app.models import Frequency, Habit, HabitCompletion, HabitCompletionMonth, HabitCompletionYear
+from app.utils import get_habit_of_user, get_today
+from app.crud.bitmaps import MONTH_COLUMNS, YEAR_COLUMNS, bitmap_storage
+from app.crud import archive
+
+EPOCH = date(1970, 1, 1)
+# Julian day number of 1970-01-01, as returned by SQLite's julianday()
+EPOCH_JULIAN_DAY = 2440587.5
+
+
+def epoch_day(db: Session):
+    """
+    Return a SQL expression for HabitCompletion.date as an integer number of days since 1970-01-01.
+
+    Parameters:
+    - db (Session): Database session, used to pick the dialect's date arithmetic.
+
+    Returns:
+    - ColumnElement: An integer-typed expression.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # date - date is already an integer number of days in PostgreSQL
+        return type_coerce(HabitCompletion.date - EPOCH, Integer)
+    return cast(func.julianday(HabitCompletion.date) - EPOCH_JULIAN_DAY, Integer)
+
+
+def unpack_year_rows(rows) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Unpack habitcompletionyear rows into the habit ID and epoch day of each completion.
+
+    Every month word is shifted by 0..30 at once, giving a (rows, 12, 31) array of bits
+    whose set positions are the completed days, so no `date` is built per completion.
+
+    Parameters:
+    - rows: Rows with habit_id, year and the month words, ordered by habit and year.
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray]: Habit IDs and epoch days, ordered by habit and day.
+    """
+    table = np.array([(row.habit_id, row.year, *(getattr(row, column) for column in MONTH_COLUMNS)) for row in rows],
+                     dtype=np.int64).reshape(-1, 14)
+    bits = (table[:, 2:, None] >> np.arange(31)) & 1
+    row_index, month, day = np.nonzero(bits)
+
+    months = (table[row_index, 1] - 1970) * 12 + month  # months since 1970-01
+    days = months.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64) + day
+    return table[row_index, 0], days
+
+
+def to_epoch_day(day: date) -> int:
+    return (day - EPOCH).days
+
+
+def month_label(month: int) -> str:
+    """
+    Format a month index (months since 1970-01) as 'YYYY-MM'.
+    """
+    return str(np.datetime64(int(month), "M"))
+
+
+def period_index(days: np.ndarray, frequency: Frequency) -> np.ndarray:
+    """
+    Map epoch days to the index of their period of `frequency` (Monday-start weeks).
+    """
+    if frequency == Frequency.WEEKLY:
+        return (days + 3) // 7  # 1970-01-01 was a Thursday
+    if frequency == Frequency.MONTHLY:
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    if frequency == Frequency.YEARLY:
+        return days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64)
+    return days
+
+
+def adherence(done: np.ndarray, window: int) -> float:
+    """
+    Share of the last `window` days (or all days, if fewer) that have a completion.
+    """
+    return round(float(done[-window:].mean()), 4)
+
+
+def compute_habit_stats(
+    days: np.ndarray,
+    frequency: Frequency,
+    start_date: date,
+    today: date,
+) -> dict:
+    """
+    Compute the statistics of a habit from its completion days.
+
+    The history runs from the habit's start date (or its first completion, if earlier)
+    through `today`; completions after `today` are ignored.
+
+    Parameters:
+    - days (np.ndarray): Distinct completion days as epoch days, in ascending order.
+    - frequency (Frequency): The habit's frequency; the completion rate counts its periods.
+    - start_date (date): The habit's start date.
+    - today (date): Last day of the history.
+
+    Returns:
+    - dict: The fields of `HabitStats` other than the habit's identity.
+    """
+    last = to_epoch_day(today)
+    days = days[days <= last]
+    first = min(to_epoch_day(start_date), int(days[0])) if days.size else to_epoch_day(start_date)
+    first = min(first, last)
+
+    # Share of the habit's periods (days, weeks, ...) with at least one completion
+    bounds = period_index(np.array([first, last]), frequency)
+    periods_done = np.unique(period_index(days, frequency)).size
+    completion_rate = periods_done / int(bounds[1] - bounds[0] + 1)
+
+    # One flag per day of the history
+    done = np.zeros(last - first + 1, dtype=bool)
+    done[days - first] = True
+
+    # Completions per calendar month of the history, including empty months
+    month_bounds = np.array([first, last]).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    per_month = np.bincount(months - month_bounds[0], minlength=int(month_bounds[1] - month_bounds[0] + 1))
+    best, worst = int(per_month.argmax()), int(per_month.argmin())
+
+    return {
+        "total_completions": int(days.size),
+        "completion_rate": round(completion_rate, 4),
+        "weekday_counts": np.bincount((days + 3) % 7, minlength=7).tolist(),  # Monday first
+        "adherence_7d": adherence(done, 7),
+        "adherence_30d": adherence(done, 30),
+        "best_month": s.MonthCount(month=month_label(month_bounds[0] + best), completions=int(per_month[best])),
+        "worst_month": s.MonthCount(month=month_label(month_bounds[0] + worst), completions=int(per_month[worst])),
+    }
+
+
+def habit_stats(habit, days: np.ndarray, today: date) -> s.HabitStats:
+    return s.HabitStats(
+        id=habit.id,
+        name=habit.name,
+        frequency=habit.frequency,
+        start_date=habit.start_date,
+        **compute_habit_stats(days, habit.frequency, habit.start_date, today),
+    )
+
+
+def get_habit_stats(habit_id: int, user_id: int, db: Session) -> s.HabitStats:
+    """
+    Compute the completion statistics of a habit.
+
+    Parameters:
+    - habit_id (int): The ID of the habit.
+    - user_id (int): The ID of the user who owns the habit.
+    - db (Session): The database session.
+
+    Returns:
+    - HabitStats: The habit's statistics.
+
+    Raises:
+    - HTTPException: If the habit does not exist or the user does not own it.
+    """
+    habit = get_habit_of_user(habit_id, user_id, db)
+
+    if bitmap_storage():
+        rows = db.exec(
+            select(*YEAR_COLUMNS).where(HabitCompletionYear.habit_id == habit_id).order_by(HabitCompletionYear.year)
+        )
+        _, days = unpack_year_rows(rows)
+    else:
+        day = epoch_day(db)
+        rows = db.exec(select(day).where(HabitCompletion.habit_id == habit_id).order_by(HabitCompletion.date))
+        days = np.fromiter(rows, dtype=np.int64)
+        archived = archive.archived_dates(db, habit_id)
+        if archived:
+            days = np.union1d(days, [to_epoch_day(completed) for completed in archived])
+
+    return habit_stats(habit, days, get_today())
+
+
+def get_user_habit_stats(user_id: int, db: Session) -> List[s.HabitStats]:
+    """
+    Compute the completion statistics of every habit of a user.
+
+    All completions (or year bitmaps) are read by one query, ordered by habit, into a
+    single pair of arrays that is then split per habit.
+
+    Parameters:
+    - user_id (int): The ID of the user.
+    - db (Session): The database session.
+
+    Returns:
+    - List[HabitStats]: The statistics of each habit, ordered by habit ID.
+    """
+    # Whether each habit has archived months, so the archive is only read when it matters
+    has_archive = select(HabitCompletionMonth.habit_id).where(HabitCompletionMonth.habit_id == Habit.id).exists()
+    habits = db.exec(
+        select(Habit.id, Habit.name, Habit.frequency, Habit.start_date, has_archive.label("archived"))
+        .where(Habit.user_id == user_id)
+        .order_by(Habit.id)
+    ).all()
+
+    if bitmap_storage():
+        rows = db.exec(
+            select(*YEAR_COLUMNS)
+            .join(Habit, Habit.id == HabitCompletionYear.habit_id)
+            .where(Habit.user_id == user_id)
+            .order_by(HabitCompletionYear.habit_id, HabitCompletionYear.year)
+        )
+        completion_habit_ids, days = unpack_year_rows(rows)
+    else:
+        rows = db.exec(
+            select(HabitCompletion.habit_id, epoch_day(db))
+            .join(Habit, Habit.id == HabitCompletion.habit_id)
+            .where(Habit.user_id == user_id)
+            .order_by(HabitCompletion.habit_id, HabitCompletion.date)
+        ).all()
+        completions = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        if any(habit.archived for habit in habits):
+            archived = archive.archived_completions(db, user_id)
+            # Sorted by habit then day again, without the days both archived and live
+            archived = np.array([(habit_id, to_epoch_day(day)) for habit_id, day in archived], dtype=np.int64)
+            completions = np.unique(np.concatenate([completions, archived]), axis=0)
+        completion_habit_ids, days = completions[:, 0], completions[:, 1]
+
+    # Each habit's completions are a contiguous slice of the sorted arrays
+    habit_ids = np.array([habit.id for habit in habits], dtype=np.int64)
+    starts = np.searchsorted(completion_habit_ids, habit_ids, side="left")
+    ends = np.searchsorted(completion_habit_ids, habit_ids, side="right")
+
+    today = get_today()
+    return [
+        habit_stats(habit, days[start:end], today)
+        for habit, start, end in zip(habits, starts, ends)
+    ]
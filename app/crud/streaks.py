@@ -0,0 +1,231 @@
+"""
+streaks.py
+
+Current and longest completion streaks of a habit, counted in the habit's own periods:
+a daily habit's streak is consecutive days, a weekly habit's consecutive weeks
+(starting Monday), and so on for months and years.
+
+The streak is stored on the habit and advanced in O(1) whenever a completion is
+recorded: only the habit's last completion date is needed to know whether the new
+completion extends the streak, starts a new one, or falls in an already counted period.
+
+Functions:
+- period_start / previous_period_start: Period boundaries for a frequency.
+- streak_update_statement: The UPDATE advancing a habit's streak for a new completion.
+- current_streak: The stored streak, or 0 if it has been broken since.
+- compute_streaks: Recompute the streaks from a habit's full completion history.
+- rebuild_streaks: Recompute and store the streaks of many habits in bulk.
+"""
+
+from datetime import date, timedelta
+from itertools import groupby
+from typing import Iterable, Optional, Sequence, Tuple
+from sqlalchemy import case, or_, update
+from sqlmodel import Session, select
+from app.models import Frequency, Habit, HabitCompletion, HabitCompletionMonth, HabitCompletionYear
+from app.crud.bitmaps import YEAR_COLUMNS, bitmap_storage, decode_year
+from app.crud.archive import ARCHIVE_COLUMNS, archived_dates_by_habit, merge_dates
+
+# Habits whose streaks are written per UPDATE round trip during a rebuild
+REBUILD_BATCH_SIZE = 1000
+
+
+# ---------------------------- Periods ----------------------------
+
+def period_start(day: date, frequency: Frequency) -> date:
+    """
+    Return the first day of the period of `frequency` containing `day`.
+    """
+    if frequency == Frequency.WEEKLY:
+        return day - timedelta(days=day.weekday())
+    if frequency == Frequency.MONTHLY:
+        return day.replace(day=1)
+    if frequency == Frequency.YEARLY:
+        return day.replace(month=1, day=1)
+    return day
+
+
+def previous_period_start(day: date, frequency: Frequency) -> date:
+    """
+    Return the first day of the period before the one containing `day`.
+    """
+    start = period_start(day, frequency)
+    if frequency == Frequency.WEEKLY:
+        return start - timedelta(days=7)
+    if frequency == Frequency.MONTHLY:
+        return (start - timedelta(days=1)).replace(day=1)
+    if frequency == Frequency.YEARLY:
+        return start.replace(year=start.year - 1)
+    return start - timedelta(days=1)
+
+
+# ---------------------------- Incremental update ----------------------------
+
+def frequency_case(day: date, boundary) -> case:
+    """
+    Build a CASE choosing `boundary(day, frequency)` for the habit row's own frequency.
+    """
+    return case(*[(Habit.frequency == frequency, boundary(day, frequency)) for frequency in Frequency])
+
+
+def streak_update_statement(habit_id: int, user_id: int, day: date):
+    """
+    Build the UPDATE that counts a completion on `day` into the habit's streak.
+
+    The new values are computed by the database from the stored ones: a last completion
+    in the previous period extends the streak, anything older starts a new streak of 1.
+    Period boundaries for every frequency are passed in, so the habit does not have to
+    be read first. A habit already completed in `day`'s period is left untouched, which
+    makes repeating the statement for the same day harmless.
+
+    Parameters:
+    - habit_id (int): ID of the habit.
+    - user_id (int): ID of the habit's owner; other users' habits are not updated.
+    - day (date): Date of the new completion; must not be before the last completion.
+
+    Returns:
+    - Update: The statement to execute.
+    """
+    current_start = frequency_case(day, period_start)
+    previous_start = frequency_case(day, previous_period_start)
+
+    new_current = case(
+        (Habit.last_completed_date >= previous_start, Habit.current_streak + 1),
+        else_=1,
+    )
+    return (
+        update(Habit)
+        .where(
+            Habit.id == habit_id,
+            Habit.user_id == user_id,
+            or_(Habit.last_completed_date.is_(None), Habit.last_completed_date < current_start),
+        )
+        .values(
+            current_streak=new_current,
+            longest_streak=case((new_current > Habit.longest_streak, new_current), else_=Habit.longest_streak),
+            last_completed_date=day,
+        )
+    )
+
+
+def current_streak(habit: Habit, today: date) -> int:
+    """
+    Return the habit's current streak as of `today`.
+
+    The stored streak stays as it was when the habit was last completed. It is still
+    running if that completion is in this period or the previous one (which can still
+    be continued today); otherwise it has been broken.
+    """
+    if habit.last_completed_date is None:
+        return 0
+    if habit.last_completed_date < previous_period_start(today, habit.frequency):
+        return 0
+    return habit.current_streak
+
+
+# ---------------------------- Rebuild ----------------------------
+
+def compute_streaks(dates: Iterable[date], frequency: Frequency) -> Tuple[int, int, Optional[date]]:
+    """
+    Compute the streaks of a habit from its completion dates.
+
+    Parameters:
+    - dates (Iterable[date]): Completion dates in ascending order.
+    - frequency (Frequency): The habit's frequency.
+
+    Returns:
+    - Tuple[int, int, Optional[date]]: The streak ending at the last completion, the
+      longest streak and the last completion date.
+    """
+    current = longest = 0
+    last = last_start = None
+
+    for day in dates:
+        start = period_start(day, frequency)
+        if start == last_start:
+            last = day
+            continue
+        current = current + 1 if last is not None and previous_period_start(day, frequency) == last_start else 1
+        longest = max(longest, current)
+        last, last_start = day, start
+
+    return current, longest, last
+
+
+def completion_row_dates(rows) -> Iterable[date]:
+    # A habit without completions has one outer-joined row with a NULL date
+    return (row.date for row in rows if row.date is not None)
+
+
+def year_row_dates(rows) -> Iterable[date]:
+    return (day for row in rows if row.year is not None for day in decode_year(row))
+
+
+def rebuild_streaks(
+    db: Session,
+    habit_ids: Optional[Sequence[int]] = None,
+    batch_size: int = REBUILD_BATCH_SIZE,
+) -> int:
+    """
+    Recompute the stored streaks from the habitcompletion table and its archived months
+    (or the year bitmaps, with bitmap storage).
+
+    Completions are streamed in (habit_id, date) order, so each habit is computed in
+    a single pass holding only its own dates, and the results are written back with
+    batched executemany UPDATEs.
+
+    Parameters:
+    - db (Session): Database session.
+    - habit_ids (Optional[Sequence[int]]): Only rebuild these habits; all habits if None.
+    - batch_size (int): Rows fetched and habits written per round trip.
+
+    Returns:
+    - int: Number of habits whose streaks were rebuilt.
+    """
+    habits = select(Habit.id, Habit.frequency)
+    if habit_ids is not None:
+        habits = habits.where(Habit.id.in_(habit_ids))
+    habits = habits.subquery()
+
+    if bitmap_storage():
+        rows = db.execute(
+            select(habits.c.id, habits.c.frequency, *YEAR_COLUMNS)
+            .outerjoin(HabitCompletionYear, HabitCompletionYear.habit_id == habits.c.id)
+            .order_by(habits.c.id, HabitCompletionYear.year)
+            .execution_options(yield_per=batch_size)
+        )
+        habit_dates = year_row_dates
+    else:
+        rows = db.execute(
+            select(habits.c.id, habits.c.frequency, HabitCompletion.date)
+            .outerjoin(HabitCompletion, HabitCompletion.habit_id == habits.c.id)
+            .order_by(habits.c.id, HabitCompletion.date)
+            .execution_options(yield_per=batch_size)
+        )
+        # The archived months are streamed alongside, in the same habit order
+        archived_dates = archived_dates_by_habit(db.execute(
+            select(*ARCHIVE_COLUMNS)
+            .join(habits, habits.c.id == HabitCompletionMonth.habit_id)
+            .order_by(HabitCompletionMonth.habit_id, HabitCompletionMonth.month)
+            .execution_options(yield_per=batch_size)
+        ))
+        habit_dates = lambda rows: merge_dates(completion_row_dates(rows), archived_dates(rows[0].id))
+
+    pending = []
+    rebuilt = 0
+    for habit_id, habit_rows in groupby(rows, key=lambda row: row.id):
+        habit_rows = list(habit_rows)
+        current, longest, last = compute_streaks(habit_dates(habit_rows), habit_rows[0].frequency)
+        pending.append({"id": habit_id, "current_streak": current, "longest_streak": longest, "last_completed_date": last})
+
+        if len(pending) >= batch_size:
+            db.execute(update(Habit), pending)
+            rebuilt += len(pending)
+            pending = []
+
+    if pending:
+        db.execute(update(Habit), pending)
+        rebuilt += len(pending)
+
+    db.commit()
+    return rebuilt
@@ -6,21 +6,37 @@ fetching user data, and deletion. Ensures usernames are normalized and password
 """
 
 from sqlmodel import Session, select
+from sqlalchemy.orm import selectinload
 import app.schemas as s
-from app.models import User
+from app.models import User, Habit
 from app.utils import normalize_username, get_user
-from typing import List
+from typing import List, Optional
 from fastapi import HTTPException, status
 from app.crud.serializers import create_user_summary
+from app.cache import habit_cache, invalidate_user_principals
+from app.database import record_write
+from app.crud.pagination import keyset_page
 
+# Loads the (id, name) of every habit of the selected users in one extra query,
+# which is all create_user_summary needs
+WITH_HABITS = selectinload(User.habits).load_only(Habit.id, Habit.name)
 
-def create_user(user: s.UserCreate, db: Session) -> s.UserSummary:
+# Sort keys accepted by the paginated user listing
+USER_SORT_COLUMNS = {
+    "id": User.id,
+    "username": User.username,
+}
+
+
+def create_user(user: s.UserCreate, db: Session, hashed_password: Optional[str] = None) -> s.UserSummary:
     """
     Create a new user in the database.
 
     Parameters:
     - user (UserCreate): User registration details.
     - db (Session): Database session.
+    - hashed_password (Optional[str]): Password hash computed ahead of time (e.g. in the
+      hashing pool); the password is hashed inline when omitted.
 
     Returns:
     - UserSummary: A simplified response model of the newly created user.
@@ -30,7 +46,10 @@ def create_user(user: s.UserCreate, db: Session) -> s.UserSummary:
         email=user.email,
         is_admin=user.is_admin
     )
-    db_user.set_password(user.password)  # Hash and store the password securely
+    if hashed_password:
+        db_user.password = hashed_password
+    else:
+        db_user.set_password(user.password)  # Hash and store the password securely
 
     db.add(db_user)
     db.commit()
@@ -42,7 +61,7 @@ def create_user(user: s.UserCreate, db: Session) -> s.UserSummary:
         email=db_user.email,
     )
 
-def update_user(user: s.UserUpdate, user_id: int, db: Session) -> s.UserSummary:
+def update_user(user: s.UserUpdate, user_id: int, db: Session, hashed_password: Optional[str] = None) -> s.UserSummary:
     """
     Update user information.
 
@@ -50,24 +69,31 @@ def update_user(user: s.UserUpdate, user_id: int, db: Session) -> s.UserSummary:
     - user (UserUpdate): Fields to update.
     - user_id (int): ID of the user to update.
     - db (Session): Database session.
+    - hashed_password (Optional[str]): Hash of the new password computed ahead of time;
+      the password is hashed inline when omitted.
 
     Returns:
     - UserSummary: Updated user summary.
     """
-    db_user = get_user(user_id, db)
+    db_user = get_user(user_id, db, [WITH_HABITS])
 
     # Update only fields that are provided
     if user.username:
         db_user.username = user.username
-    if user.password:
+    if hashed_password:
+        db_user.password = hashed_password
+    elif user.password:
         db_user.set_password(user.password)
     if user.email:
         db_user.email = user.email
 
+    # Serialize before committing, which would expire the user and its loaded habits
+    summary = create_user_summary(db_user)
     db.commit()
-    db.refresh(db_user)
+    invalidate_user_principals(user_id)  # Cached tokens must not outlive the old account details
+    record_write(user_id)
 
-    return create_user_summary(db_user)
+    return summary
 
 
 def get_users(db: Session) -> List[s.UserSummary]:
@@ -80,10 +106,28 @@ def get_users(db: Session) -> List[s.UserSummary]:
     Returns:
     - List[UserSummary]: List of all user summaries.
     """
-    db_users = db.exec(select(User)).all()
+    db_users = db.exec(select(User).options(WITH_HABITS)).all()
     return [create_user_summary(user) for user in db_users]
 
 
+def get_users_page(db: Session, limit: int, cursor: Optional[str] = None, sort: str = "id", order: str = "asc") -> s.UserPage:
+    """
+    Fetch one page of users using keyset pagination.
+
+    Parameters:
+    - db (Session): Database session.
+    - limit (int): Maximum number of users in the page.
+    - cursor (Optional[str]): The `next_cursor` of the previous page, if any.
+    - sort (str): Sort key, 'id' or 'username'.
+    - order (str): 'asc' or 'desc'.
+
+    Returns:
+    - UserPage: The user summaries and the cursor of the next page, if any.
+    """
+    db_users, next_cursor = keyset_page(db, select(User).options(WITH_HABITS), sort, USER_SORT_COLUMNS[sort], User.id, limit, cursor, order)
+    return s.UserPage(items=[create_user_summary(user) for user in db_users], next_cursor=next_cursor)
+
+
 def get_user_by_id(user_id: int, db: Session) -> s.UserSummary:
     """
     Fetch a single user by ID.
@@ -95,7 +139,7 @@ def get_user_by_id(user_id: int, db: Session) -> s.UserSummary:
     Returns:
     - UserSummary: Summary of the user.
     """
-    db_user = get_user(user_id, db)
+    db_user = get_user(user_id, db, [WITH_HABITS])
     return create_user_summary(db_user)
 
 
@@ -115,7 +159,7 @@ def get_user_by_username(username: str, db: Session) -> s.UserSummary:
     """
     username = normalize_username(username)
     db_user = db.exec(
-        select(User).where(User.username == username)
+        select(User).where(User.username == username).options(WITH_HABITS)
     ).first()
 
     if not db_user:
@@ -141,4 +185,7 @@ def delete_user(user_id: int, db: Session) -> bool:
     db_user = get_user(user_id, db)
     db.delete(db_user)
     db.commit()
+    invalidate_user_principals(user_id)  # Reject the user's outstanding tokens right away
+    habit_cache.invalidate_user(user_id)
+    record_write(user_id)
     return True
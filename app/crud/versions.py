@@ -0,0 +1,76 @@
+"""
+versions.py
+
+Per-user data version backing the ETags of habit and completion reads.
+
+Every write to a user's habits or completions increments `User.data_version` in the
+same transaction, so an ETag built from it changes exactly when something the user
+can read may have changed, and every worker agrees on it.
+
+Functions:
+- bump_statement: The UPDATE incrementing a user's data version.
+- bump_data_version: Increment it within the session's transaction.
+- get_data_version: Read a user's current data version.
+- data_etag: The weak ETag of a user's data at a version.
+- etag_matches: Whether an If-None-Match header matches an ETag.
+"""
+
+from datetime import date
+from typing import Optional
+from sqlalchemy import update
+from sqlmodel import Session, select
+from app.models import User
+
+
+def bump_statement(user_id: int):
+    """
+    Build the UPDATE incrementing a user's data version.
+    """
+    return update(User).where(User.id == user_id).values(data_version=User.data_version + 1)
+
+
+def bump_data_version(db: Session, user_id: int) -> None:
+    """
+    Increment a user's data version; committed with the caller's write.
+
+    Parameters:
+    - db (Session): The session holding the write.
+    - user_id (int): Owner of the changed habits or completions.
+    """
+    db.exec(bump_statement(user_id))
+
+
+def get_data_version(user_id: int, db: Session) -> int:
+    """
+    Read a user's current data version (a primary key lookup).
+
+    Parameters:
+    - user_id (int): The ID of the user.
+    - db (Session): The database session.
+
+    Returns:
+    - int: The version, or 0 if the user does not exist.
+    """
+    return db.exec(select(User.data_version).where(User.id == user_id)).first() or 0
+
+
+def data_etag(user_id: int, version: int, today: date) -> str:
+    """
+    Return the weak ETag of a user's habit data at `version`.
+
+    The day is part of it because summaries report the current streak, which drops
+    to 0 when a day passes without a completion even though nothing was written.
+    """
+    return f'W/"{user_id}.{version}.{today.isoformat()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Return True if an If-None-Match header matches `etag`, comparing weakly (RFC 9110).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
@@ -1,4 +1,17 @@
+import logging
+import threading
+import time
+from typing import AsyncIterator, Optional
 from sqlmodel import create_engine, SQLModel, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+from app.metrics import instrument_engine
+from app.logs import log_slow_queries
+from app.cache import TTLCache, habit_cache
 from dotenv import load_dotenv
 import os
 
@@ -8,18 +21,331 @@ load_dotenv()
 # Retrieve the database URL from the environment variable
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-from urllib.parse import unquote
-
-print(f"Raw DATABASE_URL from environment: {os.getenv('DATABASE_URL')}")
-print(f"Decoded DATABASE_URL: {unquote(os.getenv('DATABASE_URL'))}")
-
 # Raise an error if the DATABASE_URL is not found in the .env file
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not found in .env file")
 
-# Create the database engine using the DATABASE_URL
-# 'echo=True' enables SQLAlchemy logging for SQL queries executed
-engine = create_engine(DATABASE_URL, echo=True)
+# Serve requests through an AsyncSession (asyncpg / aiosqlite) instead of the
+# blocking Session when DB_ASYNC is enabled
+DB_ASYNC = os.getenv("DB_ASYNC", "false").strip().lower() in ("1", "true", "yes")
+
+# Log every SQL statement (costly under load; meant for debugging)
+DB_ECHO = os.getenv("DB_ECHO", "false").strip().lower() in ("1", "true", "yes")
+
+# Statements go through SQLAlchemy's logger, and so through the JSON log queue, rather
+# than echo=True's handler writing to stdout from the request's thread
+if DB_ECHO:
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+
+# Connection pool of each engine (per worker process): connections kept open, extra
+# connections allowed under load, seconds to wait for a free one before failing, seconds
+# after which a connection is replaced, and whether to test connections on checkout
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").strip().lower() in ("1", "true", "yes")
+
+# Connections each worker opens, in parallel, while starting up, so the first requests
+# do not pay for the connection handshakes (capped at DB_POOL_SIZE)
+DB_POOL_WARM = int(os.getenv("DB_POOL_WARM", "2"))
+
+# Schema handling when a worker starts: 'create_all' creates missing tables, 'verify'
+# only checks with one query that the database is at the Alembic head revision (for
+# deploys that run `alembic upgrade head` beforehand), 'skip' does neither
+DB_STARTUP = os.getenv("DB_STARTUP", "create_all").strip().lower()
+
+DB_STARTUP_MODES = ("create_all", "verify", "skip")
+if DB_STARTUP not in DB_STARTUP_MODES:
+    raise ValueError(f"DB_STARTUP must be one of {', '.join(DB_STARTUP_MODES)}, got '{DB_STARTUP}'")
+
+# Async drivers used for each supported database backend
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    """
+    Convert a synchronous database URL into its async driver equivalent.
+
+    Args:
+    - url (str): A URL such as 'postgresql://...' or 'sqlite:///habits.db'.
+
+    Returns:
+    - str: The same URL using the asyncpg or aiosqlite driver.
+
+    Raises:
+    - ValueError: If the backend has no supported async driver.
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def enable_sqlite_foreign_keys(engine):
+    """
+    Turn on foreign key enforcement for every connection of a SQLite engine.
+
+    SQLite ignores foreign keys by default, but the models rely on the database's
+    ON DELETE CASCADE to remove a deleted user's habits and a deleted habit's completions.
+    Engines of other databases are left untouched.
+
+    Args:
+    - engine (Engine): A synchronous engine (pass `async_engine.sync_engine` for async ones).
+    """
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _enable_foreign_keys)
+
+# ---------------------------- Connection Pool ----------------------------
+
+class PoolMetrics:
+    """
+    Checkout counters of a connection pool, shared by the pool and its replacements.
+
+    Attributes:
+    - checkouts (int): Connections handed out.
+    - timeouts (int): Checkouts that gave up after DB_POOL_TIMEOUT.
+    - wait_seconds_total (float): Time spent waiting for connections, over all checkouts.
+    - wait_seconds_max (float): Longest single wait.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, waited: float, timed_out: bool):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.timeouts,
+                "checkout_wait_seconds_total": round(self.wait_seconds_total, 6),
+                "checkout_wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+class MeteredPoolMixin:
+    """
+    Times every checkout of a queue pool and counts the ones that time out.
+
+    A fresh pool created by `recreate` (after `dispose` or a disconnect) keeps the
+    same counters.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - started, timed_out=False)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class MeteredQueuePool(MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncPool(MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# SQLAlchemy names a pool's logger after the module of its class, which would put these
+# under the app's INFO logger; keep them as quiet as SQLAlchemy's own pools
+for _pool_class in (MeteredQueuePool, MeteredAsyncPool):
+    logging.getLogger(f"{__name__}.{_pool_class.__name__}").setLevel(logging.WARNING)
+
+
+def engine_options(url: str, asynchronous: bool = False) -> dict:
+    """
+    Return the create_engine keyword arguments for the configured pool settings.
+
+    In-memory SQLite databases live inside a single connection, so they keep
+    SQLAlchemy's default pool.
+
+    Args:
+    - url (str): The database URL the engine is created for.
+    - asynchronous (bool): Whether the engine is an async one.
+
+    Returns:
+    - dict: Keyword arguments for `create_engine` / `create_async_engine`.
+    """
+    options = {}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return options
+
+    options.update(
+        poolclass=MeteredAsyncPool if asynchronous else MeteredQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    return options
+
+
+def pool_stats(engine) -> dict:
+    """
+    Report how saturated an engine's connection pool is.
+
+    Args:
+    - engine (Engine | AsyncEngine): The engine to inspect.
+
+    Returns:
+    - dict: Pool size, connections checked out and idle, overflow in use, and the
+      checkout counters; only the pool class for pools without a fixed size.
+    """
+    pool = getattr(engine, "sync_engine", engine).pool
+    stats = {"pool": type(pool).__name__}
+    if not isinstance(pool, QueuePool):
+        return stats
+
+    stats.update(
+        size=pool.size(),
+        max_overflow=pool._max_overflow,  # no public accessor
+        checked_out=pool.checkedout(),
+        checked_in=pool.checkedin(),
+        overflow=max(0, pool.overflow()),  # negative while the pool is not yet full
+        timeout=pool.timeout(),
+    )
+    if isinstance(pool, MeteredPoolMixin):
+        stats.update(pool.metrics.snapshot())
+    return stats
+
+
+# ---------------------------- Engines ----------------------------
+
+# The async engine is only created in async mode so the async drivers stay optional
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (to_async_url(DATABASE_URL) if DB_ASYNC else None)
+
+# Optional read replica serving the read-only routes; its async URL is derived like the primary's
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+ASYNC_DATABASE_REPLICA_URL = os.getenv("ASYNC_DATABASE_REPLICA_URL") or (
+    to_async_url(DATABASE_REPLICA_URL) if DB_ASYNC and DATABASE_REPLICA_URL else None
+)
+
+# Seconds after a user's write during which their reads stay on the primary, so they
+# see their own changes while the replica catches up (keep above the replication lag)
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+
+# Recent writers remembered per worker; beyond it the oldest are forgotten early
+REPLICA_STICKY_USERS = int(os.getenv("REPLICA_STICKY_USERS", "100000"))
+
+# Engines are created on first use (the lifespan's startup, a CLI command or a test),
+# so importing the app loads no database driver
+_engines = {}
+_engine_lock = threading.Lock()
+
+
+def _configure(engine):
+    enable_sqlite_foreign_keys(engine)
+    instrument_engine(engine)
+    log_slow_queries(engine)
+
+
+def _lazy_engine(name: str, url: Optional[str], asynchronous: bool):
+    """
+    Return the engine registered as `name`, creating it for `url` on the first call;
+    None when `url` is not configured.
+    """
+    engine = _engines.get(name)
+    if engine is None and url:
+        with _engine_lock:
+            engine = _engines.get(name)
+            if engine is None:
+                create = create_async_engine if asynchronous else create_engine
+                engine = create(url, **engine_options(url, asynchronous=asynchronous))
+                _configure(engine.sync_engine if asynchronous else engine)
+                _engines[name] = engine
+    return engine
+
+
+def get_engine():
+    """
+    Return the synchronous engine, creating it on the first call.
+    """
+    return _lazy_engine("primary", DATABASE_URL, asynchronous=False)
+
+
+def get_async_engine():
+    """
+    Return the async engine, creating it on the first call; None unless DB_ASYNC is enabled.
+    """
+    return _lazy_engine("async", ASYNC_DATABASE_URL, asynchronous=True) if DB_ASYNC else None
+
+
+def get_replica_engine():
+    """
+    Return the engine serving reads in the session mode in use (async with DB_ASYNC),
+    creating it on the first call; None when DATABASE_REPLICA_URL is not set.
+    """
+    if DB_ASYNC:
+        return _lazy_engine("async_replica", ASYNC_DATABASE_REPLICA_URL, asynchronous=True)
+    return _lazy_engine("replica", DATABASE_REPLICA_URL, asynchronous=False)
+
+
+def get_request_engine():
+    """
+    Return the engine serving requests: the async one in async mode, the synchronous one otherwise.
+    """
+    return get_async_engine() if DB_ASYNC else get_engine()
+
+
+async def dispose_engines():
+    """
+    Close the pooled connections of the engines created so far.
+    """
+    for engine in list(_engines.values()):
+        if isinstance(engine, AsyncEngine):
+            await engine.dispose()
+        else:
+            engine.dispose()
+
+
+def __getattr__(name: str):
+    # `from app.database import engine` keeps working and creates the engine on demand
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def database_pool_stats() -> dict:
+    """
+    Report the pool of the engine serving requests (the async one in async mode).
+    """
+    return pool_stats(get_request_engine())
 
 # ---------------------------- Database Initialization ----------------------------
 
@@ -27,14 +353,14 @@ def init_db():
     """
     Initialize the database by creating all tables defined in SQLModel models.
 
-    It should be called once at the start of the application to ensure the 
+    It should be called once at the start of the application to ensure the
     database schema is up-to-date.
     """
-    SQLModel.metadata.create_all(engine)
+    SQLModel.metadata.create_all(get_engine())
 
 # ---------------------------- Session Management ----------------------------
 
-def get_db():
+def get_sync_db():
     """
     Provides a database session to interact with the database.
 
@@ -46,8 +372,153 @@ def get_db():
     Yields:
     - Session: A SQLAlchemy Session object used to interact with the database.
     """
-    with Session(engine) as db:
+    with Session(get_engine()) as db:
         try:
             yield db  # Yield the session to be used by FastAPI endpoints
         finally:
             db.close()  # Ensure the session is closed after usage
+
+async def get_async_db():
+    """
+    Provides an async database session backed by the async engine.
+
+    Objects are not expired on commit, since reloading an expired attribute
+    outside of the session's greenlet is not possible with asyncio.
+
+    Yields:
+    - AsyncSession: A SQLModel AsyncSession used to interact with the database.
+    """
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as db:
+        yield db
+
+# The session dependency used by every route, selected by DB_ASYNC
+get_db = get_async_db if DB_ASYNC else get_sync_db
+
+# ---------------------------- Read Replica ----------------------------
+
+# Users who wrote within the last REPLICA_STICKY_SECONDS, mapped to the time of the write.
+# With a shared (Redis) habit cache the writes are noted there as well, for every worker
+recent_writes = TTLCache(REPLICA_STICKY_USERS)
+
+def record_write(user_id: int):
+    """
+    Note that a user just changed their data, so their reads stay on the primary for
+    REPLICA_STICKY_SECONDS. Called after the write is committed.
+
+    Args:
+    - user_id (int): The ID of the user who wrote.
+    """
+    now = time.time()
+    recent_writes.set(user_id, now, now + REPLICA_STICKY_SECONDS)
+    if get_replica_engine() is not None:
+        habit_cache.mark_write(user_id, REPLICA_STICKY_SECONDS)
+
+def wrote_recently(user_id: int) -> bool:
+    """
+    Return True if the user wrote within the last REPLICA_STICKY_SECONDS, on this worker
+    or, with a shared habit cache, on any worker.
+
+    The shared check matters because reads cache their results: a worker that had not
+    seen the write would otherwise read the lagging replica and store the old rows under
+    the generation the write started, serving them to every worker until the next write.
+    """
+    return recent_writes.get(user_id) is not None or habit_cache.wrote_recently(user_id)
+
+def open_replica_session(user_id: int):
+    """
+    Open a session on the read replica for a read-only request of a user.
+
+    Args:
+    - user_id (int): The ID of the user making the request.
+
+    Returns:
+    - Session | AsyncSession | None: A session on the replica, or None when no replica
+      is configured or the user wrote recently and must read from the primary.
+    """
+    engine = get_replica_engine()
+    if engine is None or wrote_recently(user_id):
+        return None
+    if isinstance(engine, AsyncEngine):
+        return AsyncSession(engine, expire_on_commit=False)
+    return Session(engine)
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Run a CRUD function against either a Session or an AsyncSession.
+
+    The CRUD layer is written once against the synchronous Session API. With an
+    AsyncSession the function is executed through `AsyncSession.run_sync`, so every
+    statement it issues awaits the async driver. With a plain Session the function
+    runs in the threadpool, so waiting on the pool or a query never blocks the event loop,
+    and the session is closed afterwards so its connection goes back to the pool instead
+    of being held while the request waits for its next threadpool slot.
+
+    Args:
+    - db (Session | AsyncSession): The session provided by `get_db`.
+    - fn (Callable): A function accepting the session as its `db` keyword argument.
+    - *args, **kwargs: Remaining arguments forwarded to `fn`.
+
+    Returns:
+    - Any: Whatever `fn` returns.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(lambda session: fn(*args, db=session, **kwargs))
+
+    def call_and_release():
+        try:
+            return fn(*args, db=db, **kwargs)
+        finally:
+            db.close()
+
+    return await run_in_threadpool(call_and_release)
+
+async def close_db(db):
+    """
+    Close a Session or an AsyncSession, releasing its connection to the pool.
+
+    Args:
+    - db (Session | AsyncSession): The session to close.
+    """
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
+
+async def stream_db(db, statement, batch_size: int, close: bool = True) -> AsyncIterator[list]:
+    """
+    Stream the rows of a SELECT in batches through either a Session or an AsyncSession.
+
+    The statement runs with `yield_per`, so rows are pulled from a server-side cursor
+    (or fetched incrementally on SQLite) one batch at a time and never held all at once.
+    With a plain Session each fetch runs in the threadpool, like `run_db`.
+
+    The generator is meant to be consumed by a StreamingResponse, which runs after the
+    request's dependencies have exited, so it closes the session itself once the last
+    batch is read or the client disconnects.
+
+    Args:
+    - db (Session | AsyncSession): The session provided by `get_db`.
+    - statement (Select): The query to stream.
+    - batch_size (int): Number of rows fetched per round trip.
+    - close (bool): Close the session at the end; False when several streams share it
+      and the caller closes it after the last one.
+
+    Yields:
+    - list: The next batch of rows.
+    """
+    statement = statement.execution_options(yield_per=batch_size)
+
+    try:
+        if isinstance(db, AsyncSession):
+            result = await db.stream(statement)
+            async for batch in result.partitions():
+                yield batch
+            return
+
+        result = await run_in_threadpool(db.execute, statement)
+        batches = result.partitions()
+        while (batch := await run_in_threadpool(next, batches, None)) is not None:
+            yield batch
+    finally:
+        if close:
+            await close_db(db)
@@ -0,0 +1,176 @@
+"""
+hashing.py
+
+Runs bcrypt password hashing and verification in a dedicated, size-limited process pool
+so a burst of logins or signups cannot monopolise the event loop (or the GIL) of the
+worker serving habit reads.
+
+Requests beyond the pool's queue capacity are rejected with 503 instead of piling up,
+and the pool keeps counters separating time spent waiting in the queue from time
+spent hashing.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from fastapi import HTTPException, status
+
+# Number of worker processes doing bcrypt work
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", min(4, os.cpu_count() or 1)))
+
+# Number of hashing jobs allowed to wait for a free worker before rejecting with 503
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "32"))
+
+# ---------------------------- bcrypt Primitives ----------------------------
+
+def hash_password(password: str) -> str:
+    """
+    Hash a plain text password with a fresh bcrypt salt.
+
+    Args:
+    - password (str): The plain text password.
+
+    Returns:
+    - str: The bcrypt hash, decoded for storage.
+    """
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def check_password(password: str, hashed: str) -> bool:
+    """
+    Check a plain text password against a stored bcrypt hash.
+
+    Args:
+    - password (str): The plain text password.
+    - hashed (str): The stored bcrypt hash.
+
+    Returns:
+    - bool: True if the password matches.
+    """
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+def _timed_call(fn, *args):
+    """
+    Run `fn` inside a worker process, reporting when it started and how long it took.
+    """
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time() - started
+
+# ---------------------------- Hashing Pool ----------------------------
+
+class HashingPool:
+    """
+    Bounded process pool for bcrypt work, shared by every request of the worker.
+
+    Attributes:
+    - size (int): Number of worker processes.
+    - max_pending (int): Jobs allowed in flight (running plus queued) before rejecting.
+    """
+
+    def __init__(self, size: int, queue_limit: int):
+        self.size = size
+        self.max_pending = size + queue_limit
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        # Metrics
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_seconds_total = 0.0
+        self.queue_wait_seconds_max = 0.0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Workers are spawned rather than forked, since the server process is multi-threaded
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many password operations in progress, please retry shortly.",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+
+        submitted = time.time()
+        try:
+            future = self._get_executor().submit(_timed_call, fn, *args)
+            result, started, elapsed = await asyncio.wrap_future(future)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        waited = max(0.0, started - submitted)
+        with self._lock:
+            self.completed += 1
+            self.queue_wait_seconds_total += waited
+            self.queue_wait_seconds_max = max(self.queue_wait_seconds_max, waited)
+            self.hash_seconds_total += elapsed
+            self.hash_seconds_max = max(self.hash_seconds_max, elapsed)
+        return result
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password in the pool.
+
+        Raises:
+        - HTTPException: 503 if the pool's queue is full.
+        """
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        """
+        Verify a password against a stored hash in the pool.
+
+        Raises:
+        - HTTPException: 503 if the pool's queue is full.
+        """
+        return await self._run(check_password, password, hashed)
+
+    def stats(self) -> dict:
+        """
+        Return a snapshot of the pool's counters.
+
+        Returns:
+        - dict: In-flight jobs, completed and rejected counts, and total / max
+          seconds spent waiting in the queue and hashing.
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "max_pending": self.max_pending,
+                "in_flight": self._pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "queue_wait_seconds_total": self.queue_wait_seconds_total,
+                "queue_wait_seconds_max": self.queue_wait_seconds_max,
+                "hash_seconds_total": self.hash_seconds_total,
+                "hash_seconds_max": self.hash_seconds_max,
+            }
+
+    def shutdown(self):
+        """
+        Stop the worker processes; a later job starts a fresh pool.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+# Pool shared by the login, signup and password change routes
+hashing_pool = HashingPool(HASH_POOL_SIZE, HASH_QUEUE_LIMIT)
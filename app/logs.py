@@ -0,0 +1,269 @@
+"""
+logs.py
+
+Structured JSON logging, request IDs and the slow query log.
+
+Log calls only put the record on an in-memory queue; a listener thread formats it as
+one JSON object per line and writes it to stdout, so a request never waits on the
+terminal or a log collector. The ID of the request being served is attached to every
+record, and echoed in the X-Request-ID response header so a client report can be
+matched with the logs.
+
+Functions / classes:
+- configure_logging: Send the app's (and SQLAlchemy's) log records through the queue.
+- JsonFormatter: Format records as single-line JSON objects.
+- RequestIdMiddleware: ASGI middleware assigning each request its ID.
+- parameter_shape: Describe a statement's bound parameters without their values.
+- log_slow_queries: Log an engine's statements that run longer than SLOW_QUERY_MS.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from sqlalchemy import event
+
+# Level of the app's loggers
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+
+# Statements taking at least this many milliseconds are logged (0 logs every statement)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+# Fraction of the slow statements that are logged, to bound the volume when the database is struggling
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", "1.0"))
+
+# Longest statement text kept in a slow query record
+SLOW_QUERY_MAX_LENGTH = 2000
+
+# Header carrying the request ID, accepted from the client (e.g. a proxy) when well formed
+REQUEST_ID_HEADER = b"x-request-id"
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,128}")
+
+# Loggers sent through the queue
+LOGGERS = ("app", "sqlalchemy.engine")
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+
+class RequestContext:
+    """
+    The request being served, set by RequestIdMiddleware.
+    """
+    __slots__ = ("request_id", "scope")
+
+    def __init__(self, request_id: str, scope: dict):
+        self.request_id = request_id
+        self.scope = scope
+
+    @property
+    def route(self) -> Optional[str]:
+        # Known once routing has run
+        route = self.scope.get("route")
+        return route.path if route is not None else None
+
+
+# The request being served; copied into threadpool calls
+current_request_context: ContextVar[Optional[RequestContext]] = ContextVar("current_request_context", default=None)
+
+
+# ---------------------------- Formatting ----------------------------
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format a record as a JSON object on one line.
+
+    Besides the time, level, logger and message, the object holds the request ID and
+    every field passed through `extra`. Values JSON cannot encode are written as strings.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Queue records for the listener thread, capturing what only the logging thread knows.
+
+    The request ID is read from the context variable and the message and traceback are
+    rendered before the record leaves the thread; the JSON formatting and the write are
+    left to the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))  # other handlers may see the original
+        context = current_request_context.get()
+        if context is not None and not getattr(record, "request_id", None):
+            record.request_id = context.request_id
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(stream=None) -> None:
+    """
+    Send the records of the app's and SQLAlchemy's loggers through the JSON queue.
+
+    The listener thread is started on the first call and flushed at exit; later calls
+    do nothing. The loggers do not propagate, so a root handler (e.g. one installed by
+    a server) does not print the records a second time.
+
+    Args:
+    - stream (TextIO): Where the listener writes, stdout by default.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    handler = ContextQueueHandler(records)
+    for name in LOGGERS:
+        logger = logging.getLogger(name)
+        logger.addHandler(handler)
+        logger.propagate = False
+    logging.getLogger("app").setLevel(LOG_LEVEL)
+
+
+# ---------------------------- Request IDs ----------------------------
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving every HTTP request an ID for its log records.
+
+    A well formed X-Request-ID sent by the client or a proxy is kept, otherwise a
+    random one is generated; either way it is returned in the response's X-Request-ID.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")
+                break
+        if request_id is None or not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            await send(message)
+
+        token = current_request_context.set(RequestContext(request_id, scope))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request_context.reset(token)
+
+
+# ---------------------------- Slow Queries ----------------------------
+
+slow_query_logger = logging.getLogger("app.sql")
+
+
+def _types(parameters):
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def parameter_shape(parameters, executemany: bool) -> dict:
+    """
+    Describe the bound parameters of a statement by count and type, never by value.
+
+    Args:
+    - parameters (tuple | dict | list): The parameters passed to the DBAPI cursor.
+    - executemany (bool): Whether `parameters` holds one set per row.
+
+    Returns:
+    - dict: `parameter_count` and `parameter_types` (of the first row for executemany,
+      with the number of rows in `rows`).
+    """
+    if executemany:
+        first = parameters[0] if parameters else ()
+        return {"rows": len(parameters), "parameter_count": len(first), "parameter_types": _types(first)}
+    return {"parameter_count": len(parameters or ()), "parameter_types": _types(parameters)}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context, so a statement that raises leaves nothing behind
+    context._slow_query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slow_query_started", None)
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+    if SLOW_QUERY_SAMPLE_RATE < 1 and random.random() >= SLOW_QUERY_SAMPLE_RATE:
+        return
+
+    fields = {
+        "duration_ms": round(elapsed_ms, 3),
+        "statement": " ".join(statement.split())[:SLOW_QUERY_MAX_LENGTH],
+        **parameter_shape(parameters, executemany),
+    }
+    request = current_request_context.get()
+    if request is not None:
+        fields["route"] = request.route
+        fields["method"] = request.scope["method"]
+    slow_query_logger.warning("slow query", extra=fields)
+
+
+def log_slow_queries(engine):
+    """
+    Log the statements of an engine that take at least SLOW_QUERY_MS.
+
+    Fast statements only cost two clock reads. A slow one is logged as "slow query"
+    on the app.sql logger with its duration, its text, the shape of its parameters
+    and, inside a request, the route and method being served.
+
+    Args:
+    - engine (Engine): A synchronous engine (pass `async_engine.sync_engine` for async ones).
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
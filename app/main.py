@@ -1,10 +1,20 @@
+import logging
 from fastapi import FastAPI, Depends
-from app.database import init_db
+from fastapi.responses import PlainTextResponse
+from app.database import dispose_engines, database_pool_stats
+from app.startup import start, startup_timings
+from app.hashing import hashing_pool
+from app.cache import habit_cache, principal_cache
+from app.metrics import METRICS_ENABLED, MetricsMiddleware, render_metrics
+from app.logs import RequestIdMiddleware, configure_logging
 from app.routers import users, habits, auth
 from contextlib import asynccontextmanager
-from app.auth import get_current_user
-from app.models import User
-from app.schemas import UserResponse
+from app.auth import get_current_user, require_admin
+from app.schemas import UserResponse, UserPrincipal
+
+# JSON log records, written by a background thread
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # -------------------------- Lifespan Management --------------------------
 
@@ -14,21 +24,27 @@ async def lifespan(app: FastAPI):
     Asynchronous context manager to handle the app's lifespan events, such as 
     initialization and shutdown procedures.
 
-    This context manager is used to initialize the database connection when the
-    application starts and prints a message. It also manages the shutdown by 
-    printing a message when the application shuts down.
+    This context manager prepares the worker when the application starts (see
+    app.startup: schema check per DB_STARTUP, connection pool and schema warm-up)
+    and logs how long each step took. It also manages the shutdown by logging a
+    message when the application shuts down.
 
     Args:
     - app (FastAPI): The FastAPI application instance.
     """
-    # Initialize the database on startup
-    init_db()
-    print("Database initialized.")
+    # Create the engines, check the schema and warm the pools
+    await start(app)
     
     # Yield control back to FastAPI to run the application
     yield
     
-    print("Shutting down Habit Tracker API.")
+    # Release the pooled database connections
+    await dispose_engines()
+
+    # Stop the password hashing worker processes
+    hashing_pool.shutdown()
+
+    logger.info("Shutting down Habit Tracker API.")
 
 # -------------------------- FastAPI App Setup --------------------------
 
@@ -38,6 +54,12 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Per-route latency, status counts and DB time, exported at /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Request IDs for log records, returned in X-Request-ID (outermost, so it covers the metrics too)
+app.add_middleware(RequestIdMiddleware)
+
 # -------------------------- Routers Setup --------------------------
 
 app.include_router(users.router, prefix="/users", tags=["Users"])
@@ -47,7 +69,7 @@ app.include_router(auth.router, tags=["Auth"])
 # -------------------------- Root Endpoint --------------------------
 
 @app.get("/", response_model=UserResponse)
-async def root(current_user: User = Depends(get_current_user)):
+async def root(current_user: UserPrincipal = Depends(get_current_user)):
     """
     Root endpoint that returns the current authenticated user's data.
 
@@ -56,9 +78,53 @@ async def root(current_user: User = Depends(get_current_user)):
     response formatted according to the UserResponse schema.
 
     Args:
-    - current_user (User): The currently authenticated user.
+    - current_user (UserPrincipal): The currently authenticated user.
 
     Returns:
     - UserResponse: The current user's data in the response model.
     """
     return current_user
+
+
+# -------------------------- Monitoring Endpoints --------------------------
+
+@app.get("/pool", dependencies=[Depends(require_admin)], tags=["Monitoring"])
+async def pool():
+    """
+    Report the saturation of this worker's database connection pool (admin only).
+
+    Compare `checked_out` and `overflow` with the pool size, and watch the checkout
+    wait time and timeouts, to size DB_POOL_SIZE / DB_MAX_OVERFLOW against the number
+    of workers the database has to serve.
+
+    Returns:
+    - dict: Pool size, checked out and idle connections, overflow in use, and checkout
+      count, timeouts and wait time since the worker started.
+    """
+    return database_pool_stats()
+
+
+if METRICS_ENABLED:
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    async def metrics():
+        """
+        Export this worker's metrics in the Prometheus text format.
+
+        Besides the request and per-route database metrics, reports the connection
+        pool, the password hashing pool, the token and habit caches and the duration of
+        the startup steps as gauges.
+        Unauthenticated, like most scrape targets; it exposes no user data.
+
+        Returns:
+        - PlainTextResponse: The metrics exposition.
+        """
+        return PlainTextResponse(
+            render_metrics({
+                "db_pool": database_pool_stats,
+                "hash_pool": hashing_pool.stats,
+                "auth_cache": principal_cache.stats,
+                "habit_cache": habit_cache.stats,
+                "startup": lambda: startup_timings,
+            }),
+            media_type="text/plain; version=0.0.4",
+        )
@@ -0,0 +1,262 @@
+"""
+metrics.py
+
+Request and database metrics exported in the Prometheus text format.
+
+Every request gets a small accumulator in a context variable. The SQLAlchemy cursor
+hooks add each query's count and duration to it, from whichever thread runs the
+query, and when the response is sent the totals are recorded against the route's
+path template. Recording goes into a per-thread shard, so the hot path never takes a
+lock; shards are only summed when /metrics is scraped.
+
+Functions / classes:
+- MetricsMiddleware: ASGI middleware timing requests and counting them by status.
+- instrument_engine: Attribute an engine's queries to the current request's route.
+- render_metrics: The metrics of this worker in the Prometheus text format.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import event
+
+# Serve /metrics and record request metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Route label of requests that matched no route, so unknown paths cannot grow the label set
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RequestTotals:
+    """
+    Database work of one request, filled in by the cursor hooks.
+    """
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# The accumulator of the request being served; copied into threadpool calls
+current_request: ContextVar[Optional[RequestTotals]] = ContextVar("current_request", default=None)
+
+
+# ---------------------------- Aggregation ----------------------------
+
+class Shard:
+    """
+    The metrics recorded by one thread. Only that thread writes to it.
+    """
+
+    def __init__(self):
+        self.requests = defaultdict(int)  # (method, route, status) -> count
+        self.latency_buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))  # (method, route) -> counts
+        self.latency_sum = defaultdict(float)  # (method, route) -> seconds
+        self.queries = defaultdict(int)  # route -> count
+        self.db_seconds = defaultdict(float)  # route -> seconds
+        self.in_flight = 0
+
+
+class Registry:
+    """
+    Per-thread shards of request metrics, summed when exported.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Shard] = []
+        self._lock = threading.Lock()  # only taken to register a new thread's shard
+
+    def shard(self) -> Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def record(self, method: str, route: str, status: int, seconds: float, totals: RequestTotals):
+        shard = self.shard()
+        shard.requests[(method, route, status)] += 1
+        shard.latency_buckets[(method, route)][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        shard.latency_sum[(method, route)] += seconds
+        shard.queries[route] += totals.queries
+        shard.db_seconds[route] += totals.db_seconds
+
+    def merged(self) -> Shard:
+        """
+        Return the sum of every thread's shard.
+        """
+        with self._lock:
+            shards = list(self._shards)
+
+        total = Shard()
+        for shard in shards:
+            # Copies, so a thread recording meanwhile cannot change a dict being iterated
+            for key, count in list(shard.requests.items()):
+                total.requests[key] += count
+            for key, counts in list(shard.latency_buckets.items()):
+                total.latency_buckets[key] = [a + b for a, b in zip(total.latency_buckets[key], counts)]
+            for key, seconds in list(shard.latency_sum.items()):
+                total.latency_sum[key] += seconds
+            for key, count in list(shard.queries.items()):
+                total.queries[key] += count
+            for key, seconds in list(shard.db_seconds.items()):
+                total.db_seconds[key] += seconds
+            total.in_flight += shard.in_flight
+        return total
+
+    def clear(self):
+        with self._lock:
+            self._shards.clear()
+        self._local = threading.local()
+
+
+registry = Registry()
+
+
+# ---------------------------- Collection ----------------------------
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency, status and database work of every HTTP request.
+
+    The route label is the matched path template (e.g. /habits/{habit_id}), known once
+    routing has run. Streaming responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        shard = registry.shard()
+        totals = RequestTotals()
+        token = current_request.set(totals)
+        status = 500  # if the app fails before sending a response
+        started = time.perf_counter()
+        shard.in_flight += 1
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            shard.in_flight -= 1
+            current_request.reset(token)
+            route = scope.get("route")
+            registry.record(
+                scope["method"], route.path if route is not None else UNMATCHED_ROUTE,
+                status, time.perf_counter() - started, totals,
+            )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context, so a statement that raises leaves nothing behind
+    if current_request.get() is not None:
+        context._metrics_query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    totals = current_request.get()
+    started = getattr(context, "_metrics_query_started", None)
+    if totals is not None and started is not None:
+        totals.queries += 1
+        totals.db_seconds += time.perf_counter() - started
+
+
+def instrument_engine(engine):
+    """
+    Count the queries of an engine and their time against the route being served.
+
+    Queries run outside of a request (startup, CLI commands) are not recorded.
+
+    Args:
+    - engine (Engine): A synchronous engine (pass `async_engine.sync_engine` for async ones).
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ---------------------------- Export ----------------------------
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+def _gauges(lines: List[str], prefix: str, stats: Dict[str, object]):
+    """
+    Append every numeric value of a stats dict as a gauge named `prefix_<key>`.
+    """
+    for key, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            name = f"{prefix}_{key}"
+            lines += [f"# HELP {name} {key.replace('_', ' ').capitalize()}.", f"# TYPE {name} gauge", f"{name} {value}"]
+
+
+def render_metrics(collectors: Dict[str, Callable[[], dict]] = None) -> str:
+    """
+    Render this worker's metrics in the Prometheus text exposition format.
+
+    Args:
+    - collectors (Dict[str, Callable[[], dict]]): Extra gauges, as a metric prefix mapped
+      to a function returning a dict of numeric values (e.g. pool statistics).
+
+    Returns:
+    - str: The exposition, ending with a newline.
+    """
+    merged = registry.merged()
+    lines = [
+        "# HELP http_requests_total HTTP requests by method, route template and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route, status), count in sorted(merged.requests.items()):
+        lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+    lines += [
+        "# HELP http_request_duration_seconds Time to serve a request, until its last byte is sent.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), counts in sorted(merged.latency_buckets.items()):
+        cumulative = 0
+        for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), counts):
+            cumulative += count
+            lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {cumulative}")
+        lines.append(f"http_request_duration_seconds_sum{_labels(method=method, route=route)} {merged.latency_sum[(method, route)]}")
+        lines.append(f"http_request_duration_seconds_count{_labels(method=method, route=route)} {cumulative}")
+
+    lines += [
+        "# HELP http_requests_in_flight Requests being served.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {merged.in_flight}",
+        "# HELP db_queries_total SQL statements executed while serving each route.",
+        "# TYPE db_queries_total counter",
+    ]
+    for route, count in sorted(merged.queries.items()):
+        lines.append(f"db_queries_total{_labels(route=route)} {count}")
+    lines += [
+        "# HELP db_query_duration_seconds_total Time spent in SQL statements while serving each route.",
+        "# TYPE db_query_duration_seconds_total counter",
+    ]
+    for route, seconds in sorted(merged.db_seconds.items()):
+        lines.append(f"db_query_duration_seconds_total{_labels(route=route)} {seconds}")
+
+    for prefix, collect in (collectors or {}).items():
+        _gauges(lines, prefix, collect())
+
+    return "\n".join(lines) + "\n"
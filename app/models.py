@@ -1,9 +1,11 @@
 from enum import Enum
-from sqlmodel import SQLModel, Field, Relationship, Column, Integer, ForeignKey
+from sqlmodel import SQLModel, Field, Relationship, Column, Integer, ForeignKey, Index, UniqueConstraint
 from datetime import datetime, date, time, timezone
 from typing import Optional, List
 from pydantic import EmailStr
-import bcrypt
+from sqlalchemy import inspect
+from sqlalchemy.orm.base import NO_VALUE
+from app.hashing import hash_password, check_password
 
 # -------------------------- Enum Classes --------------------------
 
@@ -48,9 +50,51 @@ class HabitCompletion(HabitCompletionBase, table=True):
     Represents a specific habit completion record in the database.
     Contains the completion status for a habit on a particular date.
     """
+    # One completion per habit per day; also serves every (habit_id, date) lookup.
+    # On PostgreSQL the table is partitioned by month of `date` (see app.crud.partitions),
+    # where the primary key is (id, date) since it must include the partition key
+    __table_args__ = (UniqueConstraint("habit_id", "date", name="uq_habitcompletion_habit_id_date"),)
+
     id: int = Field(default=None, primary_key=True)
     habit: "Habit" = Relationship(back_populates="completed_dates")
 
+class HabitCompletionYear(SQLModel, table=True):
+    """
+    One year of a habit's completions stored as a bitset, used instead of HabitCompletion
+    rows when COMPLETION_STORAGE=bitmap (see app.crud.bitmaps).
+
+    Each month is a 31-bit word whose bit `day - 1` is set when the habit was completed
+    that day, so a year is 12 integers instead of up to 366 rows and recording a day is
+    an atomic bitwise OR.
+    """
+    habit_id: int = Field(sa_column=Column(Integer, ForeignKey("habit.id", ondelete="CASCADE"), primary_key=True))
+    year: int = Field(primary_key=True)
+    m01: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    m02: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    m03: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    m04: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    m05: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    m06: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    m07: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    m08: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    m09: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    m10: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    m11: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    m12: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+
+class HabitCompletionMonth(SQLModel, table=True):
+    """
+    Completions of a habit in one month, rolled up from HabitCompletion rows older than
+    COMPLETION_ARCHIVE_AFTER_DAYS (see app.crud.archive) and merged back in by every reader.
+
+    `days` has bit `day - 1` set for each completed day, like a HabitCompletionYear word,
+    and `count` is the number of bits set.
+    """
+    habit_id: int = Field(sa_column=Column(Integer, ForeignKey("habit.id", ondelete="CASCADE"), primary_key=True))
+    month: date = Field(primary_key=True)  # First day of the month
+    count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    days: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+
 # -------------------------- Habit Classes --------------------------
 
 class HabitBase(SQLModel):
@@ -70,16 +114,36 @@ class Habit(HabitBase, table=True):
     Represents a habit in the database. Extends HabitBase and includes relationships
     for habit completion records and the associated user.
     """
+    # One index per sort order of the paginated listing; the name index also serves the lookup by name
+    __table_args__ = (
+        Index("ix_habit_user_id_id", "user_id", "id"),
+        Index("ix_habit_user_id_name_id", "user_id", "name", "id"),
+        Index("ix_habit_user_id_start_date_id", "user_id", "start_date", "id"),
+    )
+
     id: int = Field(default=None, primary_key=True)
-    completed_dates: List[HabitCompletion] = Relationship(back_populates="habit")
+    # Streaks in periods of the habit's frequency, maintained by app.crud.streaks
+    current_streak: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    longest_streak: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    last_completed_date: Optional[date] = None
+    # Collections never load implicitly; queries must choose a loader (e.g. selectinload).
+    # Deleting a habit leaves its completions to the database's ON DELETE CASCADE.
+    completed_dates: List[HabitCompletion] = Relationship(
+        back_populates="habit",
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True},
+    )
     user: "User" = Relationship(back_populates="habits")
 
     def __repr__(self):
         """
         Custom string representation of the Habit object.
-        Includes whether the habit was completed today.
+        Includes whether the habit was completed today, when its completions are loaded.
         """
-        completed_today = any(completion.date == date.today() for completion in self.completed_dates or [])
+        completions = inspect(self).attrs.completed_dates.loaded_value
+        completed_today = (
+            any(completion.date == date.today() for completion in completions)
+            if completions is not NO_VALUE else "unknown"
+        )
         return (f"Habit(id={self.id}, name='{self.name}', category='{self.category}', "
                 f"frequency='{self.frequency}', start_date={self.start_date}, "
                 f"completed_today={completed_today})")
@@ -99,10 +163,20 @@ class User(UserBase, table=True):
     Represents a user in the database. Extends UserBase and includes password management,
     relationship with habits, and utility methods for setting and verifying passwords.
     """
+    # Login, the admin lookup by username and the listing sorted by username
+    __table_args__ = (Index("ix_user_username_id", "username", "id"),)
+
     id: int = Field(sa_column=Column(Integer, primary_key=True, nullable=False, autoincrement=True))
     password: str  # The user's hashed password
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))  # Timestamp of user creation
-    habits: List[Habit] = Relationship(back_populates="user")
+    # Incremented by every write to the user's habits or completions; backs the ETags of their reads
+    data_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Collections never load implicitly; queries must choose a loader (e.g. selectinload).
+    # Deleting a user leaves their habits to the database's ON DELETE CASCADE.
+    habits: List[Habit] = Relationship(
+        back_populates="user",
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True},
+    )
 
     def set_password(self, password: str):
         """
@@ -111,9 +185,7 @@ class User(UserBase, table=True):
         Args:
         - password (str): The plain text password to be hashed.
         """
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-        self.password = hashed.decode('utf-8')  # store as string
+        self.password = hash_password(password)  # store as string
 
 
     def verify_password(self, password: str) -> bool:
@@ -126,7 +198,7 @@ class User(UserBase, table=True):
         Returns:
         - bool: True if the password matches the stored hashed password, False otherwise.
         """
-        return bcrypt.checkpw(password.encode('utf-8'), self.password.encode('utf-8'))
+        return check_password(password, self.password)
 
 
     def __repr__(self):
@@ -8,7 +8,6 @@ Implements OAuth2 password flow and JWT-based access tokens.
 from fastapi import APIRouter, Depends, HTTPException
 from app.database import get_db
 import app.schemas as s
-from app.models import User
 from sqlmodel import Session
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
@@ -37,9 +36,9 @@ async def login(
     - UserLoginResponse: Contains username, access token, and token type.
 
     Raises:
-    - HTTPException: If authentication fails.
+    - HTTPException: If authentication fails, or 503 if the password hashing pool is saturated.
     """
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
@@ -54,12 +53,12 @@ async def login(
 
 
 @router.get("/secure-data")
-async def secure_endpoint(current_user: User = Depends(get_current_user)):
+async def secure_endpoint(current_user: s.UserPrincipal = Depends(get_current_user)):
     """
     A protected route that requires user authentication.
 
     Parameters:
-    - current_user (User): Automatically injected from the JWT via dependency.
+    - current_user (s.UserPrincipal): Automatically injected from the JWT via dependency.
 
     Returns:
     - dict: A simple message with the authenticated user's username.
@@ -1,22 +1,61 @@
-from fastapi import APIRouter, Depends, Query
-from app.database import get_db
+from fastapi import APIRouter, Depends, File, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from app.database import get_db, run_db
 import app.schemas as s
-from app.models import Category, Frequency, User
-from app.utils import normalize_category, normalize_frequency
+from app.models import Category, Frequency
+from app.utils import normalize_category, normalize_frequency, get_habit_of_user, get_today
 import app.crud.habits as habits
 import app.crud.completions as completions
-from typing import List, Optional
+import app.crud.export as export
+import app.crud.stats as stats
+import app.crud.habit_import as habit_import
+import app.crud.versions as versions
+from app.crud.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from typing import List, Literal, Optional, Union
+from datetime import date
+import io
 from sqlmodel import Session
-from app.auth import get_current_user
+from app.auth import get_current_user, get_read_db
 
 router = APIRouter()
 
+
+def not_modified(request: Request, response: Response, user_id: int, version: int) -> Optional[Response]:
+    """
+    Handle a conditional GET of the user's habit data.
+
+    The route reads the user's data version with a primary key lookup before anything
+    else, so a matching If-None-Match is answered with 304 without running the route's
+    query or serializing its body. Otherwise the ETag is set on the response and None
+    returned.
+
+    The route must then load a body at least as new as `version`: cached reads take the
+    version as part of their key, so an entry cached by this worker before a write on
+    another one is never served under the newer ETag. A write landing between the version
+    read and the query only makes the ETag older than the body, which costs the client
+    one extra full response.
+
+    Parameters:
+    - request (Request): The incoming request, for its If-None-Match header.
+    - response (Response): The route's response, which receives the ETag.
+    - user_id (int): The authenticated user.
+    - version (int): The user's data version, read before the body.
+
+    Returns:
+    - Optional[Response]: An empty 304 response, or None if the route should run.
+    """
+    etag = versions.data_etag(user_id, version, get_today())
+    if versions.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
+
 # ------------------------------ POST ROUTES ------------------------------
 
 @router.post("/", response_model=s.HabitSummary, status_code=201)
 async def create_habit(
     habit: s.HabitCreate, 
-    current_user: User = Depends(get_current_user), 
+    current_user: s.UserPrincipal = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
     """
@@ -24,19 +63,19 @@ async def create_habit(
 
     Parameters:
     - habit (s.HabitCreate): Habit details to be created.
-    - current_user (User): The currently authenticated user.
+    - current_user (s.UserPrincipal): The currently authenticated user.
     - db (Session): Database session for querying and committing data.
 
     Returns:
     - s.HabitSummary: A summary of the created habit.
     """
-    return habits.create_habit(habit, current_user.id, db)
+    return await run_db(db, habits.create_habit, habit, current_user.id)
 
 
 @router.post("/complete/today/{habit_id}", response_model=s.HabitCompletionStatus)
 async def mark_habit_completed_today(
     habit_id: int, 
-    current_user: User = Depends(get_current_user), 
+    current_user: s.UserPrincipal = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
     """
@@ -44,13 +83,64 @@ async def mark_habit_completed_today(
 
     Parameters:
     - habit_id (int): The ID of the habit to mark as completed.
-    - current_user (User): The currently authenticated user.
+    - current_user (s.UserPrincipal): The currently authenticated user.
     - db (Session): Database session for querying and committing data.
 
     Returns:
     - s.HabitCompletionStatus: The status of the habit completion for today.
     """
-    return completions.mark_habit_completed_today(habit_id, current_user.id, db)
+    return await run_db(db, completions.mark_habit_completed_today, habit_id, current_user.id)
+
+
+@router.post("/complete/bulk", response_model=s.BulkCompletionResult)
+async def mark_habits_completed(
+    completions_in: s.BulkCompletionCreate, 
+    current_user: s.UserPrincipal = Depends(get_current_user), 
+    db: Session = Depends(get_db)
+):
+    """
+    Mark many habits as completed on given dates in one request, e.g. to sync offline ticks
+    or backfill missed days.
+
+    Items that cannot be recorded do not fail the request; each gets its own status.
+
+    Parameters:
+    - completions_in (s.BulkCompletionCreate): The (habit_id, date) pairs to record.
+    - current_user (s.UserPrincipal): The currently authenticated user.
+    - db (Session): Database session for querying and committing data.
+
+    Returns:
+    - s.BulkCompletionResult: The number of new completions and each item's status.
+    """
+    return await run_db(db, completions.mark_habits_completed, completions_in.items, current_user.id)
+
+
+@router.post("/import", response_model=s.HabitImportResult)
+async def import_habits(
+    file: UploadFile = File(..., description="CSV with a header row, a JSON array or newline-delimited JSON"),
+    format: Optional[Literal["csv", "json"]] = Query(default=None, description="Defaults to the file's extension"),
+    current_user: s.UserPrincipal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Create habits in bulk from an uploaded CSV or JSON file.
+
+    Each row has the fields of a new habit (name, frequency, and optionally description,
+    category, reminder_time and start_date). Valid rows are imported; invalid rows are
+    skipped and reported by row number.
+
+    Parameters:
+    - file (UploadFile): The file to import.
+    - format (Optional[str]): 'csv' or 'json'; taken from the file name if omitted.
+    - current_user (s.UserPrincipal): The currently authenticated user.
+    - db (Session): Database session for querying and committing data.
+
+    Returns:
+    - s.HabitImportResult: The number of imported and failed rows and the first row errors.
+    """
+    fmt = format or habit_import.format_from_filename(file.filename)
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    return await habit_import.import_file(db, stream, fmt, current_user.id)
 
 
 # ------------------------------ PUT ROUTES ------------------------------
@@ -59,7 +149,7 @@ async def mark_habit_completed_today(
 async def update_habit(
     habit_id: int, 
     habit: s.HabitUpdate, 
-    current_user: User = Depends(get_current_user), 
+    current_user: s.UserPrincipal = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
     """
@@ -68,117 +158,290 @@ async def update_habit(
     Parameters:
     - habit_id (int): The ID of the habit to update.
     - habit (s.HabitUpdate): The new habit details.
-    - current_user (User): The currently authenticated user.
+    - current_user (s.UserPrincipal): The currently authenticated user.
     - db (Session): Database session for querying and committing data.
 
     Returns:
     - s.HabitSummary: A summary of the updated habit.
     """
-    return habits.update_habit(habit_id, habit, current_user.id, db)
+    return await run_db(db, habits.update_habit, habit_id, habit, current_user.id)
 
 
 # ------------------------------ GET ROUTES ------------------------------
 
-@router.get("/", response_model=List[s.HabitSummary])
+@router.get("/", response_model=Union[s.HabitPage, List[s.HabitSummary]])
 async def get_habits(
+    request: Request,
+    response: Response,
     category: Optional[str] = Query(default=None, description=f"One of: {', '.join(c.value for c in Category)}"),
     frequency: Optional[str] = Query(default=None, description=f"One of: {', '.join(f.value for f in Frequency)}"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(default=None, description="The next_cursor of the previous page"),
+    sort: Literal["id", "name", "start_date"] = Query(default="id"),
+    order: Literal["asc", "desc"] = Query(default="asc"),
+    paginate: bool = Query(default=True, description="Set to false to get every habit as a plain list"),
+    current_user: s.UserPrincipal = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Retrieve a page of habits for the authenticated user.
+
+    Supports conditional requests: the response carries a weak ETag, and a request
+    whose If-None-Match matches it gets an empty 304.
+
+    Parameters:
+    - request (Request): The incoming request.
+    - response (Response): The outgoing response, which receives the ETag.
+    - category (Optional[str]): The category to filter by.
+    - frequency (Optional[str]): The frequency to filter by.
+    - limit (int): Maximum number of habits in the page.
+    - cursor (Optional[str]): Cursor of the page to fetch, from the previous response.
+    - sort (str): Sort key: id, name or start_date.
+    - order (str): Sort order: asc or desc.
+    - paginate (bool): If false, return the full unpaginated list (legacy shape).
+    - current_user (s.UserPrincipal): The currently authenticated user.
+    - db (Session): Database session for querying data.
+
+    Returns:
+    - s.HabitPage | List[s.HabitSummary]: A page of habit summaries, or all of them if paginate is false.
+    """
+    category, frequency = normalize_category(category), normalize_frequency(frequency)
+    version = await run_db(db, versions.get_data_version, current_user.id)
+    if unchanged := not_modified(request, response, current_user.id, version):
+        return unchanged
+    if not paginate:
+        return await run_db(
+            db, habits.get_habits, user_id=current_user.id, category=category, frequency=frequency, version=version
+        )
+    return await run_db(
+        db, habits.get_habits_page, user_id=current_user.id, limit=limit, cursor=cursor,
+        sort=sort, order=order, category=category, frequency=frequency, version=version
+    )
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_completions(
+    format: Literal["ndjson", "csv"] = Query(default="ndjson"),
+    habit_id: Optional[int] = Query(default=None, description="Export only this habit"),
+    current_user: s.UserPrincipal = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Stream the completion history of the authenticated user's habits.
+
+    Rows are read and written in batches, so the response starts immediately and
+    memory use does not grow with the length of the history.
+
+    Parameters:
+    - format (str): 'ndjson' (one JSON object per line) or 'csv'.
+    - habit_id (Optional[int]): Export only this habit instead of all of them.
+    - current_user (s.UserPrincipal): The currently authenticated user.
+    - db (Session): Database session for querying data.
+
+    Returns:
+    - StreamingResponse: The export, as an attachment.
+    """
+    # Check ownership up front so a foreign habit is a 404, not an empty export
+    if habit_id is not None:
+        await run_db(db, get_habit_of_user, habit_id, current_user.id)
+
+    filename = f"completions-{habit_id}.{format}" if habit_id is not None else f"completions.{format}"
+    return StreamingResponse(
+        export.export_completions(db, current_user.id, habit_id, format),
+        media_type=export.EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/today", response_model=List[s.HabitTodayStatus])
+async def get_habits_today(
+    category: Optional[str] = Query(default=None, description=f"One of: {', '.join(c.value for c in Category)}"),
+    frequency: Optional[str] = Query(default=None, description=f"One of: {', '.join(f.value for f in Frequency)}"),
+    current_user: s.UserPrincipal = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
 ):
     """
-    Retrieve a list of habits for the authenticated user.
+    Retrieve every habit of the authenticated user with its completion status for today,
+    in a single query.
 
     Parameters:
     - category (Optional[str]): The category to filter by.
     - frequency (Optional[str]): The frequency to filter by.
-    - current_user (User): The currently authenticated user.
+    - current_user (s.UserPrincipal): The currently authenticated user.
     - db (Session): Database session for querying data.
 
     Returns:
-    - List[s.HabitSummary]: A list of habit summaries.
+    - List[s.HabitTodayStatus]: The habits ordered by ID, each with `completed_today`.
     """
-    return habits.get_habits(db, user_id=current_user.id, category=normalize_category(category), frequency=normalize_frequency(frequency))
+    category, frequency = normalize_category(category), normalize_frequency(frequency)
+    return await run_db(db, habits.get_habits_today, user_id=current_user.id, category=category, frequency=frequency)
+
+
+@router.get("/stats", response_model=List[s.HabitStats])
+async def get_user_habit_stats(
+    current_user: s.UserPrincipal = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Retrieve completion statistics for every habit of the authenticated user.
+
+    Parameters:
+    - current_user (s.UserPrincipal): The currently authenticated user.
+    - db (Session): Database session for querying data.
+
+    Returns:
+    - List[s.HabitStats]: The statistics of each habit, ordered by habit ID.
+    """
+    return await run_db(db, stats.get_user_habit_stats, current_user.id)
 
 
 @router.get("/{habit_id}", response_model=s.HabitSummary)
 async def get_habit_by_id(
     habit_id: int, 
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    current_user: s.UserPrincipal = Depends(get_current_user), 
+    db: Session = Depends(get_read_db)
 ):
     """
     Retrieve a habit by its ID.
 
     Parameters:
     - habit_id (int): The ID of the habit to retrieve.
-    - current_user (User): The currently authenticated user.
+    - current_user (s.UserPrincipal): The currently authenticated user.
     - db (Session): Database session for querying data.
 
     Returns:
     - s.HabitSummary: A summary of the retrieved habit.
     """
-    return habits.get_habit_by_id(habit_id, current_user.id, db)
+    return await run_db(db, habits.get_habit_by_id, habit_id, current_user.id)
+
+
+@router.get("/{habit_id}/stats", response_model=s.HabitStats)
+async def get_habit_stats(
+    habit_id: int, 
+    current_user: s.UserPrincipal = Depends(get_current_user), 
+    db: Session = Depends(get_read_db)
+):
+    """
+    Retrieve completion statistics of a habit: completion rate, completions per weekday,
+    7 and 30 day adherence and its best and worst months.
+
+    Parameters:
+    - habit_id (int): The ID of the habit.
+    - current_user (s.UserPrincipal): The currently authenticated user.
+    - db (Session): Database session for querying data.
+
+    Returns:
+    - s.HabitStats: The habit's statistics.
+    """
+    return await run_db(db, stats.get_habit_stats, habit_id, current_user.id)
 
 
 @router.get("/by-name/{habit_name}", response_model=s.HabitSummary)
 async def get_habit_by_name(
     habit_name: str, 
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    current_user: s.UserPrincipal = Depends(get_current_user), 
+    db: Session = Depends(get_read_db)
 ):
     """
     Retrieve a habit by its name.
 
     Parameters:
     - habit_name (str): The name of the habit to retrieve.
-    - current_user (User): The currently authenticated user.
+    - current_user (s.UserPrincipal): The currently authenticated user.
     - db (Session): Database session for querying data.
 
     Returns:
     - s.HabitSummary: A summary of the retrieved habit.
     """
-    return habits.get_habit_by_name(habit_name, current_user.id, db)
+    return await run_db(db, habits.get_habit_by_name, habit_name, current_user.id)
 
 
 @router.get("/complete/{habit_id}", response_model=s.HabitWithCompletions)
 async def get_habit_completion_dates(
+    request: Request,
+    response: Response,
     habit_id: int, 
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    date_from: Optional[date] = Query(default=None, alias="from", description="First date to include (YYYY-MM-DD)"),
+    date_to: Optional[date] = Query(default=None, alias="to", description="Last date to include (YYYY-MM-DD)"),
+    current_user: s.UserPrincipal = Depends(get_current_user), 
+    db: Session = Depends(get_read_db)
 ):
     """
-    Retrieve the completion dates of a specific habit.
+    Retrieve the completion dates of a specific habit, optionally within a date range.
+
+    Supports conditional requests like GET /habits/.
 
     Parameters:
+    - request (Request): The incoming request.
+    - response (Response): The outgoing response, which receives the ETag.
     - habit_id (int): The ID of the habit to retrieve completion dates for.
-    - current_user (User): The currently authenticated user.
+    - date_from (Optional[date]): Only include completions on or after this date.
+    - date_to (Optional[date]): Only include completions on or before this date.
+    - current_user (s.UserPrincipal): The currently authenticated user.
     - db (Session): Database session for querying data.
 
     Returns:
     - s.HabitWithCompletions: A habit summary along with its completion dates.
     """
-    return completions.get_habit_completion_dates(habit_id, current_user.id, db)
+    version = await run_db(db, versions.get_data_version, current_user.id)
+    if unchanged := not_modified(request, response, current_user.id, version):
+        return unchanged
+    return await run_db(
+        db, completions.get_habit_completion_dates, habit_id, current_user.id,
+        date_from=date_from, date_to=date_to
+    )
+
+
+@router.get("/complete/{habit_id}/counts", response_model=s.HabitCompletionCounts)
+async def get_habit_completion_counts(
+    habit_id: int, 
+    period: Literal["week", "month"] = Query(default="week"),
+    date_from: Optional[date] = Query(default=None, alias="from", description="First date to include (YYYY-MM-DD)"),
+    date_to: Optional[date] = Query(default=None, alias="to", description="Last date to include (YYYY-MM-DD)"),
+    current_user: s.UserPrincipal = Depends(get_current_user), 
+    db: Session = Depends(get_read_db)
+):
+    """
+    Retrieve the number of completions of a habit per week or month.
+
+    The counts are computed by the database, so a calendar view receives one value
+    per period instead of every completion date.
+
+    Parameters:
+    - habit_id (int): The ID of the habit to count completions for.
+    - period (str): 'week' (starting Monday) or 'month'.
+    - date_from (Optional[date]): Only count completions on or after this date.
+    - date_to (Optional[date]): Only count completions on or before this date.
+    - current_user (s.UserPrincipal): The currently authenticated user.
+    - db (Session): Database session for querying data.
+
+    Returns:
+    - s.HabitCompletionCounts: A habit summary along with the count of each period that has completions.
+    """
+    return await run_db(
+        db, completions.get_habit_completion_counts, habit_id, current_user.id,
+        period=period, date_from=date_from, date_to=date_to
+    )
 
 
 @router.get("/complete/today/{habit_id}", response_model=s.HabitCompletionStatus)
 async def get_habit_completion_status(
     habit_id: int, 
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    current_user: s.UserPrincipal = Depends(get_current_user), 
+    db: Session = Depends(get_read_db)
 ):
     """
     Retrieve the completion status of a specific habit for today.
 
     Parameters:
     - habit_id (int): The ID of the habit to check completion status for.
-    - current_user (User): The currently authenticated user.
+    - current_user (s.UserPrincipal): The currently authenticated user.
     - db (Session): Database session for querying data.
 
     Returns:
     - s.HabitCompletionStatus: The completion status of the habit for today.
     """
-    return completions.get_habit_today_completion_status(habit_id, current_user.id, db)
+    return await run_db(db, completions.get_habit_today_completion_status, habit_id, current_user.id)
 
 
 # ------------------------------ DELETE ROUTES ------------------------------
@@ -186,7 +449,7 @@ async def get_habit_completion_status(
 @router.delete("/{habit_id}")
 async def delete_habit(
     habit_id: int, 
-    current_user: User = Depends(get_current_user), 
+    current_user: s.UserPrincipal = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
     """
@@ -194,11 +457,11 @@ async def delete_habit(
 
     Parameters:
     - habit_id (int): The ID of the habit to delete.
-    - current_user (User): The currently authenticated user.
+    - current_user (s.UserPrincipal): The currently authenticated user.
     - db (Session): Database session for querying and committing data.
 
     Returns:
     - dict: A dictionary with a success status of the deletion.
     """
-    habits.delete_habit(habit_id, current_user.id, db)
+    await run_db(db, habits.delete_habit, habit_id, current_user.id)
     return {"detail": "Habit deleted successfully."}
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends
-from app.database import get_db
+from fastapi import APIRouter, Depends, Query
+from app.database import get_db, run_db
 import app.schemas as s
-from app.models import User
 import app.crud.users as users
-from typing import List
+from app.crud.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from typing import List, Literal, Optional, Union
 from sqlmodel import Session
-from app.auth import get_current_user, require_admin
+from app.auth import get_current_user, get_read_db, require_admin
+from app.hashing import hashing_pool
 
 router = APIRouter()
 
@@ -25,8 +26,12 @@ async def create_user(
 
     Returns:
     - s.UserSummary: A summary of the created user's details (ID, username, etc.)
+
+    Raises:
+    - HTTPException: 503 if the password hashing pool is saturated.
     """
-    return users.create_user(user, db)
+    hashed_password = await hashing_pool.hash(user.password)
+    return await run_db(db, users.create_user, user, hashed_password=hashed_password)
 
 
 # ------------------------------ PUT ROUTES ------------------------------
@@ -34,7 +39,7 @@ async def create_user(
 @router.put("/me", response_model=s.UserSummary)
 async def update_user(
     user: s.UserUpdate,  # Updated user details.
-    current_user: User = Depends(get_current_user),  # Dependency to get the currently authenticated user.
+    current_user: s.UserPrincipal = Depends(get_current_user),  # Dependency to get the currently authenticated user.
     db: Session = Depends(get_db)  # Dependency to get the database session.
 ):
     """
@@ -42,36 +47,52 @@ async def update_user(
 
     Parameters:
     - user (s.UserUpdate): The new user details to update.
-    - current_user (User): The currently authenticated user.
+    - current_user (s.UserPrincipal): The currently authenticated user.
     - db (Session): Database session for querying and committing data.
 
     Returns:
     - s.UserSummary: A summary of the updated user details.
+
+    Raises:
+    - HTTPException: 503 if the password hashing pool is saturated.
     """
-    return users.update_user(user, current_user.id, db)
+    hashed_password = await hashing_pool.hash(user.password) if user.password else None
+    return await run_db(db, users.update_user, user, current_user.id, hashed_password=hashed_password)
 
 
 # ------------------------------ GET ROUTES ------------------------------
 
-@router.get("/", response_model=List[s.UserSummary], dependencies=[Depends(require_admin)])
+@router.get("/", response_model=Union[s.UserPage, List[s.UserSummary]], dependencies=[Depends(require_admin)])
 async def get_users(
-    db: Session = Depends(get_db)  # Dependency to get the database session.
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),  # Maximum users per page.
+    cursor: Optional[str] = Query(default=None),  # The next_cursor of the previous page.
+    sort: Literal["id", "username"] = Query(default="id"),
+    order: Literal["asc", "desc"] = Query(default="asc"),
+    paginate: bool = Query(default=True),  # False returns every user as a plain list.
+    db: Session = Depends(get_read_db)  # Dependency to get the database session.
 ):
     """
-    Retrieve a list of all users.
+    Retrieve a page of users.
 
     Parameters:
+    - limit (int): Maximum number of users in the page.
+    - cursor (Optional[str]): Cursor of the page to fetch, from the previous response.
+    - sort (str): Sort key: id or username.
+    - order (str): Sort order: asc or desc.
+    - paginate (bool): If false, return the full unpaginated list (legacy shape).
     - db (Session): Database session for querying data.
 
     Returns:
-    - List[s.UserSummary]: A list of user summaries, each containing user details.
+    - s.UserPage | List[s.UserSummary]: A page of user summaries, or all of them if paginate is false.
     """
-    return users.get_users(db)
+    if not paginate:
+        return await run_db(db, users.get_users)
+    return await run_db(db, users.get_users_page, limit=limit, cursor=cursor, sort=sort, order=order)
 
 @router.get("/{user_id}", response_model=s.UserSummary, dependencies=[Depends(require_admin)])
 async def get_user_by_id(
     user_id: int,  # ID of the user to retrieve.
-    db: Session = Depends(get_db)  # Dependency to get the database session.
+    db: Session = Depends(get_read_db)  # Dependency to get the database session.
 ):
     """
     Retrieve a specific user by their ID.
@@ -83,13 +104,13 @@ async def get_user_by_id(
     Returns:
     - s.UserSummary: A summary of the retrieved user's details.
     """
-    return users.get_user_by_id(user_id, db)
+    return await run_db(db, users.get_user_by_id, user_id)
 
 
 @router.get("/by-username/{username}", response_model=s.UserSummary, dependencies=[Depends(require_admin)])
 async def get_user_by_username(
     username: str,  # Username of the user to retrieve.
-    db: Session = Depends(get_db)  # Dependency to get the database session.
+    db: Session = Depends(get_read_db)  # Dependency to get the database session.
 ):
     """
     Retrieve a specific user by their username.
@@ -101,14 +122,14 @@ async def get_user_by_username(
     Returns:
     - s.UserSummary: A summary of the retrieved user's details.
     """
-    return users.get_user_by_username(username, db)
+    return await run_db(db, users.get_user_by_username, username)
 
 
 # ------------------------------ DELETE ROUTES ------------------------------
 
 @router.delete("/me")
 async def delete_user(
-    current_user: User = Depends(get_current_user),  # Dependency to get the currently authenticated user.
+    current_user: s.UserPrincipal = Depends(get_current_user),  # Dependency to get the currently authenticated user.
     db: Session = Depends(get_db)  # Dependency to get the database session.
 ):
     """
@@ -116,11 +137,11 @@ async def delete_user(
 
     Parameters:
     - user_id (int): The ID of the user to delete.
-    - current_user (User): The currently authenticated user who must match the user to be deleted.
+    - current_user (s.UserPrincipal): The currently authenticated user who must match the user to be deleted.
     - db (Session): Database session for querying and committing data.
 
     Returns:
     - dict: A dictionary indicating the success of the deletion.
     """
-    users.delete_user(current_user.id, db)
+    await run_db(db, users.delete_user, current_user.id)
     return {"detail": "User deleted successfully."}
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import date, time
 from app.models import HabitCompletionBase, Category, Frequency
 from app.utils import normalize_category, normalize_frequency
@@ -37,6 +37,13 @@ class HabitCreate(HabitDetails):
     category: Optional[Category] = Field(default=Category.GENERAL)  # Default category if none is provided
     frequency: Frequency
 
+class HabitImportRow(HabitCreate):
+    """
+    Schema for one habit of an import file. Imported habits may keep the start date
+    they had in another app; it defaults to the import day.
+    """
+    start_date: Optional[date] = None
+
 class HabitUpdate(HabitDetails):
     """
     Schema for updating an existing habit. Only the name and optional details can be updated.
@@ -49,6 +56,22 @@ class HabitCompletionCreate(HabitCompletionBase):
     """
     completed_today: bool = Field(default=False)
 
+# Maximum number of completions accepted by one bulk request
+MAX_BULK_COMPLETIONS = 500
+
+class CompletionItem(BaseModel):
+    """
+    A habit completed on a given date, as sent by a client syncing its offline ticks.
+    """
+    habit_id: int
+    date: date
+
+class BulkCompletionCreate(BaseModel):
+    """
+    Schema for recording many habit completions at once.
+    """
+    items: List[CompletionItem] = Field(min_length=1, max_length=MAX_BULK_COMPLETIONS)
+
 class UserCreate(BaseModel):
     """
     Schema for creating a new user, requiring a username, password, and email.
@@ -90,9 +113,27 @@ class HabitSummary(HabitBasicInfo, HabitDetails):
     including the start date and details like description, category, and frequency.
     """
     start_date: date 
+    # Counted in periods of the habit's frequency (days, weeks, months or years)
+    current_streak: int = 0
+    longest_streak: int = 0
+    last_completed_date: Optional[date] = None
 
     model_config = ConfigDict(from_attributes=True)
 
+# Used by the home screen: every habit with whether it was completed today
+class HabitTodayStatus(HabitSummary):
+    """
+    A habit summary together with today's completion status.
+    """
+    completed_today: bool = False
+
+class HabitPage(BaseModel):
+    """
+    One page of a habit listing, with the cursor to request the next page.
+    """
+    items: List[HabitSummary]
+    next_cursor: Optional[str] = None
+
 # Used to show if a habit is completed today (by ID or name)
 class HabitCompletionStatus(HabitBasicInfo):
     """
@@ -107,6 +148,76 @@ class HabitWithCompletions(HabitBasicInfo):
     """
     completed_dates: Optional[List[date]] = None
 
+class CompletionResult(CompletionItem):
+    """
+    Outcome of one item of a bulk completion request:
+    - created: the completion was recorded
+    - already_completed: the habit was already completed on that date
+    - not_found: the habit does not exist or belongs to another user
+    - invalid_date: the date is in the future or before the habit's start date
+    """
+    status: Literal["created", "already_completed", "not_found", "invalid_date"]
+
+class BulkCompletionResult(BaseModel):
+    """
+    Per-item results of a bulk completion request, in request order.
+    """
+    created: int
+    results: List[CompletionResult]
+
+class ImportRowError(BaseModel):
+    """
+    A row of an import file that could not be imported (rows are numbered from 1, excluding a CSV header).
+    """
+    row: int
+    error: str
+
+class HabitImportResult(BaseModel):
+    """
+    Outcome of a habit import: valid rows are imported, invalid ones are reported.
+    Only the first errors are listed; `failed` counts all of them.
+    """
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+
+class PeriodCount(BaseModel):
+    """
+    Number of completions in one week or month, identified by the period's first day.
+    """
+    period_start: date
+    count: int
+
+# Used to show completion counts per week or month for a specific habit
+class HabitCompletionCounts(HabitBasicInfo):
+    """
+    Displays how many times a habit was completed in each week or month.
+    """
+    period: str
+    counts: List[PeriodCount]
+
+class MonthCount(BaseModel):
+    """
+    Number of completions in a calendar month ('YYYY-MM').
+    """
+    month: str
+    completions: int
+
+# Used to show completion statistics for a specific habit
+class HabitStats(HabitBasicInfo):
+    """
+    Completion statistics of a habit over its whole history, from its start date through today.
+    """
+    frequency: Frequency
+    start_date: date
+    total_completions: int
+    completion_rate: float  # share of the habit's periods (days, weeks, ...) with a completion
+    weekday_counts: List[int]  # completions per weekday, Monday first
+    adherence_7d: float  # share of the last 7 days with a completion
+    adherence_30d: float  # share of the last 30 days with a completion
+    best_month: MonthCount
+    worst_month: MonthCount
+
 class UserResponse(BaseModel):
     """
     Basic response for a user, including the user ID and username.
@@ -125,6 +236,24 @@ class UserSummary(UserResponse):
 
     model_config = ConfigDict(from_attributes=True)
 
+class UserPage(BaseModel):
+    """
+    One page of the user listing, with the cursor to request the next page.
+    """
+    items: List[UserSummary]
+    next_cursor: Optional[str] = None
+
+class UserPrincipal(BaseModel):
+    """
+    Lightweight, immutable snapshot of the authenticated user, cached per access token.
+    """
+    id: int
+    username: str
+    email: str
+    is_admin: bool = False
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
 class UserLoginResponse(BaseModel):
     """
     Response schema for user login, including the username and access token.
@@ -0,0 +1,210 @@
+"""
+startup.py
+
+What a worker does before serving its first request, timed step by step.
+
+With DB_STARTUP=create_all (the default) missing tables are created, which inspects
+the catalog once per table and lets workers of a rolling deploy race each other on
+the schema. With DB_STARTUP=verify the schema is left to Alembic: a single query
+checks that the database is at the head revision this code was written for, and the
+worker refuses to start otherwise. The connection pool and the Pydantic adapters are
+then warmed in parallel, so neither cost lands on the first requests.
+
+Functions:
+- alembic_heads: The head revisions of the migration scripts.
+- verify_schema: Check that the database is at the Alembic head revision.
+- warm_pool / warm_async_pool: Open pool connections ahead of the first requests.
+- warm_schemas: Build the OpenAPI schema and the habit cache's adapters.
+- start: Run the startup steps and report how long each took.
+"""
+
+import ast
+import asyncio
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, FrozenSet
+from sqlalchemy import exc, text
+from sqlalchemy.pool import QueuePool
+from starlette.concurrency import run_in_threadpool
+from app import database
+from app.cache import type_adapter
+
+logger = logging.getLogger(__name__)
+
+# Directory of the Alembic migration scripts
+ALEMBIC_VERSIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic", "versions")
+
+# The `revision` and `down_revision` assignments at the top of a migration script
+REVISION_PATTERN = re.compile(r"^(revision|down_revision)\b[^=\n]*=\s*(.+?)\s*$", re.MULTILINE)
+
+# Duration of each step of the last startup, in milliseconds
+startup_timings: Dict[str, float] = {}
+
+
+# ---------------------------- Schema ----------------------------
+
+@lru_cache(maxsize=None)
+def alembic_heads() -> FrozenSet[str]:
+    """
+    Return the head revisions of the migration scripts shipped with the code.
+
+    The identifiers are read from the scripts as text: Alembic's ScriptDirectory would
+    import Alembic and every migration into each worker, costing more than the check.
+    """
+    revisions, parents = set(), set()
+    for name in os.listdir(ALEMBIC_VERSIONS):
+        if not name.endswith(".py"):
+            continue
+        with open(os.path.join(ALEMBIC_VERSIONS, name), encoding="utf-8") as script:
+            assignments = dict(REVISION_PATTERN.findall(script.read()))
+        if "revision" not in assignments:
+            continue
+        revisions.add(ast.literal_eval(assignments["revision"]))
+        down = ast.literal_eval(assignments.get("down_revision", "None"))  # a tuple for merges
+        parents.update(down if isinstance(down, (tuple, list)) else [down] if down else [])
+    return frozenset(revisions - parents)
+
+
+def verify_schema(engine) -> None:
+    """
+    Check, with one query, that the database has been migrated to the Alembic head.
+
+    Args:
+    - engine (Engine): The synchronous engine.
+
+    Raises:
+    - RuntimeError: If the database has no alembic_version table or is at another revision.
+    """
+    expected = alembic_heads()
+    try:
+        with engine.connect() as conn:
+            current = frozenset(conn.execute(text("SELECT version_num FROM alembic_version")).scalars())
+    except exc.DBAPIError as error:
+        raise RuntimeError(f"Could not read the Alembic revision of the database: {error.orig}") from error
+
+    if current != expected:
+        raise RuntimeError(
+            f"The database is at revision {', '.join(sorted(current)) or 'none'} but the code expects "
+            f"{', '.join(sorted(expected))}; run `alembic upgrade head` before starting the API"
+        )
+
+
+# ---------------------------- Warm-up ----------------------------
+
+def _warm_count(engine, connections: int) -> int:
+    # Only connections the pool keeps idle are worth opening; SQLite's in-memory pools keep none
+    pool = engine.pool
+    return min(connections, pool.size()) if isinstance(pool, QueuePool) else 0
+
+
+def warm_pool(engine, connections: int) -> int:
+    """
+    Open up to `connections` connections of a synchronous engine at once and return them to its pool.
+
+    Args:
+    - engine (Engine): The synchronous engine.
+    - connections (int): Connections wanted; capped at the pool size.
+
+    Returns:
+    - int: Number of connections opened.
+    """
+    count = _warm_count(engine, connections)
+    if count == 0:
+        return 0
+    # Held until all are open, otherwise the pool would hand the same one out again
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        opened = list(executor.map(lambda _: engine.raw_connection(), range(count)))
+    for connection in opened:
+        connection.close()
+    return count
+
+
+async def warm_async_pool(engine, connections: int) -> int:
+    """
+    Open up to `connections` connections of an async engine at once and return them to its pool.
+
+    Args:
+    - engine (AsyncEngine): The async engine.
+    - connections (int): Connections wanted; capped at the pool size.
+
+    Returns:
+    - int: Number of connections opened.
+    """
+    count = _warm_count(engine.sync_engine, connections)
+    opened = await asyncio.gather(*(engine.connect().start() for _ in range(count)))
+    for connection in opened:
+        await connection.close()
+    return count
+
+
+def warm_schemas(app) -> None:
+    """
+    Build the OpenAPI schema and the adapters of the cached habit reads.
+
+    Both are otherwise built by the first request needing them.
+    """
+    from app.crud.habits import CACHED_SCHEMAS
+
+    app.openapi()
+    for schema in CACHED_SCHEMAS:
+        type_adapter(schema)
+
+
+# ---------------------------- Startup ----------------------------
+
+async def _timed(timings: Dict[str, float], name: str, step):
+    started = time.perf_counter()
+    result = await step
+    timings[f"{name}_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return result
+
+
+async def start(app) -> Dict[str, float]:
+    """
+    Prepare the worker: create the engines, handle the schema per DB_STARTUP, then
+    warm the connection pool and the schemas concurrently.
+
+    The duration of every step is logged and kept in `startup_timings`.
+
+    Args:
+    - app (FastAPI): The application being started.
+
+    Returns:
+    - Dict[str, float]: Milliseconds spent in each step and in total.
+
+    Raises:
+    - RuntimeError: In verify mode, if the database is not at the Alembic head.
+    """
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    engine = await _timed(timings, "engine", run_in_threadpool(database.get_engine))
+    async_engine = None
+    if database.DB_ASYNC:
+        async_engine = await _timed(timings, "async_engine", run_in_threadpool(database.get_async_engine))
+
+    if database.DB_STARTUP == "create_all":
+        await _timed(timings, "schema", run_in_threadpool(database.init_db))
+    elif database.DB_STARTUP == "verify":
+        await _timed(timings, "schema", run_in_threadpool(verify_schema, engine))
+
+    if async_engine is not None:
+        warm = warm_async_pool(async_engine, database.DB_POOL_WARM)
+    else:
+        warm = run_in_threadpool(warm_pool, engine, database.DB_POOL_WARM)
+    opened, _ = await asyncio.gather(
+        _timed(timings, "pool_warm", warm),
+        _timed(timings, "schema_warm", run_in_threadpool(warm_schemas, app)),
+    )
+
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    startup_timings.clear()
+    startup_timings.update(timings)
+    logger.info(
+        "Worker started", extra={"db_startup": database.DB_STARTUP, "warm_connections": opened, **timings},
+    )
+    return timings
@@ -1,7 +1,7 @@
 from app.models import Category, Frequency, Habit, User
 from sqlmodel import Session, select
 from fastapi import HTTPException, status, Query
-from typing import Optional
+from typing import Optional, Sequence
 from datetime import date
 
 # ------------------------------ HELPER FUNCTIONS ------------------------------
@@ -24,7 +24,11 @@ def normalize_category(value: Optional[str]) -> Optional[Category]:
     if isinstance(value, Category):
         return value
     if isinstance(value, str):
-        value = value.strip().lower().title()
+        # Compared case-insensitively; title() would turn "Home and Organization" into "Home And Organization"
+        value = value.strip().lower()
+        for category in Category:
+            if category.value.lower() == value:
+                return category
     try:
         return Category(value)  # Try to convert the string to a Category enum
     except ValueError:
@@ -128,19 +132,32 @@ def get_habit_of_user(habit_id: int, user_id: int, db: Session) -> Habit:
     ).first()
 
     if not db_habit:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Habit with id {habit_id} not found or not authorized."
-        )
+        raise habit_not_found(habit_id)
     return db_habit
 
-def get_user(user_id: int, db: Session) -> User:
+def habit_not_found(habit_id: int) -> HTTPException:
+    """
+    Build the error returned when a habit does not exist or belongs to another user.
+
+    Args:
+        habit_id: The ID of the requested habit.
+
+    Returns:
+        HTTPException: A 404 error that does not reveal whether the habit exists.
+    """
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Habit with id {habit_id} not found or not authorized."
+    )
+
+def get_user(user_id: int, db: Session, options: Sequence = ()) -> User:
     """
     Retrieve a User instance from the database by its ID.
     
     Args:
         user_id: The ID of the user to retrieve.
         db: The SQLAlchemy session to query the database.
+        options: Loader options, e.g. to load the user's habits in the same round trip.
         
     Returns:
         User: The User instance.
@@ -148,7 +165,7 @@ def get_user(user_id: int, db: Session) -> User:
     Raises:
         HTTPException: If the user does not exist.
     """
-    db_user = db.get(User, user_id)
+    db_user = db.get(User, user_id, options=options, populate_existing=bool(options))
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,118 @@
+"""
+completion_storage.py
+
+Compares the two completion storages (COMPLETION_STORAGE=rows and =bitmap) on the
+same synthetic history of --habits habits x --years years at roughly 70% adherence:
+on-disk size of a SQLite file holding the habits and that history, and the latency
+of marking a habit completed today, reading today's status and reading the full
+date history.
+
+Usage:
+    python -m benchmarks.completion_storage [--habits 200] [--years 5] [--repeat 200]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=200, help="Number of habits.")
+    parser.add_argument("--years", type=int, default=5, help="Years of daily history per habit.")
+    parser.add_argument("--repeat", type=int, default=200, help="Calls timed per operation; the mean is reported.")
+    return parser.parse_args()
+
+
+def generate(habits: int, years: int, today: date, seed: int = 7) -> list:
+    # Everything but today, so marking today always does real work
+    rng = random.Random(seed)
+    start = today - timedelta(days=365 * years)
+    return [
+        (habit_id, start + timedelta(days=i))
+        for habit_id in range(1, habits + 1)
+        for i in range((today - start).days)
+        if rng.random() < 0.7
+    ]
+
+
+def mean_ms(repeat: int, habits: int, fn) -> float:
+    started = time.perf_counter()
+    for i in range(repeat):
+        fn(i % habits + 1)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def run(storage: str, path: str, args, completions: list, today: date) -> dict:
+    from sqlmodel import Session, SQLModel, create_engine
+    from app.crud import bitmaps
+    from app.crud import completions as crud_completions
+    from app.models import Frequency, Habit, HabitCompletion, User
+
+    bitmaps.COMPLETION_STORAGE = storage
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as db:
+        user = User(username="bench_user", email="bench@example.com", password="not-a-hash")
+        db.add(user)
+        db.commit()
+        db.add_all(Habit(name=f"habit {i}", frequency=Frequency.DAILY, user_id=user.id,
+                         start_date=today - timedelta(days=365 * args.years))
+                   for i in range(args.habits))
+        db.commit()
+
+        if storage == "bitmap":
+            bitmaps.year_upsert(db, bitmaps.pack_completions(completions))
+        else:
+            db.execute(HabitCompletion.__table__.insert(), [
+                {"habit_id": habit_id, "date": day, "status": True} for habit_id, day in completions
+            ])
+        db.commit()
+
+    # Compact the file so its size reflects the stored data, not insertion slack
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+    size = os.path.getsize(path)
+
+    with Session(engine) as db:
+        user_id = 1
+        timings = {
+            "size_mb": size / 1024 / 1024,
+            "mark_ms": mean_ms(args.repeat, args.habits,
+                               lambda habit_id: crud_completions.mark_habit_completed_today(habit_id, user_id, db)),
+            "status_ms": mean_ms(args.repeat, args.habits,
+                                 lambda habit_id: crud_completions.get_habit_today_completion_status(habit_id, user_id, db)),
+            "dates_ms": mean_ms(args.repeat, args.habits,
+                                lambda habit_id: crud_completions.get_habit_completion_dates(habit_id, user_id, db)),
+        }
+    engine.dispose()
+    return timings
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+    today = date.today()
+    completions = generate(args.habits, args.years, today)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            storage: run(storage, os.path.join(tmp, f"{storage}.db"), args, completions, today)
+            for storage in ("rows", "bitmap")
+        }
+
+    print(f"{args.habits} habits x {args.years} years, {len(completions)} completions")
+    print(f"{'storage':<8} {'size MB':>8} {'mark ms':>8} {'status ms':>10} {'dates ms':>9}")
+    for storage, result in results.items():
+        print(f"{storage:<8} {result['size_mb']:>8.2f} {result['mark_ms']:>8.3f} "
+              f"{result['status_ms']:>10.3f} {result['dates_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
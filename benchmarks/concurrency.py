@@ -0,0 +1,144 @@
+"""
+concurrency.py
+
+Measures requests/sec of the habit read and completion endpoints under a fixed
+number of concurrent clients, once with the blocking Session and once with the
+AsyncSession mode (DB_ASYNC=true).
+
+Each mode runs in its own subprocess because the session mode is selected when
+`app.database` is imported. Requests are driven in-process through httpx's ASGI
+transport, so the numbers reflect how much work a single event loop gets done.
+
+Usage:
+    python -m benchmarks.concurrency [--clients 200] [--requests 4000] [--database-url URL]
+
+Without --database-url a throwaway SQLite file is used. Pass a PostgreSQL URL to
+measure the difference against a real network round trip.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200, help="Number of concurrent clients.")
+    parser.add_argument("--requests", type=int, default=4000, help="Total number of requests per mode.")
+    parser.add_argument("--database-url", default=None, help="Database to benchmark against.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+# ---------------------------- Worker (one session mode) ----------------------------
+
+def seed(habit_count: int = 10):
+    """
+    Create a fresh schema with one user owning a few habits and return a token for it.
+    """
+    from datetime import date, timedelta
+    from sqlmodel import Session, SQLModel
+    from app.database import engine
+    from app.models import User, Habit, Frequency
+    from app.auth import create_access_token
+
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as db:
+        user = User(username="bench_user", email="bench@example.com")
+        user.set_password("password123")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+        habits = [
+            Habit(name=f"Habit {i}", frequency=Frequency.DAILY, start_date=date.today() - timedelta(days=30), user_id=user.id)
+            for i in range(habit_count)
+        ]
+        db.add_all(habits)
+        db.commit()
+
+        habit_ids = [habit.id for habit in habits]
+        return create_access_token(user.username, user.id, timedelta(minutes=30)), habit_ids
+
+
+async def drive(clients: int, total: int, token: str, habit_ids: list) -> dict:
+    """
+    Issue `total` requests from `clients` concurrent tasks and return throughput figures.
+    """
+    import httpx
+    from app.main import app
+
+    headers = {"Authorization": f"Bearer {token}"}
+    paths = ["/habits/"] + [f"/habits/complete/today/{habit_id}" for habit_id in habit_ids]
+    remaining = iter(range(total))
+    errors = 0
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal errors
+        for i in remaining:
+            response = await client.get(paths[i % len(paths)], headers=headers)
+            if response.status_code != 200:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    return {"requests": total, "errors": errors, "seconds": round(elapsed, 3), "rps": round(total / elapsed, 1)}
+
+
+def run_worker(args):
+    from app.database import engine, DB_ASYNC, async_engine
+
+    # SQL echo would dominate the measurement
+    engine.echo = False
+    if async_engine is not None:
+        async_engine.echo = False
+
+    token, habit_ids = seed()
+    result = asyncio.run(drive(args.clients, args.requests, token, habit_ids))
+    result["mode"] = "async" if DB_ASYNC else "sync"
+    # The last line of output is the machine-readable result
+    print(json.dumps(result))
+
+
+# ---------------------------- Driver ----------------------------
+
+def run_mode(args, database_url: str, db_async: bool) -> dict:
+    env = dict(os.environ, DATABASE_URL=database_url, DB_ASYNC="true" if db_async else "false")
+    env.setdefault("SECRET_KEY", "benchmark-secret")
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.concurrency", "--worker",
+         "--clients", str(args.clients), "--requests", str(args.requests)],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        run_worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        results = [run_mode(args, database_url, db_async) for db_async in (False, True)]
+
+    print(f"{args.requests} requests, {args.clients} concurrent clients")
+    print(f"{'mode':<6} {'req/s':>9} {'seconds':>9} {'errors':>7}")
+    for result in results:
+        print(f"{result['mode']:<6} {result['rps']:>9} {result['seconds']:>9} {result['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
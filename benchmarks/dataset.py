@@ -0,0 +1,244 @@
+"""
+dataset.py
+
+Populates a database with a deterministic synthetic population of users, habits and
+completions, shaped like real usage rather than uniform noise:
+
+- habits per user follow a Pareto distribution: most users keep a handful, a few keep
+  dozens (capped by --max-habits), and some keep none;
+- most habits are daily, fewer weekly or monthly, and categories are unevenly used;
+- every habit has its own adherence (a Beta distribution, so a few are kept almost
+  every period and a few are nearly abandoned) and its own start date within --days.
+
+The same --seed and --today always produce the same rows. Rows are generated one user
+at a time and written in batches with explicit IDs, following any rows already in the
+database, so memory stays flat whatever the scale; 100k users with a year of history
+(roughly 100M completions) take a while, not more memory. Completions go to the
+configured COMPLETION_STORAGE, and the streak columns are rebuilt at the end.
+
+Every generated user's password is `password123`, and when the database starts empty,
+user 1 is an admin.
+
+Usage:
+    python -m benchmarks.dataset [--users 1000] [--max-habits 40] [--days 365] [--seed 42]
+                                 [--today YYYY-MM-DD] [--batch-size 20000] [--database-url URL]
+
+Without --database-url the DATABASE_URL environment variable is used.
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import Iterator, List, NamedTuple, Tuple
+
+# Password of every generated user
+PASSWORD = "password123"
+
+# Relative weights of the habit frequencies and categories
+FREQUENCY_WEIGHTS = {"DAILY": 70, "WEEKLY": 22, "MONTHLY": 7, "YEARLY": 1}
+CATEGORY_WEIGHTS = {
+    "FITNESS": 25, "PERSONAL_DEVELOPMENT": 18, "MENTAL_WELLNESS": 14, "NUTRITION": 12, "SELF_CARE": 10,
+    "FINANCE": 8, "HOME_AND_ORGANIZATION": 6, "SOCIAL": 4, "GENERAL": 3,
+}
+
+
+class Scale(NamedTuple):
+    users: int
+    max_habits: int
+    days: int
+
+
+class GeneratedUser(NamedTuple):
+    user: dict
+    habits: List[dict]
+    completions: List[Tuple[int, date]]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="Users to generate.")
+    parser.add_argument("--max-habits", type=int, default=40, help="Most habits a single user may have.")
+    parser.add_argument("--days", type=int, default=365, help="Days of history before --today.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the generator; the same seed gives the same rows.")
+    parser.add_argument("--today", type=date.fromisoformat, default=None, help="Last day of the history (default: today).")
+    parser.add_argument("--batch-size", type=int, default=20_000, help="Completions written per round trip.")
+    parser.add_argument("--database-url", default=None, help="Database to populate (default: $DATABASE_URL).")
+    return parser.parse_args()
+
+
+# ---------------------------- Generation ----------------------------
+
+def completion_days(rng: random.Random, frequency: str, start: date, today: date, adherence: float) -> Iterator[date]:
+    """
+    Yield the days a habit was completed: each of its periods before today is kept
+    with probability `adherence`, on a random day of the period.
+    """
+    if frequency == "DAILY":
+        for offset in range((today - start).days):
+            if rng.random() < adherence:
+                yield start + timedelta(days=offset)
+        return
+
+    period = {"WEEKLY": 7, "MONTHLY": 30, "YEARLY": 365}[frequency]
+    day = start
+    while day < today:
+        if rng.random() < adherence:
+            completed = day + timedelta(days=rng.randrange(period))
+            if completed < today:
+                yield completed
+        day += timedelta(days=period)
+
+
+def generate(scale: Scale, seed: int, today: date, password_hash: str,
+             first_user_id: int = 1, first_habit_id: int = 1) -> Iterator[GeneratedUser]:
+    """
+    Yield the generated users one at a time, each with their habits and completions.
+
+    Parameters:
+    - scale (Scale): Number of users, habit cap per user and days of history.
+    - seed (int): Seed of the random generator.
+    - today (date): Day after the last generated completion.
+    - password_hash (str): Stored password of every user.
+    - first_user_id / first_habit_id (int): IDs given to the first user and habit.
+
+    Returns:
+    - Iterator[GeneratedUser]: Rows ready for `insert()` and (habit_id, date) completions.
+    """
+    rng = random.Random(seed)
+    frequencies, frequency_weights = zip(*FREQUENCY_WEIGHTS.items())
+    categories, category_weights = zip(*CATEGORY_WEIGHTS.items())
+    created_at = today - timedelta(days=scale.days)
+    habit_id = first_habit_id
+
+    for user_id in range(first_user_id, first_user_id + scale.users):
+        user = {
+            "id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com",
+            "password": password_hash, "is_admin": user_id == 1, "created_at": created_at, "data_version": 0,
+        }
+        # About a third of the users have no habits, most of the others a few, some reach the cap
+        habit_count = 0 if rng.random() < 0.1 else min(scale.max_habits, int(rng.paretovariate(1.2) * 1.5) - 1)
+
+        habits, completions = [], []
+        for number in range(habit_count):
+            frequency = rng.choices(frequencies, frequency_weights)[0]
+            start = today - timedelta(days=int(scale.days * rng.betavariate(1.5, 1)))
+            habits.append({
+                "id": habit_id, "user_id": user_id, "name": f"habit {number + 1}",
+                "description": None, "category": rng.choices(categories, category_weights)[0],
+                "frequency": frequency, "start_date": start, "reminder_time": None,
+                "current_streak": 0, "longest_streak": 0, "last_completed_date": None,
+            })
+            adherence = rng.betavariate(2, 1.2)
+            completions.extend((habit_id, day) for day in completion_days(rng, frequency, start, today, adherence))
+            habit_id += 1
+
+        yield GeneratedUser(user, habits, completions)
+
+
+# ---------------------------- Writing ----------------------------
+
+def next_id(db, model) -> int:
+    from sqlalchemy import func
+    from sqlmodel import select
+
+    return (db.exec(select(func.max(model.id))).one() or 0) + 1
+
+
+def write_batch(db, users: List[dict], habits: List[dict], completions: List[Tuple[int, date]]):
+    from app.crud import bitmaps
+    from app.models import Habit, HabitCompletion, User
+
+    if users:
+        db.execute(User.__table__.insert(), users)
+    if habits:
+        db.execute(Habit.__table__.insert(), habits)
+    if bitmaps.bitmap_storage():
+        # A batch holds every completion of its habits, so each (habit, year) is packed once
+        bitmaps.year_upsert(db, bitmaps.pack_completions(completions))
+    elif completions:
+        db.execute(HabitCompletion.__table__.insert(), [
+            {"habit_id": habit_id, "date": day, "status": True} for habit_id, day in completions
+        ])
+    db.commit()
+
+
+def reset_sequences(db):
+    """
+    Move PostgreSQL's ID sequences past the explicitly inserted IDs.
+    """
+    from sqlalchemy import text
+
+    if db.get_bind().dialect.name == "postgresql":
+        for table in ('"user"', "habit"):
+            db.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"))
+        db.commit()
+
+
+def populate(db, scale: Scale, seed: int = 42, today: date = None, batch_size: int = 20_000) -> dict:
+    """
+    Generate a population and write it to the database, after any existing rows.
+
+    Parameters:
+    - db (Session): Database session; committed after every batch.
+    - scale (Scale): Number of users, habit cap per user and days of history.
+    - seed (int): Seed of the random generator.
+    - today (date): Day after the last generated completion (default: today).
+    - batch_size (int): Completions written per round trip.
+
+    Returns:
+    - dict: Number of users, habits and completions written.
+    """
+    from app.crud.streaks import rebuild_streaks
+    from app.hashing import hash_password
+    from app.models import Habit, User
+
+    password_hash = hash_password(PASSWORD)  # bcrypt is slow on purpose; hash once
+    population = generate(scale, seed, today or date.today(), password_hash, next_id(db, User), next_id(db, Habit))
+
+    counts = {"users": 0, "habits": 0, "completions": 0}
+    users, habits, completions = [], [], []
+    for generated in population:
+        users.append(generated.user)
+        habits.extend(generated.habits)
+        completions.extend(generated.completions)
+        if len(completions) >= batch_size or len(users) >= batch_size:
+            write_batch(db, users, habits, completions)
+            counts["users"] += len(users)
+            counts["habits"] += len(habits)
+            counts["completions"] += len(completions)
+            users, habits, completions = [], [], []
+
+    write_batch(db, users, habits, completions)
+    counts["users"] += len(users)
+    counts["habits"] += len(habits)
+    counts["completions"] += len(completions)
+
+    reset_sequences(db)
+    rebuild_streaks(db)
+    return counts
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+    from sqlmodel import Session, SQLModel
+    from app.database import engine
+    import app.models  # noqa: F401  registers the tables
+
+    SQLModel.metadata.create_all(engine)  # creates only the missing tables
+    started = time.perf_counter()
+    with Session(engine) as db:
+        counts = populate(db, Scale(args.users, args.max_habits, args.days), args.seed, args.today, args.batch_size)
+    elapsed = time.perf_counter() - started
+
+    print(f"Wrote {counts['users']:,} users, {counts['habits']:,} habits and "
+          f"{counts['completions']:,} completions in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
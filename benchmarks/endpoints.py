@@ -0,0 +1,318 @@
+"""
+endpoints.py
+
+Drives each main endpoint through the ASGI app at a fixed concurrency and reports,
+per endpoint, the p50/p95/p99 latency, the throughput and the SQL statements run per
+request. Results can be stored as a baseline and later runs compared against it, to
+catch a change that makes an endpoint slower or adds queries to it.
+
+The requests are spread over a sample of the users of a population generated with
+`benchmarks.dataset` (or of an existing database with --no-populate), each using
+their own habits, so caches and indexes see a realistic mix. Latency is measured
+in-process through httpx's ASGI transport: it covers routing, validation,
+serialization and the database, not a network hop.
+
+Usage:
+    python -m benchmarks.endpoints [--users 500] [--concurrency 16] [--requests 500]
+                                   [--scenario NAME ...] [--database-url URL] [--no-populate]
+                                   [--save-baseline | --compare] [--baseline PATH] [--tolerance 0.25]
+
+Without --database-url a throwaway SQLite file is populated. --compare exits with
+status 1 when an endpoint's p95 latency or throughput is worse than the baseline by
+more than --tolerance, or when it runs more queries per request. Baselines are only
+comparable on the same machine and scale; the stored one records both.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Callable, List, NamedTuple
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "endpoints.json")
+
+# Increase of queries per request tolerated by --compare (concurrent cache misses)
+QUERY_MARGIN = 0.1
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    path: Callable[[int], str]  # habit ID -> request path
+    admin: bool = False
+
+
+SCENARIOS = [
+    Scenario("habits_page", "GET", lambda habit_id: "/habits/"),
+    Scenario("habits_all", "GET", lambda habit_id: "/habits/?paginate=false"),
+    Scenario("habit_by_id", "GET", lambda habit_id: f"/habits/{habit_id}"),
+    Scenario("habits_today", "GET", lambda habit_id: "/habits/today"),
+    Scenario("habit_stats", "GET", lambda habit_id: f"/habits/{habit_id}/stats"),
+    Scenario("completion_status", "GET", lambda habit_id: f"/habits/complete/today/{habit_id}"),
+    Scenario("completion_dates", "GET", lambda habit_id: f"/habits/complete/{habit_id}"),
+    Scenario("completion_counts", "GET", lambda habit_id: f"/habits/complete/{habit_id}/counts?period=week"),
+    Scenario("mark_completed", "POST", lambda habit_id: f"/habits/complete/today/{habit_id}"),
+    Scenario("users_page", "GET", lambda habit_id: "/users/", admin=True),
+]
+
+
+class Client(NamedTuple):
+    headers: dict
+    habit_ids: List[int]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500, help="Users generated into the throwaway database.")
+    parser.add_argument("--days", type=int, default=365, help="Days of generated history.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the generated data and of the request mix.")
+    parser.add_argument("--sample", type=int, default=50, help="Users the requests are spread over.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at any time.")
+    parser.add_argument("--requests", type=int, default=500, help="Timed requests per endpoint.")
+    parser.add_argument("--warmup", type=int, default=50, help="Untimed requests per endpoint, sent first.")
+    parser.add_argument("--scenario", action="append", choices=[s.name for s in SCENARIOS], help="Only run this endpoint (repeatable).")
+    parser.add_argument("--database-url", default=None, help="Database to benchmark against.")
+    parser.add_argument("--no-populate", action="store_true", help="Use the rows already in --database-url.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file to write or compare with.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--save-baseline", action="store_true", help="Store the results as the baseline.")
+    mode.add_argument("--compare", action="store_true", help="Compare the results with the baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative loss of p95 latency and throughput.")
+    return parser.parse_args()
+
+
+# ---------------------------- Setup ----------------------------
+
+def prepare(args) -> dict:
+    """
+    Populate the database if asked, and sign in a sample of users owning habits.
+
+    Returns:
+    - dict: `users`, a list of Clients, and `admin`, the Client of an admin (or None).
+    """
+    from sqlalchemy import func
+    from sqlmodel import Session, SQLModel, select
+    from app.auth import create_access_token
+    from app.database import engine
+    from app.models import Habit, User
+    from benchmarks.dataset import Scale, populate
+
+    if not args.no_populate:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as db:
+            counts = populate(db, Scale(args.users, 40, args.days), args.seed)
+        print(f"Populated {counts['users']:,} users, {counts['habits']:,} habits, {counts['completions']:,} completions")
+
+    def sign_in(user_id: int, username: str, habit_ids: List[int]) -> Client:
+        token = create_access_token(username, user_id, timedelta(hours=2))
+        return Client({"Authorization": f"Bearer {token}"}, habit_ids)
+
+    rng = random.Random(args.seed)
+    with Session(engine) as db:
+        owners = db.exec(select(Habit.user_id).group_by(Habit.user_id).order_by(Habit.user_id)).all()
+        chosen = sorted(rng.sample(owners, min(args.sample, len(owners))))
+        users = []
+        for user_id in chosen:
+            username = db.exec(select(User.username).where(User.id == user_id)).one()
+            habit_ids = db.exec(select(Habit.id).where(Habit.user_id == user_id).order_by(Habit.id)).all()
+            users.append(sign_in(user_id, username, habit_ids))
+        admin = db.exec(select(User.id, User.username).where(User.is_admin).order_by(User.id).limit(1)).first()
+        user_count = db.exec(select(func.count()).select_from(User)).one()
+
+    if not users:
+        sys.exit("error: no user owns a habit; populate the database first")
+    return {"users": users, "admin": sign_in(admin.id, admin.username, []) if admin else None, "user_count": user_count}
+
+
+def count_queries() -> list:
+    """
+    Count the SQL statements of every engine the app uses; returns a one-item list.
+    """
+    from sqlalchemy import event
+    from app.database import async_engine, engine
+
+    counter = [0]
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter[0] += 1
+
+    for target in (engine, async_engine.sync_engine if async_engine is not None else None):
+        if target is not None:
+            event.listen(target, "before_cursor_execute", count)
+    return counter
+
+
+# ---------------------------- Measurement ----------------------------
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    # Nearest rank
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+async def run_scenario(client, scenario: Scenario, clients: List[Client], admin: Client, args, queries: list) -> dict:
+    """
+    Send the warmup then the timed requests of one endpoint from `args.concurrency` tasks.
+    """
+    rng = random.Random(f"{args.seed}-{scenario.name}")
+    plan = []
+    for _ in range(args.warmup + args.requests):
+        user = admin if scenario.admin else rng.choice(clients)
+        habit_id = rng.choice(user.habit_ids) if user.habit_ids else 0
+        plan.append((scenario.path(habit_id), user.headers))
+
+    async def send(requests, latencies=None):
+        errors = 0
+        pending = iter(requests)
+
+        async def worker():
+            nonlocal errors
+            for path, headers in pending:
+                started = time.perf_counter()
+                response = await client.request(scenario.method, path, headers=headers)
+                if latencies is not None:
+                    latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        return errors
+
+    await send(plan[:args.warmup])
+    latencies = []
+    queries_before = queries[0]
+    started = time.perf_counter()
+    errors = await send(plan[args.warmup:], latencies)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": args.requests,
+        "errors": errors,
+        "rps": round(args.requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "queries_per_request": round((queries[0] - queries_before) / args.requests, 2),
+    }
+
+
+async def run_all(args, setup: dict) -> dict:
+    import httpx
+    from app.main import app
+
+    queries = count_queries()
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for scenario in SCENARIOS:
+            if args.scenario and scenario.name not in args.scenario:
+                continue
+            if scenario.admin and setup["admin"] is None:
+                print(f"skipping {scenario.name}: no admin user")
+                continue
+            results[scenario.name] = await run_scenario(client, scenario, setup["users"], setup["admin"], args, queries)
+    return results
+
+
+# ---------------------------- Reporting ----------------------------
+
+def print_results(results: dict):
+    print(f"{'endpoint':<18} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+    for name, result in results.items():
+        print(f"{name:<18} {result['rps']:>8} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['queries_per_request']:>8} {result['errors']:>7}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Return a description of every regression of `results` against `baseline`.
+
+    p95 latency and throughput may drift by `tolerance` (run-to-run noise). The number
+    of queries per request only varies with the habit cache's hit ratio, so an
+    increase beyond QUERY_MARGIN means a new query.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms")
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['rps']} -> {result['rps']} req/s")
+        if result["queries_per_request"] > base["queries_per_request"] + QUERY_MARGIN:
+            regressions.append(f"{name}: queries per request {base['queries_per_request']} -> {result['queries_per_request']}")
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {result['errors']}")
+    return regressions
+
+
+def run(args, database_url: str):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    # Slow statement records would interleave with the report (SQLite serializes the writes)
+    os.environ.setdefault("SLOW_QUERY_SAMPLE_RATE", "0")
+
+    from app.crud.bitmaps import COMPLETION_STORAGE
+    from app.cache import HABIT_CACHE_BACKEND
+    from app.database import DB_ASYNC
+
+    setup = prepare(args)
+    results = asyncio.run(run_all(args, setup))
+    meta = {
+        "date": date.today().isoformat(),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        "database": database_url.split(":", 1)[0],
+        "users": setup["user_count"],
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "db_async": DB_ASYNC,
+        "completion_storage": COMPLETION_STORAGE,
+        "habit_cache": HABIT_CACHE_BACKEND,
+    }
+
+    print(f"{args.requests} requests per endpoint, {args.concurrency} concurrent, {setup['user_count']:,} users")
+    print_results(results)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as stream:
+            json.dump({"meta": meta, "scenarios": results}, stream, indent=2)
+            stream.write("\n")
+        print(f"Baseline written to {args.baseline}")
+    elif args.compare:
+        with open(args.baseline, encoding="utf-8") as stream:
+            baseline = json.load(stream)
+        differing = [key for key in ("machine", "database", "users", "concurrency", "db_async", "completion_storage", "habit_cache")
+                     if baseline["meta"].get(key) != meta[key]]
+        if differing:
+            print(f"warning: the baseline was recorded with a different {', '.join(differing)}")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression against {args.baseline}")
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        run(args, args.database_url)
+        return
+    if args.no_populate:
+        sys.exit("error: --no-populate needs --database-url")
+    with tempfile.TemporaryDirectory() as tmp:
+        run(args, f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+
+
+if __name__ == "__main__":
+    main()
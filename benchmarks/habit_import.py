@@ -0,0 +1,85 @@
+"""
+habit_import.py
+
+Measures how fast `app.crud.habit_import.import_habits` ingests a generated CSV
+file, next to calling `create_habit` once per row for a sample of the rows.
+
+Usage:
+    python -m benchmarks.habit_import [--rows 100000] [--sample 2000] [--database-url URL]
+
+Without --database-url a throwaway SQLite file is used. With a PostgreSQL URL using
+psycopg2 the import goes through COPY.
+"""
+
+import argparse
+import io
+import os
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows in the imported file.")
+    parser.add_argument("--sample", type=int, default=2000, help="Rows created one by one for comparison.")
+    parser.add_argument("--database-url", default=None, help="Database to benchmark against.")
+    return parser.parse_args()
+
+
+def generate_csv(rows: int) -> str:
+    categories = ["fitness", "finance", "nutrition", "self care", ""]
+    frequencies = ["daily", "weekly", "monthly"]
+    lines = ["name,description,category,frequency,reminder_time"]
+    lines += [
+        f"habit {i},imported habit {i},{categories[i % len(categories)]},{frequencies[i % len(frequencies)]},07:30"
+        for i in range(rows)
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def run(args, database_url: str):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+    from sqlmodel import Session, SQLModel
+    from app.database import engine
+    from app.models import User
+    from app.schemas import HabitCreate
+    from app.crud.habits import create_habit
+    from app.crud.habit_import import import_habits
+
+    engine.echo = False
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as db:
+        user = User(username="bench_user", email="bench@example.com", password="not-a-hash")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+
+        data = generate_csv(args.rows)
+        started = time.perf_counter()
+        result = import_habits(io.StringIO(data), "csv", user_id, db)
+        import_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for i in range(args.sample):
+            create_habit(HabitCreate(name=f"single {i}", frequency="daily"), user_id, db)
+        single_seconds = time.perf_counter() - started
+
+    print(f"import: {result.imported} rows in {import_seconds:.2f}s ({result.imported / import_seconds:,.0f} rows/s)")
+    print(f"create_habit: {args.sample} rows in {single_seconds:.2f}s ({args.sample / single_seconds:,.0f} rows/s)")
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        run(args, args.database_url)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        run(args, f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+
+
+if __name__ == "__main__":
+    main()
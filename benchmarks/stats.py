@@ -0,0 +1,123 @@
+"""
+stats.py
+
+Compares the NumPy habit statistics (app.crud.stats.compute_habit_stats) with a
+straightforward Python loop over completion dates, on synthetic histories of
+10 years x 50 habits at roughly 70% adherence.
+
+Only the computation is timed: the loop gets `date` objects, as it would from ORM
+rows, and the NumPy version gets the epoch-day arrays the endpoint fetches.
+
+Usage:
+    python -m benchmarks.stats [--habits 50] [--years 10] [--repeat 5]
+"""
+
+import argparse
+import random
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.crud.stats import compute_habit_stats, to_epoch_day
+from app.models import Frequency
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=50, help="Number of habits.")
+    parser.add_argument("--years", type=int, default=10, help="Years of daily history per habit.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per implementation; the best is reported.")
+    return parser.parse_args()
+
+
+def generate(habits: int, years: int, today: date, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    start = today - timedelta(days=365 * years)
+    span = (today - start).days + 1
+    return [
+        (start, [start + timedelta(days=i) for i in range(span) if rng.random() < 0.7])
+        for _ in range(habits)
+    ]
+
+
+def loop_stats(dates: list, start_date: date, today: date) -> dict:
+    """
+    The same daily-habit metrics as compute_habit_stats, one date at a time.
+    """
+    dates = [day for day in dates if day <= today]
+    first = min([start_date] + dates[:1])
+    total_days = (today - first).days + 1
+    done = set(dates)
+
+    weekdays = [0] * 7
+    for day in dates:
+        weekdays[day.weekday()] += 1
+
+    def adherence(window):
+        window = min(window, total_days)
+        hits = sum(1 for i in range(window) if today - timedelta(days=i) in done)
+        return round(hits / window, 4)
+
+    months = Counter()
+    day = first
+    while day <= today:
+        months[(day.year, day.month)] += 0
+        day += timedelta(days=1)
+    for day in dates:
+        months[(day.year, day.month)] += 1
+    ordered = sorted(months.items())
+    best = max(ordered, key=lambda item: item[1])
+    worst = min(ordered, key=lambda item: item[1])
+
+    return {
+        "total_completions": len(dates),
+        "completion_rate": round(len(done) / total_days, 4),
+        "weekday_counts": weekdays,
+        "adherence_7d": adherence(7),
+        "adherence_30d": adherence(30),
+        "best_month": (f"{best[0][0]:04d}-{best[0][1]:02d}", best[1]),
+        "worst_month": (f"{worst[0][0]:04d}-{worst[0][1]:02d}", worst[1]),
+    }
+
+
+def numpy_stats(days: np.ndarray, start_date: date, today: date) -> dict:
+    result = compute_habit_stats(days, Frequency.DAILY, start_date, today)
+    result["best_month"] = (result["best_month"].month, result["best_month"].completions)
+    result["worst_month"] = (result["worst_month"].month, result["worst_month"].completions)
+    return result
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    args = parse_args()
+    today = date.today()
+    histories = generate(args.habits, args.years, today)
+    arrays = [(start, np.array([to_epoch_day(day) for day in dates], dtype=np.int64)) for start, dates in histories]
+
+    # Both implementations must agree before their speed means anything
+    for (start, dates), (_, days) in zip(histories, arrays):
+        assert loop_stats(dates, start, today) == numpy_stats(days, start, today)
+
+    loop_seconds = best_of(args.repeat, lambda: [loop_stats(dates, start, today) for start, dates in histories])
+    numpy_seconds = best_of(args.repeat, lambda: [numpy_stats(days, start, today) for start, days in arrays])
+
+    completions = sum(len(dates) for _, dates in histories)
+    print(f"{args.habits} habits x {args.years} years, {completions} completions")
+    print(f"{'impl':<6} {'ms':>9}")
+    print(f"{'loop':<6} {loop_seconds * 1000:>9.1f}")
+    print(f"{'numpy':<6} {numpy_seconds * 1000:>9.1f}")
+    print(f"speedup {loop_seconds / numpy_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
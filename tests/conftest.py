@@ -1,9 +1,13 @@
 import pytest
 from typing import Generator
 from sqlmodel import Session, SQLModel, create_engine, StaticPool
+from sqlalchemy import event
 from fastapi.testclient import TestClient
 from app.main import app
-from app.database import get_db
+from app.database import get_db, enable_sqlite_foreign_keys
+from app.cache import habit_cache, principal_cache
+from app.metrics import instrument_engine
+from app.logs import log_slow_queries
 from tests.test_helpers import create_access_token
 from app import models
 from uuid import uuid4
@@ -18,6 +22,9 @@ engine = create_engine(
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
+enable_sqlite_foreign_keys(engine)
+instrument_engine(engine)
+log_slow_queries(engine)
 
 # Pytest fixture for DB session
 @pytest.fixture
@@ -32,6 +39,7 @@ def session() -> Generator[Session, None, None]:
     # drop & create the database tables before each test for isolation
     SQLModel.metadata.drop_all(bind=engine)
     SQLModel.metadata.create_all(bind=engine)
+    habit_cache.clear()  # IDs are reused once the tables are recreated
     
     # Create a new session
     db = Session(bind=engine)
@@ -41,6 +49,24 @@ def session() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+@pytest.fixture
+def captured_sql() -> Generator[list, None, None]:
+    """
+    Fixture recording every SQL statement executed on the test engine.
+
+    Yields a list that fills with (statement, parameters) tuples as queries run.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
 @pytest.fixture
 def client(session: Session) -> Generator[TestClient, None, None]:
     """
@@ -56,6 +82,7 @@ def client(session: Session) -> Generator[TestClient, None, None]:
 
     # Inject the overrided dependency into the app
     app.dependency_overrides[get_db] = override_get_db
+    principal_cache.clear()  # Tokens verified by earlier tests must not leak in
     yield TestClient(app)
     app.dependency_overrides.clear() # Clear the overrides after the test
 
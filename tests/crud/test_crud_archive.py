@@ -0,0 +1,131 @@
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+from sqlmodel import Session, select
+from tests.conftest_crud import db_habit_factory, db_user_factory
+from app.crud import archive, bitmaps, export, stats, streaks
+from app.crud import completions as crud_completions
+from app.models import Habit, HabitCompletion, HabitCompletionMonth, User
+from app import schemas as s
+import pytest
+
+TODAY = date(2025, 6, 15)
+
+@pytest.fixture
+def history(session: Session, db_habit_factory, monkeypatch):
+    """
+    A habit started in 2024 with completions in archivable and recent months, read as of TODAY.
+    """
+    habit, user = db_habit_factory()
+    db_habit = session.get(Habit, habit.id)
+    db_habit.start_date = date(2024, 1, 1)
+    session.commit()
+
+    days = [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3), date(2024, 1, 31), date(2024, 3, 10),
+            date(2024, 6, 1), date(2025, 6, 13), date(2025, 6, 14)]
+    session.add_all(HabitCompletion(habit_id=habit.id, date=day, status=True) for day in days)
+    session.commit()
+    for module in (crud_completions, stats):
+        monkeypatch.setattr(module, "get_today", lambda: TODAY)
+    return SimpleNamespace(habit_id=habit.id, user_id=user['id'], days=days)
+
+def read_everything(session: Session, history) -> dict:
+    streaks.rebuild_streaks(session, [history.habit_id])
+    session.expire_all()
+    habit = session.get(Habit, history.habit_id)
+    chunks = asyncio.run(_collect(export.export_completions(session, history.user_id, history.habit_id, "csv")))
+    return {
+        "dates": crud_completions.get_habit_completion_dates(history.habit_id, history.user_id, session).completed_dates,
+        "range": crud_completions.get_habit_completion_dates(
+            history.habit_id, history.user_id, session, date_from=date(2024, 1, 2), date_to=date(2024, 3, 10)
+        ).completed_dates,
+        "weeks": crud_completions.get_habit_completion_counts(history.habit_id, history.user_id, session, "week").counts,
+        "months": crud_completions.get_habit_completion_counts(history.habit_id, history.user_id, session, "month").counts,
+        "stats": stats.get_habit_stats(history.habit_id, history.user_id, session),
+        "user_stats": stats.get_user_habit_stats(history.user_id, session),
+        "streaks": (habit.current_streak, habit.longest_streak, habit.last_completed_date),
+        "export": "".join(chunks),
+    }
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+def test_archive_cutoff_is_a_month_start():
+    assert archive.archive_cutoff(date(2025, 6, 15), 365) == date(2024, 6, 1)
+    assert archive.archive_cutoff(date(2025, 3, 1), 0) == date(2025, 3, 1)
+
+def test_pack_and_decode_months():
+    days = [date(2024, 2, 1), date(2024, 2, 29), date(2024, 3, 31)]
+
+    months = archive.pack_months((7, day) for day in reversed(days))
+
+    assert months == {(7, date(2024, 2, 1)): 1 | (1 << 28), (7, date(2024, 3, 1)): 1 << 30}
+    decoded = [day for (_, month), bits in sorted(months.items())
+               for day in archive.decode_month(SimpleNamespace(month=month, days=bits))]
+    assert decoded == days
+
+def test_archiving_keeps_every_reader_unchanged(session: Session, history):
+    before = read_everything(session, history)
+
+    archived = archive.archive_completions(session, today=TODAY, batch_size=2)
+
+    assert archived == 5  # 2024-06 and later stay live
+    live = session.exec(select(HabitCompletion.date).where(HabitCompletion.habit_id == history.habit_id)).all()
+    assert sorted(live) == [date(2024, 6, 1), date(2025, 6, 13), date(2025, 6, 14)]
+    months = session.exec(select(HabitCompletionMonth.month, HabitCompletionMonth.count)
+                          .order_by(HabitCompletionMonth.month)).all()
+    assert months == [(date(2024, 1, 1), 4), (date(2024, 3, 1), 1)]
+
+    after = read_everything(session, history)
+    assert after == before
+    assert after["dates"] == history.days
+    assert after["stats"].total_completions == len(history.days)
+
+def test_backfilled_day_is_merged_once(session: Session, history):
+    archive.archive_completions(session, today=TODAY)
+
+    # A backfill of an archived month, and of an archived day again
+    session.add_all([HabitCompletion(habit_id=history.habit_id, date=date(2024, 1, 10), status=True),
+                     HabitCompletion(habit_id=history.habit_id, date=date(2024, 1, 2), status=True)])
+    session.commit()
+    expected = sorted(set(history.days) | {date(2024, 1, 10)})
+    dates = crud_completions.get_habit_completion_dates(history.habit_id, history.user_id, session).completed_dates
+    assert dates == expected
+    assert stats.get_habit_stats(history.habit_id, history.user_id, session).total_completions == len(expected)
+
+    assert archive.archive_completions(session, today=TODAY) == 2
+    january = session.get(HabitCompletionMonth, (history.habit_id, date(2024, 1, 1)))
+    assert january.count == 5
+
+def test_restore_copies_the_archive_back(session: Session, history):
+    archive.archive_completions(session, today=TODAY)
+
+    assert archive.restore_completions(session) == 5
+
+    live = session.exec(select(HabitCompletion.date).where(HabitCompletion.habit_id == history.habit_id)).all()
+    assert sorted(live) == history.days
+    assert session.exec(select(HabitCompletionMonth)).all() == []
+
+def test_convert_to_bitmaps_includes_the_archive(session: Session, history, monkeypatch):
+    archive.archive_completions(session, today=TODAY)
+
+    assert bitmaps.convert_to_bitmaps(session) == len(history.days)
+
+    monkeypatch.setattr(bitmaps, "COMPLETION_STORAGE", "bitmap")
+    assert bitmaps.completion_dates(session, history.habit_id) == history.days
+    assert archive.archive_completions(session, today=TODAY) == 0
+
+def test_bulk_completion_of_an_archived_day_is_already_completed(session: Session, history, monkeypatch):
+    archive.archive_completions(session, today=TODAY)
+    version = session.get(User, history.user_id).data_version
+    items = [s.CompletionItem(habit_id=history.habit_id, date=date(2024, 1, 2)),
+             s.CompletionItem(habit_id=history.habit_id, date=date(2024, 1, 4))]
+
+    result = crud_completions.mark_habits_completed(items, history.user_id, session)
+
+    assert result.created == 1
+    assert [item.status for item in result.results] == ["already_completed", "created"]
+    session.expire_all()
+    assert session.get(User, history.user_id).data_version == version + 1
+    live = session.exec(select(HabitCompletion.date).where(HabitCompletion.date < date(2024, 6, 1))).all()
+    assert live == [date(2024, 1, 4)]
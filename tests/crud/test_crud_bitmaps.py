@@ -0,0 +1,144 @@
+import asyncio
+from types import SimpleNamespace
+from datetime import date, timedelta
+from sqlmodel import Session, select
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql
+from tests.conftest_crud import db_habit_factory, db_user_factory
+from app.crud import bitmaps, export, stats, streaks
+from app.crud import completions as crud_completions
+from app.crud import habits as crud_habits
+from app.models import Habit, HabitCompletion, HabitCompletionYear
+from app.schemas import CompletionItem
+import pytest
+
+@pytest.fixture
+def bitmap_storage(monkeypatch):
+    monkeypatch.setattr(bitmaps, "COMPLETION_STORAGE", "bitmap")
+
+def backdate_habit(session: Session, habit_id: int, start_date: date):
+    habit = session.get(Habit, habit_id)
+    habit.start_date = start_date
+    session.commit()
+
+def complete_on(session: Session, monkeypatch, habit_id: int, user_id: int, day: date):
+    monkeypatch.setattr(crud_completions, "get_today", lambda: day)
+    return crud_completions.mark_habit_completed_today(habit_id, user_id, session)
+
+def test_pack_and_decode_round_trip():
+    days = [date(2024, 1, 1), date(2024, 1, 31), date(2024, 2, 29), date(2024, 12, 31), date(2025, 3, 15)]
+
+    rows = bitmaps.pack_completions((7, day) for day in reversed(days))
+
+    assert [(row["habit_id"], row["year"]) for row in rows] == [(7, 2024), (7, 2025)]
+    assert rows[0]["m01"] == 1 | (1 << 30)
+    assert rows[0]["m02"] == 1 << 28
+    assert list(bitmaps.decode_years(SimpleNamespace(**row) for row in rows)) == [(7, day) for day in days]
+
+def test_mark_completed_today_sets_bit(session: Session, db_habit_factory, monkeypatch, bitmap_storage):
+    habit, user = db_habit_factory()
+
+    for _ in range(2):  # marking twice is harmless
+        status = complete_on(session, monkeypatch, habit.id, user['id'], date(2025, 3, 4))
+
+    assert status.completed_today is True
+    year = session.exec(select(HabitCompletionYear)).one()
+    assert (year.habit_id, year.year, year.m03) == (habit.id, 2025, 1 << 3)
+    assert session.exec(select(func.count()).select_from(HabitCompletion)).one() == 0
+
+    session.expire_all()
+    assert session.get(Habit, habit.id).last_completed_date == date(2025, 3, 4)
+
+def test_completion_status_and_dates(session: Session, db_habit_factory, monkeypatch, bitmap_storage):
+    habit, user = db_habit_factory()
+    days = [date(2024, 12, 30), date(2025, 1, 2), date(2025, 1, 3)]
+    for day in days:
+        complete_on(session, monkeypatch, habit.id, user['id'], day)
+
+    assert crud_completions.get_habit_today_completion_status(habit.id, user['id'], session).completed_today is True
+    monkeypatch.setattr(crud_completions, "get_today", lambda: date(2025, 1, 4))
+    assert crud_completions.get_habit_today_completion_status(habit.id, user['id'], session).completed_today is False
+
+    history = crud_completions.get_habit_completion_dates(habit.id, user['id'], session)
+    assert history.completed_dates == days
+    in_range = crud_completions.get_habit_completion_dates(habit.id, user['id'], session, date(2024, 12, 31), date(2025, 1, 2))
+    assert in_range.completed_dates == [date(2025, 1, 2)]
+
+def test_mark_habits_completed(session: Session, db_habit_factory, monkeypatch, bitmap_storage):
+    habit, user = db_habit_factory()
+    backdate_habit(session, habit.id, date(2025, 1, 1))
+    monkeypatch.setattr(crud_completions, "get_today", lambda: date(2025, 1, 10))
+    crud_completions.mark_habit_completed_today(habit.id, user['id'], session)
+
+    result = crud_completions.mark_habits_completed([
+        CompletionItem(habit_id=habit.id, date=date(2025, 1, 9)),
+        CompletionItem(habit_id=habit.id, date=date(2025, 1, 10)),
+        CompletionItem(habit_id=habit.id, date=date(2025, 1, 11)),
+        CompletionItem(habit_id=habit.id + 100, date=date(2025, 1, 9)),
+    ], user['id'], session)
+
+    assert result.created == 1
+    assert [item.status for item in result.results] == ["created", "already_completed", "invalid_date", "not_found"]
+    assert bitmaps.completion_dates(session, habit.id) == [date(2025, 1, 9), date(2025, 1, 10)]
+    session.expire_all()
+    assert session.get(Habit, habit.id).current_streak == 2
+
+@pytest.mark.parametrize("storage", ["rows", "bitmap"])
+def test_readers_agree_across_storages(session: Session, db_habit_factory, monkeypatch, storage):
+    monkeypatch.setattr(bitmaps, "COMPLETION_STORAGE", storage)
+    habit, user = db_habit_factory()
+    backdate_habit(session, habit.id, date(2025, 1, 27))
+    days = [date(2025, 1, 27), date(2025, 1, 28), date(2025, 2, 3), date(2025, 2, 4)]
+    for day in days:
+        complete_on(session, monkeypatch, habit.id, user['id'], day)
+    monkeypatch.setattr(crud_habits, "get_today", lambda: date(2025, 2, 4))
+    monkeypatch.setattr(stats, "get_today", lambda: date(2025, 2, 4))
+
+    counts = crud_completions.get_habit_completion_counts(habit.id, user['id'], session, "week")
+    assert [(c.period_start, c.count) for c in counts.counts] == [(date(2025, 1, 27), 2), (date(2025, 2, 3), 2)]
+    assert [h.completed_today for h in crud_habits.get_habits_today(session, user['id'])] == [True]
+    assert stats.get_habit_stats(habit.id, user['id'], session).weekday_counts == [2, 2, 0, 0, 0, 0, 0]
+    assert stats.get_user_habit_stats(user['id'], session)[0].total_completions == 4
+
+    assert streaks.rebuild_streaks(session, [habit.id]) == 1
+    session.expire_all()
+    assert session.get(Habit, habit.id).longest_streak == 2
+
+    chunks = asyncio.run(_collect(export.export_completions(session, user['id'], habit.id, "csv")))
+    assert "".join(chunks).splitlines()[1:] == [f"{habit.id},{habit.name},{day.isoformat()},True" for day in days]
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+def test_convert_between_storages(session: Session, db_habit_factory):
+    habit, _ = db_habit_factory()
+    days = [date(2023, 12, 31) + timedelta(days=i) for i in range(0, 40, 3)]
+    session.add_all(HabitCompletion(habit_id=habit.id, date=day, status=True) for day in days)
+    session.commit()
+
+    # Small batches split the year rows; the OR upsert merges them
+    assert bitmaps.convert_to_bitmaps(session, batch_size=4) == len(days)
+    assert bitmaps.convert_to_bitmaps(session, batch_size=4) == len(days)
+    assert bitmaps.completion_dates(session, habit.id) == days
+
+    session.exec(HabitCompletion.__table__.delete())
+    session.commit()
+    assert bitmaps.convert_to_rows(session, batch_size=5) == len(days)
+    assert session.exec(select(HabitCompletion.date).order_by(HabitCompletion.date)).all() == days
+
+def test_deleting_habit_deletes_bitmaps(session: Session, db_habit_factory, monkeypatch, bitmap_storage):
+    habit, user = db_habit_factory()
+    complete_on(session, monkeypatch, habit.id, user['id'], date(2025, 3, 4))
+
+    crud_habits.delete_habit(habit.id, user['id'], session)
+
+    assert session.exec(select(HabitCompletionYear)).all() == []
+
+def test_mark_completed_statement_postgresql_bitmap(bitmap_storage):
+    statement = crud_completions.mark_completed_statement(1, 2, date(2025, 5, 1))
+
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert "INSERT INTO habitcompletionyear" in sql
+    assert "ON CONFLICT (habit_id, year) DO UPDATE SET m05 = (habitcompletionyear.m05 | excluded.m05)" in sql
+    assert "INSERT INTO habitcompletion " not in sql
@@ -1,7 +1,16 @@
 from tests.conftest_crud import db_habit_factory, db_user_factory
 from app.crud import completions as crud
-from sqlmodel import Session
-from datetime import date
+from app.crud import habits as crud_habits
+from app.crud import users as crud_users
+from app.crud import bitmaps
+from app.models import Habit, HabitCompletion, User
+from app.schemas import HabitCreate, UserCreate, CompletionItem
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlalchemy import create_mock_engine
+from sqlalchemy.dialects import postgresql
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from datetime import date, timedelta
 from fastapi import HTTPException
 import pytest
 
@@ -127,3 +136,195 @@ def test_get_habit_completion_dates_not_found(session: Session, db_user_factory)
     
     assert excinfo.value.status_code == 404
     assert "not found" in excinfo.value.detail
+
+def add_completions(session: Session, habit_id: int, days: list):
+    session.add_all(HabitCompletion(habit_id=habit_id, date=day, status=True) for day in days)
+    session.commit()
+
+def test_get_habit_completion_dates_in_range(session: Session, db_habit_factory, captured_sql):
+    habit, user = db_habit_factory()
+    add_completions(session, habit.id, [date(2025, 4, 30), date(2025, 5, 1), date(2025, 5, 15), date(2025, 6, 1)])
+    captured_sql.clear()
+
+    response = crud.get_habit_completion_dates(habit.id, user['id'], session, date_from=date(2025, 5, 1), date_to=date(2025, 5, 31))
+
+    assert response.completed_dates == [date(2025, 5, 1), date(2025, 5, 15)]
+    # The range is applied by the database, not after loading the history
+    assert "habitcompletion.date >= ?" in captured_sql[-1][0]
+
+def test_get_habit_completion_dates_open_ended_range(session: Session, db_habit_factory):
+    habit, user = db_habit_factory()
+    backdate_habit(session, habit.id, date(2025, 4, 1))
+    add_completions(session, habit.id, [date(2025, 4, 30), date(2025, 5, 1), date(2025, 6, 1)])
+
+    since = crud.get_habit_completion_dates(habit.id, user['id'], session, date_from=date(2025, 5, 1))
+    until = crud.get_habit_completion_dates(habit.id, user['id'], session, date_to=date(2025, 5, 1))
+
+    assert since.completed_dates == [date(2025, 5, 1), date(2025, 6, 1)]
+    assert until.completed_dates == [date(2025, 4, 30), date(2025, 5, 1)]
+
+def test_get_habit_completion_dates_inverted_range(session: Session, db_habit_factory):
+    habit, user = db_habit_factory()
+
+    with pytest.raises(HTTPException) as excinfo:
+        crud.get_habit_completion_dates(habit.id, user['id'], session, date_from=date(2025, 6, 1), date_to=date(2025, 5, 1))
+
+    assert excinfo.value.status_code == 400
+
+def test_get_habit_completion_counts_by_week(session: Session, db_habit_factory):
+    habit, user = db_habit_factory()
+    backdate_habit(session, habit.id, date(2025, 4, 28))
+    # 2025-05-04 is a Sunday and 2025-05-05 a Monday
+    add_completions(session, habit.id, [date(2025, 4, 28), date(2025, 5, 3), date(2025, 5, 4), date(2025, 5, 5), date(2025, 5, 11)])
+
+    response = crud.get_habit_completion_counts(habit.id, user['id'], session, period="week")
+
+    assert response.period == "week"
+    assert [(c.period_start, c.count) for c in response.counts] == [(date(2025, 4, 28), 3), (date(2025, 5, 5), 2)]
+
+def test_get_habit_completion_counts_by_month_in_range(session: Session, db_habit_factory):
+    habit, user = db_habit_factory()
+    add_completions(session, habit.id, [date(2025, 3, 31), date(2025, 4, 1), date(2025, 4, 30), date(2025, 5, 1), date(2025, 6, 2)])
+
+    response = crud.get_habit_completion_counts(habit.id, user['id'], session, period="month", date_from=date(2025, 4, 1), date_to=date(2025, 5, 31))
+
+    assert [(c.period_start, c.count) for c in response.counts] == [(date(2025, 4, 1), 2), (date(2025, 5, 1), 1)]
+
+def test_get_habit_completion_counts_by_another_user(session: Session, db_habit_factory, db_user_factory):
+    habit, user = db_habit_factory()
+    another_user = db_user_factory()
+
+    with pytest.raises(HTTPException) as excinfo:
+        crud.get_habit_completion_counts(habit.id, another_user.id, session)
+
+    assert excinfo.value.status_code == 404
+
+def test_period_start_postgresql():
+    postgres_session = Session(bind=create_mock_engine("postgresql://", executor=None))
+    statement = select(crud.period_start(postgres_session, "month"))
+
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    # The unit is inlined so GROUP BY repeats the exact SELECT expression
+    assert "date_trunc('month', habitcompletion.date)" in sql
+
+def backdate_habit(session: Session, habit_id: int, start_date: date):
+    habit = session.get(Habit, habit_id)
+    habit.start_date = start_date
+    session.commit()
+
+def test_mark_habits_completed(session: Session, db_habit_factory, db_user_factory, captured_sql):
+    habit, user = db_habit_factory()
+    other_habit, _ = db_habit_factory()
+    backdate_habit(session, habit.id, date(2025, 1, 1))
+    add_completions(session, habit.id, [date(2025, 1, 2)])
+    captured_sql.clear()
+
+    items = [
+        CompletionItem(habit_id=habit.id, date=date(2025, 1, 1)),
+        CompletionItem(habit_id=habit.id, date=date(2025, 1, 2)),        # already recorded
+        CompletionItem(habit_id=habit.id, date=date(2024, 12, 31)),      # before the start date
+        CompletionItem(habit_id=habit.id, date=date.today() + timedelta(days=1)),
+        CompletionItem(habit_id=other_habit.id, date=date(2025, 1, 1)),  # someone else's habit
+        CompletionItem(habit_id=9999, date=date(2025, 1, 1)),
+        CompletionItem(habit_id=habit.id, date=date(2025, 1, 3)),
+    ]
+    response = crud.mark_habits_completed(items, user['id'], session)
+
+    assert response.created == 2
+    assert [r.status for r in response.results] == [
+        "created", "already_completed", "invalid_date", "invalid_date", "not_found", "not_found", "created"
+    ]
+    # One ownership query and one multi-row insert, whatever the number of items
+    assert sum("INSERT INTO habitcompletion" in statement for statement, _ in captured_sql) == 1
+    assert captured_sql[0][0].lstrip().startswith("SELECT habit.id, habit.start_date")
+
+    dates = crud.get_habit_completion_dates(habit.id, user['id'], session).completed_dates
+    assert dates == [date(2025, 1, 1), date(2025, 1, 2), date(2025, 1, 3)]
+    assert session.exec(select(HabitCompletion).where(HabitCompletion.habit_id == other_habit.id)).all() == []
+
+def test_mark_habits_completed_rebuilds_streaks(session: Session, db_habit_factory):
+    habit, user = db_habit_factory()
+    backdate_habit(session, habit.id, date(2025, 1, 1))
+
+    # Sent out of order, as an offline client might
+    items = [CompletionItem(habit_id=habit.id, date=day) for day in (date(2025, 1, 3), date(2025, 1, 1), date(2025, 1, 2))]
+    crud.mark_habits_completed(items, user['id'], session)
+
+    db_habit = session.get(Habit, habit.id, populate_existing=True)
+    assert (db_habit.longest_streak, db_habit.last_completed_date) == (3, date(2025, 1, 3))
+
+def test_mark_habits_completed_duplicate_items(session: Session, db_habit_factory):
+    habit, user = db_habit_factory()
+    today = date.today()
+
+    response = crud.mark_habits_completed([CompletionItem(habit_id=habit.id, date=today)] * 2, user['id'], session)
+
+    assert response.created == 1
+    assert [r.status for r in response.results] == ["created", "created"]
+
+def test_mark_habit_completed_today_statement_count(session: Session, db_habit_factory, captured_sql):
+    habit, user = db_habit_factory()
+    captured_sql.clear()
+
+    crud.mark_habit_completed_today(habit.id, user['id'], session)
+
+    # Ownership check, upsert, streak update and data version; no existence SELECT and no refresh
+    assert len(captured_sql) == 4
+    assert "ON CONFLICT" in captured_sql[1][0]
+    assert captured_sql[2][0].startswith("UPDATE habit")
+    assert captured_sql[3][0].startswith("UPDATE user SET data_version")
+
+@pytest.mark.parametrize("storage", ["rows", "bitmap"])
+def test_repeated_completion_keeps_data_version(session: Session, db_habit_factory, captured_sql, monkeypatch, storage):
+    monkeypatch.setattr(bitmaps, "COMPLETION_STORAGE", storage)
+    habit, user = db_habit_factory()
+    crud.mark_habit_completed_today(habit.id, user['id'], session)
+    version = session.get(User, user['id']).data_version
+    captured_sql.clear()
+
+    assert crud.mark_habit_completed_today(habit.id, user['id'], session).completed_today is True
+
+    # Ownership check and the upsert, which writes nothing; no streak update or version bump
+    assert len(captured_sql) == 2
+    session.expire_all()
+    assert session.get(User, user['id']).data_version == version
+
+def test_mark_completed_statement_postgresql():
+    statement = crud.mark_completed_statement(1, 2, date(2025, 5, 1))
+
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert sql.count("INSERT INTO habitcompletion") == 1
+    assert "ON CONFLICT (habit_id, date) DO NOTHING" in sql
+    assert "habit.user_id" in sql
+    assert sql.count("UPDATE habit SET current_streak") == 1
+    assert sql.count('UPDATE "user" SET data_version') == 1
+    # The version is only bumped when a completion was inserted
+    assert 'WHERE "user".id = %(id_3)s AND (EXISTS (SELECT inserted.id' in sql
+
+def test_mark_habit_completed_today_concurrently(tmp_path):
+    # A file database so every thread gets its own connection
+    file_engine = create_engine(f"sqlite:///{tmp_path / 'stress.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    SQLModel.metadata.create_all(file_engine)
+
+    with Session(file_engine) as db:
+        user = crud_users.create_user(UserCreate(username="stress_user", password="password123", email="user@example.com"), db, hashed_password="not-a-real-hash")
+        habit = crud_habits.create_habit(HabitCreate(name="stress", frequency="daily"), user.id, db)
+
+    workers = 16
+    barrier = threading.Barrier(workers)
+
+    def click():
+        with Session(file_engine) as db:
+            barrier.wait()
+            return crud.mark_habit_completed_today(habit.id, user.id, db)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda _: click(), range(workers)))
+
+    assert all(result.completed_today for result in results)
+    with Session(file_engine) as db:
+        rows = db.exec(select(HabitCompletion).where(HabitCompletion.habit_id == habit.id)).all()
+    assert len(rows) == 1
+    file_engine.dispose()
@@ -0,0 +1,80 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import date, timedelta
+from types import SimpleNamespace
+from sqlmodel import Session
+from tests.conftest_crud import db_habit_factory, db_user_factory
+from app.crud import export
+from app.models import HabitCompletion
+
+def add_completions(session: Session, habit_id: int, days: int):
+    session.add_all(HabitCompletion(habit_id=habit_id, date=date(2024, 1, 1) + timedelta(days=i), status=True) for i in range(days))
+    session.commit()
+
+def collect(stream) -> list:
+    async def consume():
+        return [chunk async for chunk in stream]
+    return asyncio.run(consume())
+
+def test_export_ndjson_streams_in_batches(session: Session, db_habit_factory):
+    habit, user = db_habit_factory()
+    add_completions(session, habit.id, 5)
+
+    chunks = collect(export.export_completions(session, user['id'], habit.id, "ndjson", batch_size=2))
+
+    # Each batch of rows becomes its own chunk: 2 + 2 + 1
+    assert [chunk.count("\n") for chunk in chunks] == [2, 2, 1]
+    rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert [row["date"] for row in rows] == [(date(2024, 1, 1) + timedelta(days=i)).isoformat() for i in range(5)]
+    assert rows[0] == {"habit_id": habit.id, "habit_name": habit.name, "date": "2024-01-01", "status": True}
+
+def test_export_csv_all_habits(session: Session, db_habit_factory, db_user_factory):
+    habit, user = db_habit_factory()
+    add_completions(session, habit.id, 3)
+    other_habit, other_user = db_habit_factory()
+    add_completions(session, other_habit.id, 2)
+
+    chunks = collect(export.export_completions(session, user['id'], fmt="csv"))
+
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert len(rows) == 3
+    assert {row["habit_id"] for row in rows} == {str(habit.id)}
+
+def test_export_of_foreign_habit_is_empty(session: Session, db_habit_factory):
+    habit, user = db_habit_factory()
+    other_habit, other_user = db_habit_factory()
+    add_completions(session, other_habit.id, 3)
+
+    chunks = collect(export.export_completions(session, user['id'], other_habit.id))
+
+    assert "".join(chunks) == ""
+
+def test_merge_archived_reads_the_archive_as_needed():
+    row = lambda habit_id, day: export.ExportRow(habit_id, "h", date(2024, 1, day), True)
+    month = lambda habit_id, days: SimpleNamespace(habit_id=habit_id, habit_name="h", month=date(2024, 1, 1),
+                                                   days=sum(1 << (day - 1) for day in days))
+    read = []
+
+    async def live():
+        yield [row(1, 2), row(1, 5)]
+        yield [row(2, 3)]
+
+    async def archived():
+        for batch in ([month(1, [1, 5])], [month(2, [1, 9])], [month(3, [4])]):
+            read.append(batch)
+            yield batch
+
+    async def consume():
+        batches = []
+        async for batch in export.merge_archived(live(), archived()):
+            batches.append(([(r.habit_id, r.date.day) for r in batch], len(read)))
+        return batches
+
+    assert asyncio.run(consume()) == [
+        ([(1, 1), (1, 2), (1, 5)], 1),  # the archived day 5 is also live and exported once
+        ([(2, 1), (2, 3)], 2),
+        ([(2, 9)], 2),
+        ([(3, 4)], 3),
+    ]
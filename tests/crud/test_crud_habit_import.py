@@ -0,0 +1,137 @@
+from tests.conftest_crud import db_user_factory
+from app.crud import habit_import
+from app.crud import habits as crud_habits
+from app.models import Category, Frequency, Habit
+from sqlmodel import Session, select
+from fastapi import HTTPException
+from datetime import date, time
+import io
+from types import SimpleNamespace
+import json
+import pytest
+
+CSV_FILE = """name,description,category,frequency,reminder_time,start_date
+  read books ,Read 30 minutes,personal development,daily,07:30,2024-01-15
+drink water,,,weekly,,
+,missing name,,daily,,
+stretch,,gardening,daily,,
+meditate,,,hourly,,
+run,,fitness,daily,,2999-01-01
+"""
+
+def test_import_habits_csv(session: Session, db_user_factory):
+    user = db_user_factory()
+
+    result = habit_import.import_habits(io.StringIO(CSV_FILE), "csv", user.id, session)
+
+    assert (result.imported, result.failed) == (2, 4)
+    assert [error.row for error in result.errors] == [3, 4, 5, 6]
+    assert "name" in result.errors[0].error
+    assert "category" in result.errors[1].error.lower()
+    assert "frequency" in result.errors[2].error.lower()
+    assert "future" in result.errors[3].error
+
+    habits = crud_habits.get_habits(session, user_id=user.id)
+    assert [(h.name, h.category, h.frequency) for h in habits] == [
+        ("Read Books", Category.PERSONAL_DEVELOPMENT, Frequency.DAILY),
+        ("Drink Water", Category.GENERAL, Frequency.WEEKLY),
+    ]
+    assert habits[0].start_date == date(2024, 1, 15)
+    assert habits[0].reminder_time == time(7, 30)
+    assert habits[1].start_date == date.today()
+
+def test_import_habits_json_array(session: Session, db_user_factory):
+    user = db_user_factory()
+    data = json.dumps([{"name": "read", "frequency": "daily"}, "not an object", {"name": "run"}])
+
+    result = habit_import.import_habits(io.StringIO(data), "json", user.id, session)
+
+    assert (result.imported, result.failed) == (1, 2)
+    assert [error.row for error in result.errors] == [2, 3]
+
+def test_read_json_array_in_chunks(monkeypatch):
+    monkeypatch.setattr(habit_import, "JSON_CHUNK_SIZE", 3)
+    data = ' [ {"name": "a], b", "tags": [1, {"x": null}]}, 12345, true,\n"s" , [] ] \n'
+
+    assert list(habit_import.read_rows(io.StringIO(data), "json")) == json.loads(data)
+    assert list(habit_import.read_rows(io.StringIO("[ ]"), "json")) == []
+
+@pytest.mark.parametrize("data", ['[{"a": 1},]', '[{"a": 1} {"b": 2}]', '[1, 2] 3', '[1, 2'])
+def test_read_json_array_rejects_malformed_arrays(monkeypatch, data):
+    monkeypatch.setattr(habit_import, "JSON_CHUNK_SIZE", 2)
+
+    with pytest.raises(json.JSONDecodeError):
+        list(habit_import.read_rows(io.StringIO(data), "json"))
+
+def test_import_habits_ndjson(session: Session, db_user_factory):
+    user = db_user_factory()
+    data = '{"name": "read", "frequency": "daily"}\n\n{broken\n{"name": "run", "frequency": "monthly"}\n'
+
+    result = habit_import.import_habits(io.StringIO(data), "json", user.id, session)
+
+    assert (result.imported, result.failed) == (2, 1)
+    assert result.errors[0].row == 2
+    assert "invalid JSON" in result.errors[0].error
+
+def test_import_habits_in_batches(session: Session, db_user_factory, captured_sql):
+    user = db_user_factory()
+    rows = "name,frequency\n" + "".join(f"habit {i},daily\n" for i in range(25))
+    captured_sql.clear()
+
+    result = habit_import.import_habits(io.StringIO(rows), "csv", user.id, session, batch_size=10)
+
+    assert result.imported == 25
+    inserts = [statement for statement, _ in captured_sql if statement.startswith("INSERT INTO habit")]
+    assert len(inserts) == 3  # 10 + 10 + 5, one executemany each
+    assert session.exec(select(Habit).where(Habit.user_id == user.id)).all()[-1].name == "Habit 24"
+
+def test_import_habits_caps_error_list(session: Session, db_user_factory, monkeypatch):
+    user = db_user_factory()
+    monkeypatch.setattr(habit_import, "MAX_IMPORT_ERRORS", 2)
+    rows = "name,frequency\n" + "x,hourly\n" * 5
+
+    result = habit_import.import_habits(io.StringIO(rows), "csv", user.id, session)
+
+    assert (result.imported, result.failed, len(result.errors)) == (0, 5, 2)
+
+def test_import_habits_unreadable_json(session: Session, db_user_factory):
+    user = db_user_factory()
+
+    with pytest.raises(HTTPException) as excinfo:
+        habit_import.import_habits(io.StringIO('[{"name": "read"'), "json", user.id, session)
+
+    assert excinfo.value.status_code == 400
+
+@pytest.mark.parametrize("filename, fmt", [("habits.csv", "csv"), ("Export.JSON", "json"), ("habits.ndjson", "json")])
+def test_format_from_filename(filename, fmt):
+    assert habit_import.format_from_filename(filename) == fmt
+
+def test_format_from_unknown_filename():
+    with pytest.raises(HTTPException) as excinfo:
+        habit_import.format_from_filename("habits.xlsx")
+
+    assert excinfo.value.status_code == 400
+
+def test_copy_habits_writes_postgres_csv():
+    class FakeCursor:
+        def copy_expert(self, sql, buffer):
+            self.sql, self.data = sql, buffer.read()
+        def close(self):
+            pass
+
+    cursor = FakeCursor()
+    # Just enough of a Session for db.connection().connection.cursor()
+    session = SimpleNamespace(connection=lambda: SimpleNamespace(connection=SimpleNamespace(cursor=lambda: cursor)))
+
+    rows = [habit_import.validate_row({"name": "read", "frequency": "daily", "reminder_time": "07:30"}, 1, date(2025, 1, 1)),
+            habit_import.validate_row({"name": "run, fast", "category": "fitness", "frequency": "weekly"}, 1, date(2025, 1, 1))]
+    rows[0]["category"] = None
+
+    habit_import.copy_habits(session, rows)
+
+    assert cursor.sql == "COPY habit (user_id, name, description, category, frequency, start_date, reminder_time) FROM STDIN WITH (FORMAT csv)"
+    # Enums by name, None as an unquoted empty field (NULL)
+    assert cursor.data.splitlines() == [
+        "1,Read,,,DAILY,2025-01-01,07:30:00",
+        '1,"Run, Fast",,FITNESS,WEEKLY,2025-01-01,',
+    ]
@@ -1,7 +1,11 @@
 from tests.conftest_crud import db_habit_factory, db_user_factory
 from app.crud import habits as crud
 from sqlmodel import Session
-from app.schemas import HabitUpdate
+from app.schemas import HabitUpdate, HabitCreate
+from app.crud.completions import mark_habit_completed_today
+from app.crud.versions import get_data_version
+from app.models import Frequency, HabitCompletion
+from datetime import date, timedelta
 import pytest
 from fastapi import HTTPException
 
@@ -52,6 +56,71 @@ def test_get_habits(session: Session, db_habit_factory):
     assert habits[0].frequency == habit.frequency
     assert habits[0].category == habit.category
 
+def create_habits(session: Session, user_id: int, names: list):
+    return [crud.create_habit(HabitCreate(name=name, frequency="daily"), user_id, session) for name in names]
+
+def test_get_habits_today(session: Session, db_user_factory, db_habit_factory, captured_sql):
+    user = db_user_factory()
+    habits = create_habits(session, user.id, ["read", "run", "swim"])
+    crud.update_habit(habits[2].id, HabitUpdate(frequency="weekly"), user.id, session)
+    other_habit, _ = db_habit_factory()
+    mark_habit_completed_today(habits[1].id, user.id, session)
+    # A completion on another day must not count for today
+    session.add(HabitCompletion(habit_id=habits[0].id, date=date.today() - timedelta(days=1), status=True))
+    session.commit()
+    captured_sql.clear()
+
+    today = crud.get_habits_today(session, user.id)
+
+    assert len(captured_sql) == 1
+    assert [(h.id, h.completed_today) for h in today] == [(habits[0].id, False), (habits[1].id, True), (habits[2].id, False)]
+    assert today[1].current_streak == 1
+
+    weekly = crud.get_habits_today(session, user.id, frequency=Frequency.WEEKLY)
+    assert [h.id for h in weekly] == [habits[2].id]
+
+def test_get_habits_page_walks_all_pages(session: Session, db_user_factory):
+    user = db_user_factory()
+    created = create_habits(session, user.id, ["walk", "read", "swim", "cook", "yoga"])
+
+    seen, cursor = [], None
+    while True:
+        page = crud.get_habits_page(session, user.id, limit=2, cursor=cursor, sort="name")
+        seen.extend(habit.name for habit in page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+    assert seen == sorted(habit.name for habit in created)
+
+def test_get_habits_page_descending(session: Session, db_user_factory):
+    user = db_user_factory()
+    created = create_habits(session, user.id, ["walk", "read", "swim"])
+
+    first = crud.get_habits_page(session, user.id, limit=2, order="desc")
+    second = crud.get_habits_page(session, user.id, limit=2, cursor=first.next_cursor, order="desc")
+
+    assert [h.id for h in first.items + second.items] == sorted((h.id for h in created), reverse=True)
+    assert second.next_cursor is None
+
+def test_get_habits_page_cursor_for_other_sort(session: Session, db_user_factory):
+    user = db_user_factory()
+    create_habits(session, user.id, ["walk", "read", "swim"])
+    page = crud.get_habits_page(session, user.id, limit=1, sort="name")
+
+    with pytest.raises(HTTPException) as excinfo:
+        crud.get_habits_page(session, user.id, limit=1, cursor=page.next_cursor, sort="start_date")
+
+    assert excinfo.value.status_code == 400
+
+def test_get_habits_page_invalid_cursor(session: Session, db_user_factory):
+    user = db_user_factory()
+
+    with pytest.raises(HTTPException) as excinfo:
+        crud.get_habits_page(session, user.id, limit=1, cursor="not-a-cursor")
+
+    assert excinfo.value.status_code == 400
+
 def test_get_habits_by_category(session: Session, db_habit_factory):
     habit, user = db_habit_factory()
 
@@ -177,3 +246,34 @@ def test_delete_habit_for_other_user(session: Session, db_habit_factory, db_user
 
     assert excinfo.value.status_code == 404
     assert "not found" in excinfo.value.detail
+
+def test_habit_reads_are_cached_until_a_write(session: Session, db_user_factory, captured_sql):
+    user = db_user_factory()
+    habit = create_habits(session, user.id, ["read"])[0]
+
+    crud.get_habit_by_id(habit.id, user.id, session)
+    captured_sql.clear()
+    assert crud.get_habit_by_id(habit.id, user.id, session).name == "Read"
+    assert crud.get_habits(session, user.id)[0].name == "Read"
+    cached_statements = len(captured_sql)
+
+    crud.update_habit(habit.id, HabitUpdate(name="Run"), user.id, session)
+    assert crud.get_habit_by_id(habit.id, user.id, session).name == "Run"
+
+    mark_habit_completed_today(habit.id, user.id, session)
+    assert crud.get_habit_by_name("run", user.id, session).current_streak == 1
+
+    crud.delete_habit(habit.id, user.id, session)
+    assert crud.get_habits(session, user.id) == []
+    assert cached_statements == 1  # only the first listing missed
+
+def test_writes_bump_data_version(session: Session, db_user_factory):
+    user = db_user_factory()
+
+    habit = create_habits(session, user.id, ["read"])[0]
+    assert get_data_version(user.id, session) == 1
+    crud.update_habit(habit.id, HabitUpdate(description="daily"), user.id, session)
+    mark_habit_completed_today(habit.id, user.id, session)
+    crud.delete_habit(habit.id, user.id, session)
+
+    assert get_data_version(user.id, session) == 4
@@ -0,0 +1,51 @@
+from datetime import date
+from sqlmodel import Session
+from tests.conftest_crud import db_habit_factory, db_user_factory
+from app.crud import partitions
+from app.crud import completions as crud_completions
+from app.models import Habit, HabitCompletion
+
+def test_month_arithmetic():
+    assert partitions.month_start(date(2025, 2, 17)) == date(2025, 2, 1)
+    assert partitions.add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+    assert partitions.add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+    assert partitions.add_months(date(2025, 1, 1), -13) == date(2023, 12, 1)
+
+def test_partition_names_round_trip():
+    name = partitions.partition_name(date(2025, 3, 31))
+
+    assert name == "habitcompletion_p2025_03"
+    assert partitions.PARTITION_NAME.match(name).groups() == ("2025", "03")
+    assert partitions.PARTITION_NAME.match(partitions.DEFAULT_PARTITION) is None
+
+def test_create_partition_statements_bound_the_month():
+    create, move, attach = partitions.create_partition_statements(date(2024, 12, 9))
+
+    assert create.startswith("CREATE TABLE habitcompletion_p2024_12 (LIKE habitcompletion")
+    assert "date >= '2024-12-01' AND date < '2025-01-01'" in move
+    assert move.index("DELETE FROM habitcompletion_default") < move.index("INSERT INTO habitcompletion_p2024_12")
+    assert attach.endswith("FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')")
+
+def test_sqlite_keeps_a_plain_table(session: Session):
+    assert not partitions.is_partitioned(session)
+    assert partitions.maintain_partitions(session, date(2025, 1, 1), retention_months=12) == {"created": [], "detached": []}
+
+def test_completion_reads_are_bounded_by_start_date_and_today(session: Session, db_habit_factory, captured_sql, monkeypatch):
+    habit, user = db_habit_factory()
+    db_habit = session.get(Habit, habit.id)
+    db_habit.start_date = date(2025, 1, 5)
+    session.add_all(HabitCompletion(habit_id=habit.id, date=day, status=True) for day in [date(2025, 1, 5), date(2025, 2, 1)])
+    session.commit()
+    monkeypatch.setattr(crud_completions, "get_today", lambda: date(2025, 2, 1))
+    captured_sql.clear()
+
+    dates = crud_completions.get_habit_completion_dates(habit.id, user['id'], session)
+    counts = crud_completions.get_habit_completion_counts(habit.id, user['id'], session, period="month")
+
+    assert dates.completed_dates == [date(2025, 1, 5), date(2025, 2, 1)]
+    assert [c.count for c in counts.counts] == [1, 1]
+    reads = [(statement, parameters) for statement, parameters in captured_sql if "FROM habitcompletion " in statement]
+    assert len(reads) == 2
+    for statement, parameters in reads:
+        assert "habitcompletion.date >= ?" in statement and "habitcompletion.date <= ?" in statement
+        assert "2025-01-05" in parameters and "2025-02-01" in parameters
@@ -0,0 +1,96 @@
+from tests.conftest_crud import db_habit_factory, db_user_factory
+from app.crud import stats
+from app.crud import habits as crud_habits
+from app.schemas import HabitCreate
+from app.models import Frequency, Habit, HabitCompletion
+from sqlmodel import Session
+from sqlalchemy import update
+from fastapi import HTTPException
+from datetime import date, timedelta
+import numpy as np
+import pytest
+
+def epoch_days(days):
+    return np.array([stats.to_epoch_day(day) for day in days], dtype=np.int64)
+
+def add_completions(session: Session, habit_id: int, days):
+    session.add_all(HabitCompletion(habit_id=habit_id, date=day, status=True) for day in days)
+    session.commit()
+
+def test_compute_habit_stats_daily():
+    # Mon 2025-03-03 .. Sun 2025-03-30 is exactly four weeks
+    start, today = date(2025, 3, 3), date(2025, 3, 30)
+    days = [start + timedelta(days=i) for i in range(0, 28, 2)]  # every other day: 14 completions
+
+    result = stats.compute_habit_stats(epoch_days(days), Frequency.DAILY, start, today)
+
+    assert result["total_completions"] == 14
+    assert result["completion_rate"] == 0.5
+    assert result["weekday_counts"] == [2] * 7
+    assert result["adherence_7d"] == round(3 / 7, 4)  # 24th, 26th and 28th
+    assert result["adherence_30d"] == 0.5  # only 28 days of history
+    assert result["best_month"].model_dump() == {"month": "2025-03", "completions": 14}
+
+def test_compute_habit_stats_weekly_rate_and_months():
+    start, today = date(2025, 1, 6), date(2025, 3, 16)  # ten Monday-start weeks
+    days = [date(2025, 1, 6), date(2025, 1, 7), date(2025, 1, 20), date(2025, 3, 3)]
+
+    result = stats.compute_habit_stats(epoch_days(days), Frequency.WEEKLY, start, today)
+
+    assert result["completion_rate"] == 0.3  # three of ten weeks
+    assert result["best_month"].model_dump() == {"month": "2025-01", "completions": 3}
+    assert result["worst_month"].model_dump() == {"month": "2025-02", "completions": 0}
+
+def test_compute_habit_stats_without_completions():
+    result = stats.compute_habit_stats(np.array([], dtype=np.int64), Frequency.DAILY, date(2025, 1, 1), date(2025, 1, 10))
+
+    assert result["total_completions"] == 0
+    assert result["completion_rate"] == 0.0
+    assert result["weekday_counts"] == [0] * 7
+    assert result["best_month"].completions == 0
+
+def test_compute_habit_stats_ignores_future_and_extends_to_early_completions():
+    days = [date(2024, 12, 31), date(2025, 1, 2), date(2025, 2, 1)]
+
+    result = stats.compute_habit_stats(epoch_days(days), Frequency.DAILY, date(2025, 1, 1), date(2025, 1, 3))
+
+    assert result["total_completions"] == 2
+    assert result["completion_rate"] == 0.5  # 2024-12-31 .. 2025-01-03
+
+def test_get_habit_stats(session: Session, db_habit_factory, monkeypatch):
+    habit, user = db_habit_factory()
+    session.exec(update(Habit).where(Habit.id == habit.id).values(start_date=date(2025, 3, 3)))
+    add_completions(session, habit.id, [date(2025, 3, 3), date(2025, 3, 4), date(2025, 3, 9)])
+    monkeypatch.setattr(stats, "get_today", lambda: date(2025, 3, 9))
+
+    result = stats.get_habit_stats(habit.id, user['id'], session)
+
+    assert (result.id, result.name, result.frequency) == (habit.id, habit.name, Frequency.DAILY)
+    assert result.total_completions == 3
+    assert result.weekday_counts == [1, 1, 0, 0, 0, 0, 1]
+    assert result.adherence_7d == round(3 / 7, 4)
+
+def test_get_habit_stats_by_another_user(session: Session, db_habit_factory, db_user_factory):
+    habit, user = db_habit_factory()
+    another_user = db_user_factory()
+
+    with pytest.raises(HTTPException) as excinfo:
+        stats.get_habit_stats(habit.id, another_user.id, session)
+
+    assert excinfo.value.status_code == 404
+
+def test_get_user_habit_stats_splits_per_habit(session: Session, db_habit_factory, monkeypatch, captured_sql):
+    habit, user = db_habit_factory()
+    second = crud_habits.create_habit(HabitCreate(name="second", frequency="daily"), user['id'], session)
+    third = crud_habits.create_habit(HabitCreate(name="third", frequency="daily"), user['id'], session)
+    other_habit, _ = db_habit_factory()
+    add_completions(session, habit.id, [date.today()])
+    add_completions(session, third.id, [date.today(), date.today() - timedelta(days=1)])
+    add_completions(session, other_habit.id, [date.today()])
+    captured_sql.clear()
+
+    result = stats.get_user_habit_stats(user['id'], session)
+
+    assert [r.id for r in result] == [habit.id, second.id, third.id]
+    assert [r.total_completions for r in result] == [1, 0, 2]
+    assert len(captured_sql) == 2  # habits, then all of their completions
@@ -0,0 +1,127 @@
+from tests.conftest_crud import db_habit_factory, db_user_factory
+from app.crud import streaks
+from app.crud import completions as crud_completions
+from app.crud import habits as crud_habits
+from app.models import Frequency, Habit, HabitCompletion
+from app.schemas import HabitUpdate
+from sqlmodel import Session
+from sqlalchemy import update
+from datetime import date, timedelta
+import pytest
+
+def complete_on(session: Session, monkeypatch, habit_id: int, user_id: int, day: date):
+    monkeypatch.setattr(crud_completions, "get_today", lambda: day)
+    crud_completions.mark_habit_completed_today(habit_id, user_id, session)
+
+def stored_streaks(session: Session, habit_id: int):
+    habit = session.get(Habit, habit_id, populate_existing=True)
+    return habit.current_streak, habit.longest_streak, habit.last_completed_date
+
+@pytest.mark.parametrize("frequency, day, start, previous", [
+    (Frequency.DAILY, date(2025, 3, 1), date(2025, 3, 1), date(2025, 2, 28)),
+    (Frequency.WEEKLY, date(2025, 5, 4), date(2025, 4, 28), date(2025, 4, 21)),  # Sunday
+    (Frequency.MONTHLY, date(2025, 1, 15), date(2025, 1, 1), date(2024, 12, 1)),
+    (Frequency.YEARLY, date(2025, 7, 4), date(2025, 1, 1), date(2024, 1, 1)),
+])
+def test_period_boundaries(frequency, day, start, previous):
+    assert streaks.period_start(day, frequency) == start
+    assert streaks.previous_period_start(day, frequency) == previous
+
+def test_compute_streaks():
+    days = [date(2025, 1, 1), date(2025, 1, 2), date(2025, 1, 3), date(2025, 1, 5), date(2025, 1, 6)]
+
+    assert streaks.compute_streaks(days, Frequency.DAILY) == (2, 3, date(2025, 1, 6))
+    # All in the same week but the 6th, which is the Monday after
+    assert streaks.compute_streaks(days, Frequency.WEEKLY) == (2, 2, date(2025, 1, 6))
+    assert streaks.compute_streaks([], Frequency.DAILY) == (0, 0, None)
+
+def test_mark_completed_advances_daily_streak(session: Session, db_habit_factory, monkeypatch):
+    habit, user = db_habit_factory()
+    start = date(2025, 1, 1)
+
+    for offset in (0, 1, 2):
+        complete_on(session, monkeypatch, habit.id, user['id'], start + timedelta(days=offset))
+    assert stored_streaks(session, habit.id) == (3, 3, date(2025, 1, 3))
+
+    # Completing the same day again changes nothing
+    complete_on(session, monkeypatch, habit.id, user['id'], date(2025, 1, 3))
+    assert stored_streaks(session, habit.id) == (3, 3, date(2025, 1, 3))
+
+    # A missed day starts a new streak but keeps the longest one
+    complete_on(session, monkeypatch, habit.id, user['id'], date(2025, 1, 5))
+    assert stored_streaks(session, habit.id) == (1, 3, date(2025, 1, 5))
+
+def test_mark_completed_advances_weekly_streak(session: Session, db_habit_factory, monkeypatch):
+    habit, user = db_habit_factory()
+    crud_habits.update_habit(habit.id, HabitUpdate(frequency="weekly"), user['id'], session)
+
+    # Two completions in one week count once; the next week extends the streak
+    for day in (date(2025, 5, 5), date(2025, 5, 9), date(2025, 5, 12)):
+        complete_on(session, monkeypatch, habit.id, user['id'], day)
+
+    assert stored_streaks(session, habit.id) == (2, 2, date(2025, 5, 12))
+
+def test_streak_update_ignores_other_users(session: Session, db_habit_factory, db_user_factory):
+    habit, user = db_habit_factory()
+    another_user = db_user_factory()
+
+    session.exec(streaks.streak_update_statement(habit.id, another_user.id, date(2025, 1, 1)))
+    session.commit()
+
+    assert stored_streaks(session, habit.id) == (0, 0, None)
+
+def test_summary_reports_broken_streak_as_zero(session: Session, db_habit_factory, monkeypatch):
+    habit, user = db_habit_factory()
+    complete_on(session, monkeypatch, habit.id, user['id'], date(2025, 1, 1))
+    complete_on(session, monkeypatch, habit.id, user['id'], date(2025, 1, 2))
+
+    # Cached summaries are keyed by day, so both clocks move together
+    for module in ("app.crud.serializers", "app.crud.habits"):
+        monkeypatch.setattr(f"{module}.get_today", lambda: date(2025, 1, 3))
+    running = crud_habits.get_habit_by_id(habit.id, user['id'], session)
+    for module in ("app.crud.serializers", "app.crud.habits"):
+        monkeypatch.setattr(f"{module}.get_today", lambda: date(2025, 1, 4))
+    broken = crud_habits.get_habit_by_id(habit.id, user['id'], session)
+
+    assert (running.current_streak, running.longest_streak) == (2, 2)
+    assert (broken.current_streak, broken.longest_streak) == (0, 2)
+    assert broken.last_completed_date == date(2025, 1, 2)
+
+def test_rebuild_streaks_matches_incremental(session: Session, db_habit_factory, monkeypatch):
+    habit, user = db_habit_factory()
+    empty_habit, _ = db_habit_factory()
+    for day in (date(2025, 1, 1), date(2025, 1, 2), date(2025, 1, 4)):
+        complete_on(session, monkeypatch, habit.id, user['id'], day)
+    incremental = stored_streaks(session, habit.id)
+
+    # Wipe the stored values, as before the first rebuild
+    session.exec(update(Habit).values(current_streak=0, longest_streak=0, last_completed_date=None))
+    session.commit()
+
+    rebuilt = streaks.rebuild_streaks(session, batch_size=1)
+
+    assert rebuilt == 2
+    assert stored_streaks(session, habit.id) == incremental == (1, 2, date(2025, 1, 4))
+    assert stored_streaks(session, empty_habit.id) == (0, 0, None)
+
+def test_rebuild_streaks_of_selected_habits(session: Session, db_habit_factory):
+    habit, user = db_habit_factory()
+    other_habit, _ = db_habit_factory()
+    session.add_all([HabitCompletion(habit_id=h.id, date=date(2025, 1, 1), status=True) for h in (habit, other_habit)])
+    session.commit()
+
+    assert streaks.rebuild_streaks(session, [habit.id]) == 1
+
+    assert stored_streaks(session, habit.id) == (1, 1, date(2025, 1, 1))
+    assert stored_streaks(session, other_habit.id) == (0, 0, None)
+
+def test_changing_frequency_recounts_streaks(session: Session, db_habit_factory):
+    habit, user = db_habit_factory()
+    session.add_all([HabitCompletion(habit_id=habit.id, date=day, status=True) for day in (date(2025, 1, 6), date(2025, 1, 13))])
+    session.commit()
+    streaks.rebuild_streaks(session)
+    assert stored_streaks(session, habit.id)[:2] == (1, 1)
+
+    summary = crud_habits.update_habit(habit.id, HabitUpdate(frequency="weekly"), user['id'], session)
+
+    assert summary.longest_streak == 2
@@ -1,8 +1,12 @@
-from tests.conftest_crud import db_user_factory
+from tests.conftest_crud import db_user_factory, db_habit_factory
 from uuid import uuid4
 from app.crud import users as crud
-from app.schemas import UserCreate, UserUpdate
-from sqlmodel import Session
+from app.crud import habits as crud_habits
+from app.crud import completions as crud_completions
+from app.models import User, Habit, HabitCompletion
+from app.schemas import UserCreate, UserUpdate, HabitCreate
+from sqlmodel import Session, select
+from sqlalchemy.exc import InvalidRequestError
 from pydantic import ValidationError
 from fastapi import HTTPException
 import pytest
@@ -77,6 +81,22 @@ def test_get_users(db_user_factory, session: Session):
     assert users[0].username == user.username
     assert users[0].email == user.email
 
+def test_get_users_page(db_user_factory, session: Session):
+    created = [db_user_factory() for _ in range(3)]
+
+    first = crud.get_users_page(session, limit=2)
+    second = crud.get_users_page(session, limit=2, cursor=first.next_cursor)
+
+    assert [u.id for u in first.items + second.items] == [u.id for u in created]
+    assert second.next_cursor is None
+
+def test_get_users_page_by_username(db_user_factory, session: Session):
+    created = [db_user_factory() for _ in range(3)]
+
+    page = crud.get_users_page(session, limit=3, sort="username")
+
+    assert [u.username for u in page.items] == sorted(u.username for u in created)
+
 def test_get_user_by_id(db_user_factory, session: Session):
     user = db_user_factory()
 
@@ -128,3 +148,55 @@ def test_delete_user_not_found(session: Session):
 
     assert excinfo.value.status_code == 404
     assert "not found" in str(excinfo.value)
+
+def test_delete_user_with_habits(db_habit_factory, session: Session):
+    habit, user = db_habit_factory()
+    crud_completions.mark_habit_completed_today(habit.id, user['id'], session)
+
+    assert crud.delete_user(user['id'], session) is True
+
+    # The database cascade removes the habits and their completions
+    assert session.exec(select(Habit).where(Habit.user_id == user['id'])).all() == []
+    assert session.exec(select(HabitCompletion).where(HabitCompletion.habit_id == habit.id)).all() == []
+
+def add_users_with_habits(session: Session, users: int, habits_per_user: int):
+    for i in range(users):
+        user = crud.create_user(UserCreate(username=f"user_{uuid4()}", email="user@example.com", password="password123"), session)
+        for j in range(habits_per_user):
+            crud_habits.create_habit(HabitCreate(name=f"habit {j}", frequency="daily"), user.id, session)
+
+def count_selects(captured_sql: list) -> int:
+    return sum(1 for statement, _ in captured_sql if statement.lstrip().upper().startswith("SELECT"))
+
+def test_get_users_query_count_is_constant(session: Session, captured_sql):
+    add_users_with_habits(session, users=2, habits_per_user=1)
+    captured_sql.clear()
+    crud.get_users(session)
+    few = count_selects(captured_sql)
+
+    add_users_with_habits(session, users=10, habits_per_user=3)
+    captured_sql.clear()
+    summaries = crud.get_users(session)
+    many = count_selects(captured_sql)
+
+    assert len(summaries) == 12
+    assert few == many == 2  # users, then all their habits in one IN query
+
+def test_get_users_page_query_count_is_constant(session: Session, captured_sql):
+    add_users_with_habits(session, users=10, habits_per_user=3)
+    captured_sql.clear()
+
+    page = crud.get_users_page(session, limit=5)
+    crud.get_users_page(session, limit=5, cursor=page.next_cursor)
+
+    assert count_selects(captured_sql) == 4
+
+def test_user_habits_are_not_lazy_loaded(db_habit_factory, session: Session):
+    habit, user = db_habit_factory()
+    session.expunge_all()
+
+    db_user = session.get(User, user['id'])
+
+    # An unplanned load of the relationship must fail loudly instead of issuing a query per user
+    with pytest.raises(InvalidRequestError):
+        db_user.habits
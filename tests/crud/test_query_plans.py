@@ -0,0 +1,106 @@
+"""
+Query-plan regression tests.
+
+Each test runs a hot CRUD path, captures the SELECT statements it actually sends to
+the database and asks SQLite for their plan. A plan step that scans a whole table
+instead of searching an index means an index was dropped or a query stopped matching it.
+"""
+
+from tests.conftest_crud import db_habit_factory, db_user_factory
+from app.crud import habits as crud_habits
+from app.crud import completions as crud_completions
+from app.crud import users as crud_users
+from app.auth import get_login_user, get_token_user
+from app.utils import get_habit_of_user
+from app.models import Category
+from app.schemas import HabitCreate
+from sqlmodel import Session
+from datetime import date
+
+def query_plans(session: Session, captured_sql: list) -> list:
+    """
+    Return the EXPLAIN QUERY PLAN steps of every captured SELECT statement.
+    """
+    plans = []
+    connection = session.connection()
+    for statement, parameters in list(captured_sql):
+        if statement.lstrip().upper().startswith("SELECT"):
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            plans.append([row[-1] for row in rows])
+    return plans
+
+def assert_indexed(session: Session, captured_sql: list):
+    plans = query_plans(session, captured_sql)
+    assert plans, "no SELECT statements were captured"
+    for steps in plans:
+        scans = [step for step in steps if step.startswith("SCAN")]
+        assert not scans, f"full table scan in plan: {steps}"
+
+def test_get_habits_uses_index(session: Session, db_habit_factory, captured_sql):
+    habit, user = db_habit_factory()
+    captured_sql.clear()
+
+    crud_habits.get_habits(session, user_id=user['id'])
+    crud_habits.get_habits(session, user_id=user['id'], category=Category.PERSONAL_DEVELOPMENT)
+    crud_habits.get_habits_today(session, user_id=user['id'])
+
+    assert_indexed(session, captured_sql)
+
+def test_get_habits_page_uses_index(session: Session, db_habit_factory, captured_sql):
+    habit, user = db_habit_factory()
+    crud_habits.create_habit(HabitCreate(name="second habit", frequency="daily"), user['id'], session)
+
+    for sort in crud_habits.HABIT_SORT_COLUMNS:
+        page = crud_habits.get_habits_page(session, user['id'], limit=1, sort=sort)
+        assert page.next_cursor is not None
+        captured_sql.clear()
+        crud_habits.get_habits_page(session, user['id'], limit=1, sort=sort, cursor=page.next_cursor)
+        assert_indexed(session, captured_sql)
+
+def test_get_habit_by_name_uses_index(session: Session, db_habit_factory, captured_sql):
+    habit, user = db_habit_factory()
+    captured_sql.clear()
+
+    crud_habits.get_habit_by_name(habit.name, user['id'], session)
+
+    assert_indexed(session, captured_sql)
+
+def test_get_habit_of_user_uses_index(session: Session, db_habit_factory, captured_sql):
+    habit, user = db_habit_factory()
+    captured_sql.clear()
+
+    get_habit_of_user(habit.id, user['id'], session)
+
+    assert_indexed(session, captured_sql)
+
+def test_completion_queries_use_index(session: Session, db_habit_factory, captured_sql):
+    habit, user = db_habit_factory()
+    captured_sql.clear()
+
+    crud_completions.mark_habit_completed_today(habit.id, user['id'], session)
+    crud_completions.get_habit_today_completion_status(habit.id, user['id'], session)
+    crud_completions.get_habit_completion_dates(habit.id, user['id'], session)
+    crud_completions.get_habit_completion_dates(habit.id, user['id'], session, date_from=date(2025, 1, 1))
+    crud_completions.get_habit_completion_counts(habit.id, user['id'], session, period="month")
+
+    assert_indexed(session, captured_sql)
+
+def test_user_lookups_use_index(session: Session, db_user_factory, captured_sql):
+    user = db_user_factory()
+    captured_sql.clear()
+
+    crud_users.get_user_by_username(user.username, session)
+    get_login_user(user.username, session)
+    get_token_user(user.username, user.id, session)
+
+    assert_indexed(session, captured_sql)
+
+def test_scan_is_detected(session: Session, db_user_factory, captured_sql):
+    db_user_factory()
+    captured_sql.clear()
+
+    # Filtering on an unindexed column must show up as a table scan
+    session.connection().exec_driver_sql("SELECT id FROM user WHERE email = ?", ("user@example.com",))
+
+    plans = query_plans(session, captured_sql)
+    assert any(step.startswith("SCAN") for steps in plans for step in steps)
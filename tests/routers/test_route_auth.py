@@ -26,4 +26,61 @@ def test_secure_endpoint_invalid_token(client):
     response = client.get("/secure-data", headers={"Authorization": "Bearer invalidtoken123"})
 
     assert response.status_code == 401
-    assert response.json()["detail"] == "Invalid credentials"
\ No newline at end of file
+    assert response.json()["detail"] == "Invalid credentials"
+def test_login_records_hashing_metrics(client, user_factory):
+    from app.hashing import hashing_pool
+    user = user_factory()
+    completed = hashing_pool.stats()["completed"]
+
+    response = client.post("/login", data={"username": user["username"], "password": "password123"})
+
+    assert response.status_code == 200
+    stats = hashing_pool.stats()
+    assert stats["completed"] == completed + 1
+    assert stats["hash_seconds_total"] > 0
+
+def test_login_hashing_pool_saturated(client, user_factory, monkeypatch):
+    from app.hashing import hashing_pool
+    user = user_factory()
+    monkeypatch.setattr(hashing_pool, "max_pending", 0)
+
+    response = client.post("/login", data={"username": user["username"], "password": "password123"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_repeated_requests_use_cached_principal(client, user_factory):
+    from app.cache import principal_cache
+    user = user_factory()
+    token = create_access_token(client, user["username"], "password123")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    client.get("/secure-data", headers=headers)
+    hits = principal_cache.stats()["hits"]
+    response = client.get("/secure-data", headers=headers)
+
+    assert response.status_code == 200
+    assert principal_cache.stats()["hits"] == hits + 1
+
+def test_deleted_user_token_is_rejected(client, user_factory):
+    user = user_factory()
+    token = create_access_token(client, user["username"], "password123")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/secure-data", headers=headers).status_code == 200
+    assert client.delete("/users/me", headers=headers).status_code == 200
+
+    response = client.get("/secure-data", headers=headers)
+
+    assert response.status_code == 401
+
+def test_renamed_user_token_is_rejected(client, user_factory):
+    user = user_factory()
+    token = create_access_token(client, user["username"], "password123")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.put("/users/me", json={"username": "renamed_user"}, headers=headers).status_code == 200
+
+    response = client.get("/secure-data", headers=headers)
+
+    assert response.status_code == 401
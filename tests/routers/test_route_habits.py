@@ -1,6 +1,9 @@
 from fastapi.testclient import TestClient
 from app.main import app
+from app.cache import habit_cache
 from datetime import date
+import json
+from tests.test_helpers import create_access_token
 
 def test_create_habit(habit_factory):
     habit = habit_factory()
@@ -30,6 +33,21 @@ def test_create_habit_invalid_category(client: TestClient, regular_user_token):
     assert "detail" in data
     assert "category" in data["detail"]  # Check if 'category' is mentioned in the error message
 
+def test_create_habit_category_with_lowercase_word(client: TestClient, regular_user_token):
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+
+    response = client.post("/habits/", json={"name": "declutter", "category": "home and organization", "frequency": "weekly"}, headers=headers)
+
+    assert response.status_code == 201
+    assert response.json()["category"] == "Home and Organization"
+    # Served twice: from the database, then from the habit cache
+    for _ in range(2):
+        listing = client.get("/habits/", headers=headers)
+        assert listing.status_code == 200
+        assert listing.json()["items"][0]["category"] == "Home and Organization"
+    filtered = client.get("/habits/?category=HOME AND ORGANIZATION", headers=headers)
+    assert [habit["name"] for habit in filtered.json()["items"]] == ["Declutter"]
+
 def test_create_habit_invalid_frequency(client: TestClient, regular_user_token):
     invalid_habit_data = {
         "name": "read books",
@@ -64,6 +82,63 @@ def test_mark_habit_completed_today(client: TestClient, habit_factory, regular_u
     data = response.json()
     assert data["completed_today"] is True
 
+def test_habit_summary_includes_streaks(client: TestClient, habit_factory, regular_user_token):
+    habit = habit_factory()
+    assert (habit["current_streak"], habit["longest_streak"], habit["last_completed_date"]) == (0, 0, None)
+
+    client.post(f"/habits/complete/today/{habit['id']}", headers={"Authorization": f"Bearer {regular_user_token}"})
+    response = client.get(f"/habits/{habit['id']}", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    data = response.json()
+    assert (data["current_streak"], data["longest_streak"]) == (1, 1)
+    assert data["last_completed_date"] == date.today().isoformat()
+
+def test_mark_habits_completed_bulk(client: TestClient, habit_factory, regular_user_token):
+    habit_ids = [habit_factory()["id"] for _ in range(3)]
+    today = date.today().isoformat()
+    items = [{"habit_id": habit_id, "date": today} for habit_id in habit_ids] + [{"habit_id": 9999, "date": today}]
+
+    response = client.post("/habits/complete/bulk", json={"items": items}, headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 3
+    assert [r["status"] for r in data["results"]] == ["created", "created", "created", "not_found"]
+
+    status = client.get(f"/habits/complete/today/{habit_ids[0]}", headers={"Authorization": f"Bearer {regular_user_token}"})
+    assert status.json()["completed_today"] is True
+
+def test_mark_habits_completed_bulk_limits(client: TestClient, regular_user_token):
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+    too_many = [{"habit_id": 1, "date": "2025-01-01"}] * 501
+
+    assert client.post("/habits/complete/bulk", json={"items": []}, headers=headers).status_code == 422
+    assert client.post("/habits/complete/bulk", json={"items": too_many}, headers=headers).status_code == 422
+
+def test_import_habits(client: TestClient, regular_user_token):
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+    data = "name,frequency,category\nread books,daily,personal development\nswim,hourly,fitness\n"
+
+    response = client.post("/habits/import", files={"file": ("habits.csv", data, "text/csv")}, headers=headers)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["imported"], result["failed"]) == (1, 1)
+    assert result["errors"][0]["row"] == 2
+
+    habits = client.get("/habits/?paginate=false", headers=headers).json()
+    assert [habit["name"] for habit in habits] == ["Read Books"]
+
+def test_import_habits_json_with_explicit_format(client: TestClient, regular_user_token):
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+    data = json.dumps([{"name": "read", "frequency": "daily"}])
+
+    unknown = client.post("/habits/import", files={"file": ("habits.txt", data)}, headers=headers)
+    explicit = client.post("/habits/import?format=json", files={"file": ("habits.txt", data)}, headers=headers)
+
+    assert unknown.status_code == 400
+    assert explicit.json()["imported"] == 1
+
 def test_update_habit(client: TestClient, habit_factory, regular_user_token):
     habit = habit_factory()
 
@@ -95,7 +170,7 @@ def test_get_habits(client: TestClient, habit_factory, regular_user_token):
 
     assert response.status_code == 200
 
-    data = response.json()
+    data = response.json()["items"]
     assert isinstance(data, list)
     assert len(data) > 0
     assert data[0]["id"] == habit_id
@@ -110,7 +185,7 @@ def test_get_habits_by_category(client: TestClient, habit_factory, regular_user_
 
     assert response.status_code == 200
 
-    data = response.json()
+    data = response.json()["items"]
     assert isinstance(data, list)
     assert len(data) > 0
     assert data[0]["id"] == habit_id
@@ -125,7 +200,7 @@ def test_get_habits_by_frequency(client: TestClient, habit_factory, regular_user
 
     assert response.status_code == 200
 
-    data = response.json()
+    data = response.json()["items"]
     assert isinstance(data, list)
     assert len(data) > 0
     assert data[0]["id"] == habit_id
@@ -140,11 +215,100 @@ def test_get_habits_by_category_and_frequency(client: TestClient, habit_factory,
 
     assert response.status_code == 200
 
-    data = response.json()
+    data = response.json()["items"]
     assert isinstance(data, list)
     assert len(data) > 0
     assert data[0]["id"] == habit_id
 
+def test_get_habits_paginated(client: TestClient, habit_factory, regular_user_token):
+    habit_ids = [habit_factory()["id"] for _ in range(3)]
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+
+    first = client.get("/habits/?limit=2", headers=headers).json()
+    second = client.get("/habits/", params={"limit": 2, "cursor": first["next_cursor"]}, headers=headers).json()
+
+    assert [h["id"] for h in first["items"] + second["items"]] == habit_ids
+    assert second["next_cursor"] is None
+
+def test_get_habits_unpaginated(client: TestClient, habit_factory, regular_user_token):
+    habit_id = habit_factory()["id"]
+
+    response = client.get(
+        "/habits/?paginate=false",
+        headers={"Authorization": f"Bearer {regular_user_token}"}
+    )
+
+    assert response.status_code == 200
+    assert [h["id"] for h in response.json()] == [habit_id]
+
+def test_get_habits_invalid_sort(client: TestClient, regular_user_token):
+    response = client.get(
+        "/habits/?sort=category",
+        headers={"Authorization": f"Bearer {regular_user_token}"}
+    )
+
+    assert response.status_code == 422
+
+def test_get_habits_conditional(client: TestClient, habit_factory, regular_user_token):
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+    habit_id = habit_factory()["id"]
+
+    first = client.get("/habits/", headers=headers)
+    etag = first.headers["ETag"]
+    unchanged = client.get("/habits/", headers={**headers, "If-None-Match": etag})
+    client.put(f"/habits/{habit_id}", json={"description": "changed"}, headers=headers)
+    changed = client.get("/habits/", headers={**headers, "If-None-Match": etag})
+
+    assert etag.startswith('W/"')
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["ETag"] == etag
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["items"][0]["description"] == "changed"
+
+def test_get_habits_conditional_after_write_on_other_worker(client: TestClient, habit_factory, regular_user_token, monkeypatch):
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+    habit_id = habit_factory()["id"]
+    etag = client.get("/habits/", headers=headers).headers["ETag"]
+
+    # Another worker's write bumps the data version but not this worker's cache generation
+    monkeypatch.setattr(habit_cache, "invalidate_user", lambda user_id: None)
+    client.put(f"/habits/{habit_id}", json={"description": "changed"}, headers=headers)
+    changed = client.get("/habits/", headers={**headers, "If-None-Match": etag})
+
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["items"][0]["description"] == "changed"
+
+def test_get_habit_completion_dates_conditional(client: TestClient, habit_factory, regular_user_token):
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+    habit_id = habit_factory()["id"]
+
+    etag = client.get(f"/habits/complete/{habit_id}", headers=headers).headers["ETag"]
+    unchanged = client.get(f"/habits/complete/{habit_id}", headers={**headers, "If-None-Match": f'"other", {etag}'})
+    client.post(f"/habits/complete/today/{habit_id}", headers=headers)
+    changed = client.get(f"/habits/complete/{habit_id}", headers={**headers, "If-None-Match": etag})
+
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert changed.json()["completed_dates"] == [date.today().isoformat()]
+
+def test_get_habits_today(client: TestClient, habit_factory, regular_user_token):
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+    habit_ids = [habit_factory()["id"] for _ in range(2)]
+    client.post(f"/habits/complete/today/{habit_ids[0]}", headers=headers)
+
+    response = client.get("/habits/today", headers=headers)
+    filtered = client.get("/habits/today?category=fitness", headers=headers)
+    invalid = client.get("/habits/today?frequency=hourly", headers=headers)
+
+    assert response.status_code == 200
+    assert [(h["id"], h["completed_today"]) for h in response.json()] == [(habit_ids[0], True), (habit_ids[1], False)]
+    assert response.json()[0]["name"].startswith("Read Books")
+    assert filtered.json() == []
+    assert invalid.status_code == 400
+
 def test_get_habit_by_id(client: TestClient, habit_factory, regular_user_token):
     habit_id = habit_factory()["id"]
 
@@ -218,6 +382,102 @@ def test_get_habit_completion_dates(client: TestClient, habit_factory, regular_u
     today_str = date.today().isoformat()
     assert today_str in data["completed_dates"]
 
+def test_get_habit_completion_dates_in_range(client: TestClient, habit_factory, regular_user_token):
+    habit_id = habit_factory()["id"]
+    client.post(f"/habits/complete/today/{habit_id}", headers={"Authorization": f"Bearer {regular_user_token}"})
+    today = date.today().isoformat()
+
+    included = client.get(f"/habits/complete/{habit_id}?from={today}&to={today}", headers={"Authorization": f"Bearer {regular_user_token}"})
+    excluded = client.get(f"/habits/complete/{habit_id}?to=2000-01-01", headers={"Authorization": f"Bearer {regular_user_token}"})
+    inverted = client.get(f"/habits/complete/{habit_id}?from={today}&to=2000-01-01", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    assert included.json()["completed_dates"] == [today]
+    assert excluded.json()["completed_dates"] == []
+    assert inverted.status_code == 400
+
+def test_get_habit_completion_counts(client: TestClient, habit_factory, regular_user_token):
+    habit_id = habit_factory()["id"]
+    client.post(f"/habits/complete/today/{habit_id}", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    response = client.get(f"/habits/complete/{habit_id}/counts?period=month", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["period"] == "month"
+    assert data["counts"] == [{"period_start": date.today().replace(day=1).isoformat(), "count": 1}]
+
+def test_get_habit_completion_counts_invalid_period(client: TestClient, habit_factory, regular_user_token):
+    habit_id = habit_factory()["id"]
+
+    response = client.get(f"/habits/complete/{habit_id}/counts?period=day", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    assert response.status_code == 422
+
+def test_get_habit_stats(client: TestClient, habit_factory, regular_user_token):
+    habit_id = habit_factory()["id"]
+    client.post(f"/habits/complete/today/{habit_id}", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    response = client.get(f"/habits/{habit_id}/stats", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["id"] == habit_id
+    assert data["total_completions"] == 1
+    assert data["completion_rate"] == 1.0
+    assert sum(data["weekday_counts"]) == 1
+    assert data["best_month"] == {"month": date.today().strftime("%Y-%m"), "completions": 1}
+
+def test_get_user_habit_stats(client: TestClient, habit_factory, regular_user_token):
+    habit_ids = [habit_factory()["id"] for _ in range(2)]
+    client.post(f"/habits/complete/today/{habit_ids[1]}", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    response = client.get("/habits/stats", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [habit["id"] for habit in data] == habit_ids
+    assert [habit["total_completions"] for habit in data] == [0, 1]
+
+def test_export_completions_ndjson(client: TestClient, habit_factory, regular_user_token):
+    habit_ids = [habit_factory()["id"] for _ in range(2)]
+    for habit_id in habit_ids:
+        client.post(f"/habits/complete/today/{habit_id}", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    response = client.get("/habits/export", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert 'filename="completions.ndjson"' in response.headers["content-disposition"]
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["habit_id"] for row in rows] == habit_ids
+    assert all(row["date"] == date.today().isoformat() for row in rows)
+
+def test_export_completions_csv_single_habit(client: TestClient, habit_factory, regular_user_token):
+    habit_id = habit_factory()["id"]
+    habit_factory()
+    client.post(f"/habits/complete/today/{habit_id}", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    response = client.get(
+        f"/habits/export?format=csv&habit_id={habit_id}",
+        headers={"Authorization": f"Bearer {regular_user_token}"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0] == "habit_id,habit_name,date,status"
+    assert len(lines) == 2
+    assert lines[1].startswith(f"{habit_id},")
+
+def test_export_completions_of_other_users_habit(client: TestClient, habit_factory, user_factory):
+    habit_id = habit_factory()["id"]
+    other_user = user_factory()
+    other_token = create_access_token(client, other_user["username"], "password123")
+
+    response = client.get(f"/habits/export?habit_id={habit_id}", headers={"Authorization": f"Bearer {other_token}"})
+
+    assert response.status_code == 404
+
 def test_delete_habit(client: TestClient, habit_factory, regular_user_token):
     habit_id = habit_factory()["id"]
 
@@ -0,0 +1,37 @@
+from fastapi.testclient import TestClient
+
+def test_pool_stats_admin_only(client: TestClient, admin_user_token, regular_user_token):
+    admin = client.get("/pool", headers={"Authorization": f"Bearer {admin_user_token}"})
+    regular = client.get("/pool", headers={"Authorization": f"Bearer {regular_user_token}"})
+
+    assert admin.status_code == 200
+    assert "pool" in admin.json()
+    assert regular.status_code == 403
+
+def metric_value(text: str, line_prefix: str) -> float:
+    return sum(float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(line_prefix))
+
+def test_metrics_attribute_requests_and_queries_to_routes(client: TestClient, habit_factory, regular_user_token):
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+    habit_id = habit_factory()["id"]
+    before = client.get("/metrics").text
+
+    client.get(f"/habits/{habit_id}", headers=headers)
+    client.get("/habits/999999", headers=headers)
+    client.get("/no-such-path")
+    after = client.get("/metrics")
+
+    route = 'route="/habits/{habit_id}"'
+    assert after.headers["content-type"].startswith("text/plain")
+    assert metric_value(after.text, f'http_requests_total{{method="GET",{route},status="200"}}') \
+        - metric_value(before, f'http_requests_total{{method="GET",{route},status="200"}}') == 1
+    assert metric_value(after.text, f'http_requests_total{{method="GET",{route},status="404"}}') \
+        - metric_value(before, f'http_requests_total{{method="GET",{route},status="404"}}') == 1
+    assert 'route="unmatched",status="404"' in after.text
+    assert metric_value(after.text, f'http_request_duration_seconds_bucket{{method="GET",{route},le="+Inf"}}') \
+        - metric_value(before, f'http_request_duration_seconds_bucket{{method="GET",{route},le="+Inf"}}') == 2
+    assert metric_value(after.text, f"db_queries_total{{{route}}}") - metric_value(before, f"db_queries_total{{{route}}}") >= 2
+    assert metric_value(after.text, f"db_query_duration_seconds_total{{{route}}}") > 0
+    assert "http_requests_in_flight 1" in after.text  # the scrape itself
+    assert "hash_pool_completed" in after.text
+    assert "habit_cache_hit_ratio" in after.text
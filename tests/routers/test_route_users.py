@@ -33,6 +33,27 @@ def test_update_user(client: TestClient, user_factory, regular_user_token):
 
     assert response.status_code == 200
     assert response.json()["username"] == "updated_username"
+
+def test_update_user_password(client: TestClient, user_factory):
+    user = user_factory()
+    token = create_access_token(client, user["username"], "password123")
+
+    response = client.put(
+        "/users/me/",
+        json={"password": "new-password456"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 200
+    assert create_access_token(client, user["username"], "new-password456")
+
+def test_create_user_hashing_pool_saturated(client: TestClient, monkeypatch):
+    from app.hashing import hashing_pool
+    monkeypatch.setattr(hashing_pool, "max_pending", 0)
+
+    response = client.post("/users/", json={"username": "busy_user", "email": "user@example.com", "password": "password123"})
+
+    assert response.status_code == 503
   
 def test_admin_can_get_users(client: TestClient, admin_user_token):
     """
@@ -42,9 +63,9 @@ def test_admin_can_get_users(client: TestClient, admin_user_token):
     response = client.get("/users/", headers=headers)
     
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
-    assert len(response.json()) > 0
-    assert response.json()[0]["username"].startswith("admin_user")
+    assert isinstance(response.json()["items"], list)
+    assert len(response.json()["items"]) > 0
+    assert response.json()["items"][0]["username"].startswith("admin_user")
 
 def test_regular_user_cannot_get_users(client: TestClient, regular_user_token):
     """
@@ -134,3 +155,10 @@ def test_user_can_delete_own_account(client: TestClient, user_factory):
     )
     
     assert response.status_code == 200
+
+def test_admin_can_get_users_unpaginated(client: TestClient, admin_user_token):
+    response = client.get("/users/?paginate=false", headers={"Authorization": f"Bearer {admin_user_token}"})
+
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
+    assert response.json()[0]["username"].startswith("admin_user")
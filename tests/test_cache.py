@@ -0,0 +1,134 @@
+import time
+from typing import List
+import pytest
+from app.cache import HabitCache, MemoryBackend, RedisBackend, TTLCache
+from app.schemas import HabitBasicInfo
+
+def test_get_returns_cached_value():
+    cache = TTLCache(max_size=10)
+    cache.set("token", "principal", time.time() + 60)
+
+    assert cache.get("token") == "principal"
+    assert cache.get("other") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_expired_entry_is_a_miss():
+    cache = TTLCache(max_size=10)
+    cache.set("token", "principal", time.time() - 1)
+
+    assert cache.get("token") is None
+    assert cache.stats()["size"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2)
+    expires_at = time.time() + 60
+    cache.set("a", 1, expires_at)
+    cache.set("b", 2, expires_at)
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("c", 3, expires_at)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_invalidate_tag_only_drops_tagged_entries():
+    cache = TTLCache(max_size=10)
+    expires_at = time.time() + 60
+    cache.set("token-1", "alice", expires_at, tag=1)
+    cache.set("token-2", "alice", expires_at, tag=1)
+    cache.set("token-3", "bob", expires_at, tag=2)
+
+    cache.invalidate_tag(1)
+
+    assert cache.get("token-1") is None
+    assert cache.get("token-2") is None
+    assert cache.get("token-3") == "bob"
+
+class FakeRedis:
+    """
+    In-memory stand-in for the redis-py client methods used by RedisBackend.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.expiry[key] = ex
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+        return int(self.data[key])
+
+    def info(self, section):
+        return {"evicted_keys": 3}
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if key.startswith(match.rstrip("*"))]
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+@pytest.fixture(params=["memory", "redis"])
+def habit_cache(request):
+    backend = MemoryBackend(max_size=10) if request.param == "memory" else RedisBackend(FakeRedis())
+    return HabitCache(backend, ttl=60)
+
+def test_habit_cache_reads_through(habit_cache):
+    loads = []
+    def load():
+        loads.append(1)
+        return [HabitBasicInfo(id=1, name="Read")]
+
+    first = habit_cache.get_or_load(7, ("list",), List[HabitBasicInfo], load)
+    second = habit_cache.get_or_load(7, ("list",), List[HabitBasicInfo], load)
+
+    assert first == second == [HabitBasicInfo(id=1, name="Read")]
+    assert second[0] is not first[0]  # served from the serialized copy
+    assert len(loads) == 1
+    assert habit_cache.stats()["hit_ratio"] == 0.5
+
+def test_habit_cache_invalidates_one_user(habit_cache):
+    habit_cache.get_or_load(7, ("by_id", 1), HabitBasicInfo, lambda: HabitBasicInfo(id=1, name="Old"))
+    habit_cache.get_or_load(8, ("by_id", 2), HabitBasicInfo, lambda: HabitBasicInfo(id=2, name="Other"))
+
+    habit_cache.invalidate_user(7)
+
+    assert habit_cache.get_or_load(7, ("by_id", 1), HabitBasicInfo, lambda: HabitBasicInfo(id=1, name="New")).name == "New"
+    assert habit_cache.get_or_load(8, ("by_id", 2), HabitBasicInfo, lambda: HabitBasicInfo(id=2, name="Stale")).name == "Other"
+
+def test_habit_cache_does_not_cache_errors(habit_cache):
+    def load():
+        raise LookupError("missing")
+
+    for _ in range(2):
+        with pytest.raises(LookupError):
+            habit_cache.get_or_load(7, ("by_id", 1), HabitBasicInfo, load)
+
+    assert habit_cache.stats()["misses"] == 2
+
+def test_habit_cache_backend_stats():
+    memory = HabitCache(MemoryBackend(max_size=1), ttl=60)
+    memory.get_or_load(7, ("by_id", 1), HabitBasicInfo, lambda: HabitBasicInfo(id=1, name="A"))
+    memory.get_or_load(7, ("by_id", 2), HabitBasicInfo, lambda: HabitBasicInfo(id=2, name="B"))
+    assert memory.stats()["evictions"] == 1
+
+    client = FakeRedis()
+    redis = HabitCache(RedisBackend(client), ttl=30)
+    redis.get_or_load(7, ("by_id", 1), HabitBasicInfo, lambda: HabitBasicInfo(id=1, name="A"))
+    assert client.expiry == {"habits:7:0:by_id:1": 30}
+    assert redis.stats()["evictions"] == 3
+
+def test_disabled_habit_cache_always_loads():
+    cache = HabitCache(None, ttl=60)
+
+    values = [cache.get_or_load(7, ("list",), int, lambda: 1) for _ in range(2)]
+
+    assert values == [1, 1]
+    assert cache.stats()["hits"] == 0
@@ -0,0 +1,139 @@
+import json
+import logging
+import queue
+import sys
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine, text
+from fastapi.testclient import TestClient
+from app import logs
+from app.logs import (
+    ContextQueueHandler, JsonFormatter, RequestContext, current_request_context,
+    log_slow_queries, parameter_shape,
+)
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+@pytest.fixture
+def slow_queries():
+    handler = ListHandler()
+    logs.slow_query_logger.addHandler(handler)
+    try:
+        yield handler.records
+    finally:
+        logs.slow_query_logger.removeHandler(handler)
+
+def test_json_formatter_includes_extra_fields_and_exception():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.getLogger("app.test").makeRecord(
+            "app.test", logging.ERROR, __file__, 1, "failed %s", ("twice",), sys.exc_info(),
+            extra={"duration_ms": 1.5, "request_id": "abc"},
+        )
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["message"] == "failed twice"
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "app.test"
+    assert entry["request_id"] == "abc"
+    assert entry["duration_ms"] == 1.5
+    assert "ValueError: boom" in entry["exception"]
+
+def test_queue_handler_captures_request_id_in_logging_thread():
+    records = queue.SimpleQueue()
+    handler = ContextQueueHandler(records)
+    record = logging.makeLogRecord({"name": "app", "msg": "hello %s", "args": ("world",)})
+
+    token = current_request_context.set(RequestContext("req-1", {}))
+    try:
+        handler.emit(record)
+    finally:
+        current_request_context.reset(token)
+
+    # Formatted later by the listener, outside of the request's context
+    entry = json.loads(JsonFormatter().format(records.get_nowait()))
+    assert entry["message"] == "hello world"
+    assert entry["request_id"] == "req-1"
+
+def test_parameter_shape_hides_values():
+    assert parameter_shape((1, "secret"), False) == {"parameter_count": 2, "parameter_types": ["int", "str"]}
+    assert parameter_shape({"name": "secret"}, False) == {"parameter_count": 1, "parameter_types": {"name": "str"}}
+    assert parameter_shape([(1, None), (2, None)], True) == {
+        "rows": 2, "parameter_count": 2, "parameter_types": ["int", "NoneType"],
+    }
+
+def test_slow_query_logged_above_threshold(monkeypatch, slow_queries):
+    engine = create_engine("sqlite://")
+    log_slow_queries(engine)
+
+    monkeypatch.setattr(logs, "SLOW_QUERY_MS", 60_000)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT :a"), {"a": "secret"})
+    assert slow_queries == []
+
+    monkeypatch.setattr(logs, "SLOW_QUERY_MS", 0)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT :a,\n :b"), {"a": "secret", "b": 2})
+
+    record = slow_queries[-1]
+    assert record.getMessage() == "slow query"
+    assert record.statement == "SELECT ?, ?"
+    assert record.parameter_types == ["str", "int"]
+    assert record.duration_ms >= 0
+    assert "secret" not in json.dumps(vars(record), default=str)
+
+def test_slow_query_sampling(monkeypatch, slow_queries):
+    engine = create_engine("sqlite://")
+    log_slow_queries(engine)
+    monkeypatch.setattr(logs, "SLOW_QUERY_MS", 0)
+    monkeypatch.setattr(logs, "SLOW_QUERY_SAMPLE_RATE", 0.0)
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    assert slow_queries == []
+
+def test_failed_statement_does_not_skew_later_durations(monkeypatch, slow_queries):
+    clock = iter([0.0, 100.0, 100.002])
+    monkeypatch.setattr(logs, "time", SimpleNamespace(perf_counter=lambda: next(clock)))
+    monkeypatch.setattr(logs, "SLOW_QUERY_MS", 1)
+    failed, succeeded = SimpleNamespace(), SimpleNamespace()
+
+    # The first statement raises, so its after_cursor_execute never fires
+    logs._before_cursor_execute(None, None, "SELECT 1", (), failed, False)
+    logs._before_cursor_execute(None, None, "SELECT 2", (), succeeded, False)
+    logs._after_cursor_execute(None, None, "SELECT 2", (), succeeded, False)
+
+    assert [(record.statement, record.duration_ms) for record in slow_queries] == [("SELECT 2", 2.0)]
+
+def test_request_id_header(client: TestClient):
+    generated = client.get("/habits/")
+    kept = client.get("/habits/", headers={"X-Request-ID": "trace-42"})
+    replaced = client.get("/habits/", headers={"X-Request-ID": "has spaces;"})
+
+    assert len(generated.headers["X-Request-ID"]) == 32
+    assert kept.headers["X-Request-ID"] == "trace-42"
+    assert replaced.headers["X-Request-ID"] != "has spaces;"
+
+def test_slow_query_records_route_and_request_id(client: TestClient, regular_user_token, monkeypatch, slow_queries):
+    monkeypatch.setattr(logs, "SLOW_QUERY_MS", 0)
+    queued = queue.SimpleQueue()
+    handler = ContextQueueHandler(queued)
+    logs.slow_query_logger.addHandler(handler)
+    try:
+        client.get("/habits/999999", headers={"Authorization": f"Bearer {regular_user_token}", "X-Request-ID": "trace-7"})
+    finally:
+        logs.slow_query_logger.removeHandler(handler)
+
+    assert {(record.method, record.route) for record in slow_queries} == {("GET", "/habits/{habit_id}")}
+    entry = json.loads(JsonFormatter().format(queued.get_nowait()))
+    assert entry["request_id"] == "trace-7"
+    assert entry["route"] == "/habits/{habit_id}"
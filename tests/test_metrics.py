@@ -0,0 +1,57 @@
+import threading
+from types import SimpleNamespace
+from app import metrics
+from app.metrics import LATENCY_BUCKETS, Registry, RequestTotals, current_request, registry, render_metrics
+
+def record(target: Registry, seconds: float, queries: int = 0):
+    totals = RequestTotals()
+    totals.queries, totals.db_seconds = queries, seconds / 2
+    target.record("GET", "/habits/", 200, seconds, totals)
+
+def test_registry_merges_thread_shards():
+    metrics = Registry()
+    threads = [threading.Thread(target=record, args=(metrics, 0.02, 3)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    record(metrics, 20.0)
+
+    merged = metrics.merged()
+
+    assert merged.requests[("GET", "/habits/", 200)] == 5
+    assert merged.queries["/habits/"] == 12
+    buckets = merged.latency_buckets[("GET", "/habits/")]
+    assert buckets[LATENCY_BUCKETS.index(0.025)] == 4
+    assert buckets[-1] == 1  # beyond the last bound
+
+def test_render_metrics_format():
+    registry.clear()
+    record(registry, 0.003, 2)
+
+    text = render_metrics({"db_pool": lambda: {"pool": "QueuePool", "checked_out": 2}})
+
+    assert 'http_requests_total{method="GET",route="/habits/",status="200"} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/habits/",le="0.005"} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/habits/",le="+Inf"} 1' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/habits/"} 1' in text
+    assert 'db_queries_total{route="/habits/"} 2' in text
+    assert "# TYPE db_pool_checked_out gauge\ndb_pool_checked_out 2" in text
+    assert "db_pool_pool" not in text  # non-numeric values are skipped
+    assert text.endswith("\n")
+
+def test_failed_statement_does_not_skew_later_durations(monkeypatch):
+    clock = iter([0.0, 100.0, 100.5])
+    monkeypatch.setattr(metrics, "time", SimpleNamespace(perf_counter=lambda: next(clock)))
+    failed, succeeded = SimpleNamespace(), SimpleNamespace()
+    totals = RequestTotals()
+    token = current_request.set(totals)
+    try:
+        # The first statement raises, so its after_cursor_execute never fires
+        metrics._before_cursor_execute(None, None, "SELECT", (), failed, False)
+        metrics._before_cursor_execute(None, None, "SELECT", (), succeeded, False)
+        metrics._after_cursor_execute(None, None, "SELECT", (), succeeded, False)
+    finally:
+        current_request.reset(token)
+
+    assert (totals.queries, totals.db_seconds) == (1, 0.5)
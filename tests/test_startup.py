@@ -0,0 +1,58 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from sqlalchemy import create_engine, text
+from app import database, startup
+from app.database import MeteredQueuePool
+from app.main import app
+
+def test_verify_schema(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}")
+
+    with pytest.raises(RuntimeError, match="Could not read the Alembic revision"):
+        startup.verify_schema(engine)
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        conn.execute(text("INSERT INTO alembic_version VALUES ('0000old')"))
+    with pytest.raises(RuntimeError, match="at revision 0000old"):
+        startup.verify_schema(engine)
+
+    head, = startup.alembic_heads()
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE alembic_version SET version_num = :head"), {"head": head})
+    startup.verify_schema(engine)
+
+def test_alembic_heads_match_alembic():
+    from alembic.script import ScriptDirectory
+
+    assert startup.alembic_heads() == set(ScriptDirectory(os.path.dirname(startup.ALEMBIC_VERSIONS)).get_heads())
+
+def test_warm_pool_opens_idle_connections(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'warm.db'}", poolclass=MeteredQueuePool, pool_size=3)
+
+    assert startup.warm_pool(engine, 10) == 3
+    assert engine.pool.checkedin() == 3
+
+    # In-memory SQLite keeps a single connection; nothing to warm
+    assert startup.warm_pool(create_engine("sqlite://"), 10) == 0
+
+def test_start_reports_timings(monkeypatch):
+    monkeypatch.setattr(database, "DB_STARTUP", "skip")
+
+    timings = asyncio.run(startup.start(app))
+
+    assert {"engine_ms", "pool_warm_ms", "schema_warm_ms", "total_ms"} <= timings.keys()
+    assert "schema_ms" not in timings
+    assert startup.startup_timings == timings
+    assert app.openapi_schema is not None
+
+def test_importing_the_app_creates_no_engine():
+    code = "import app.main, app.database as d; print(d._engines == {})"
+    env = dict(os.environ, DATABASE_URL="sqlite:///:memory:", SECRET_KEY="x")
+
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout
+
+    assert output.strip() == "True"